@@ -0,0 +1,72 @@
+"""Incremental parser for the interviewer's control tags.
+
+The interviewer ends each question with <EASY>, <MEDIUM> or <HARD> and closes
+the interview with <END_OF_INTERVIEW> (both may appear together, also with a
+closing remark in between). The parser takes the reply as it streams in,
+strips the tags out of the text (also when a tag is split across chunks) and
+notes which ones it saw. Text after a difficulty tag is part of the reply, as
+in a non-streamed one. `complete` turns True as soon as <END_OF_INTERVIEW> is
+seen, so the caller can stop reading the stream; anything after it is dropped.
+"""
+import re
+
+DIFFICULTY_TAGS = ("EASY", "MEDIUM", "HARD")
+END_TAG = "END_OF_INTERVIEW"
+TAGS = [f"<{name}>" for name in DIFFICULTY_TAGS + (END_TAG,)]
+SPEAKER_LABEL = re.compile(r"^\s*Interviewer:\s*")
+
+
+class ControlTagParser:
+
+    def __init__(self):
+        self.tags = []
+        self.complete = False
+        self._text = []
+        self._pending = ""  # tail that may be the start of a tag split across chunks
+
+    def _emit(self, text):
+        self._text.append(text)
+
+    def _tag(self, name):
+        self.tags.append(name)
+        if name == END_TAG:
+            self.complete = True
+
+    def feed(self, piece):
+        """Consumes the next chunk of the reply"""
+        buffer, self._pending = self._pending + piece, ""
+        position = 0
+        while position < len(buffer) and not self.complete:
+            start = buffer.find("<", position)
+            if start < 0:
+                self._emit(buffer[position:])
+                return
+            if start > position:
+                self._emit(buffer[position:start])
+            rest = buffer[start:]
+            tag = next((t for t in TAGS if rest.startswith(t)), None)
+            if tag:
+                self._tag(tag[1:-1])
+                position = start + len(tag)
+            elif any(t.startswith(rest) for t in TAGS):
+                self._pending = rest
+                return
+            else:
+                self._emit("<")
+                position = start + 1
+
+    def finish(self) -> tuple:
+        """(reply text without tags or speaker label, tags in the order seen)"""
+        if self._pending and not self.complete:
+            self._emit(self._pending)
+        self._pending = ""
+        # Spaces on both sides of a removed tag run together or end a line
+        text = re.sub(r" +\n", "\n", re.sub(r" {2,}", " ", "".join(self._text)))
+        return SPEAKER_LABEL.sub("", text).strip(), self.tags
+
+
+def parse_reply(text) -> tuple:
+    """finish() of a complete, non-streamed reply"""
+    parser = ControlTagParser()
+    parser.feed(text)
+    return parser.finish()
@@ -12,7 +12,8 @@ if __name__ == "__main__":
     
     conversations = generate_dataset(
         num_conversations=5,
-        output_file="interview_dataset_5.json"
+        output_file="interview_dataset_5.json",
+        concurrency=5
     )
     
     print(f"\nGeneration complete!")
@@ -1,36 +1,45 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
 import os,sys,time
-import yaml
+import itertools
 import random
 import json
-from datetime import datetime
+import re
 
-load_dotenv()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.rate_limiter import estimate_tokens
+from common.client import get_client
+from common.metrics import get_metrics
+from common.dataset_store import DatasetStore
+from history import ConversationHistory, format_turns
+from control_tags import ControlTagParser, DIFFICULTY_TAGS, END_TAG, parse_reply
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Gemini is configured by the shared client on first use (GEMINI_API_KEY, .env)
 
 
 # get prompts
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.yaml")
+_config = None
 
 
-def load_config(filepath="prompts.yaml"):
+def load_config(filepath=CONFIG_FILE):
     """Loads YAML config file"""
+    import yaml
     try:
         with open(filepath,'r') as f : 
             return yaml.safe_load(f)
         
     except FileNotFoundError : 
-        print("File not found!")
-        sys.exit(1) 
+        raise FileNotFoundError(f"Prompt config not found: {filepath}") from None
 
-config = load_config()
-personas = config.get("personas",{})
-prompt_templates = config.get("prompt_templates",{})
-interviewee_prompt_templates = config.get("interviewee_prompt_templates",{})
+def get_config() -> dict:
+    """prompts.yaml next to this file, loaded on first use"""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
 
 def get_persona_prompts()-> tuple | None :
     """Loads persona prompts from YAML file"""
+    personas = get_config().get("personas",{})
     interviewer_persona = personas.get("interviewer",{}).get("description")
     interviewee_persona = personas.get("interviewee",{}).get("description")
 
@@ -38,30 +47,32 @@ def get_persona_prompts()-> tuple | None :
         return (interviewer_persona,interviewee_persona)
     else:
         return None
-        
-
-prompt_pair = get_persona_prompts()
-
-if prompt_pair:
-    INTERVIEWER_PERSONA,INTERVIEWEE_PERSONA = prompt_pair
-else:
-    print("Could not retrieve personas.")
-    sys.exit(1)
-
-interviewer = genai.GenerativeModel(model_name="gemini-2.5-flash",system_instruction=INTERVIEWER_PERSONA)
 
-interviewee = genai.GenerativeModel(model_name="gemini-2.5-flash",system_instruction=INTERVIEWEE_PERSONA)
+def get_personas() -> tuple:
+    """(interviewer, interviewee) persona prompts"""
+    prompt_pair = get_persona_prompts()
+    if not prompt_pair:
+        raise ValueError("Could not retrieve personas.")
+    return prompt_pair
 
-INITIAL_PROMPT = "TOPIC : Design a global live video streaming service like Youtube or Netflix"
-conversation_history = [{'role' : 'user' ,'parts' :INITIAL_PROMPT}]
-interviewee_response_types = list(interviewee_prompt_templates.keys())
-# print(interviewee_response_types)
+MODEL_NAME = "gemini-2.5-flash"
+# Turns sent verbatim per request, older turns are summarised (None keeps the whole dialogue)
+HISTORY_WINDOW = None
+# Stream interviewer replies: records the time to first token and stops reading at
+# <END_OF_INTERVIEW>, otherwise the whole reply is read, so it saves little over a plain call
+STREAM_RESPONSES = False
+# Write the whole dialogue in one request from a pre-sampled turn plan (False: one request per turn)
+SINGLE_CALL = False
+# Share of planned questions at the target difficulty in single-call mode
+TARGET_SHARE = 0.6
 
 def next_prompt(role: str, last: bool, question_difficulty="", student_type="poor_student") -> str:
+    config = get_config()
     if role == "Interviewer":
-        next_prompt_template = prompt_templates.get("interviewer_reply_prompt",{}).get("template")
+        next_prompt_template = config.get("prompt_templates",{}).get("interviewer_reply_prompt",{}).get("template")
         return next_prompt_template
     else:
+        interviewee_response_types = list(config.get("interviewee_prompt_templates",{}).keys())
         styles_config = config["student_personas"][student_type][question_difficulty]
         style_weights = [style['weight'] for style in styles_config.values()]
         type_of_prompt = random.choices(interviewee_response_types,weights=style_weights,k=1)[0]
@@ -72,8 +83,144 @@ def next_prompt(role: str, last: bool, question_difficulty="", student_type="poo
         return prompt
         
 
-def generate_conversation(conversation_id, student_type=None, topic=None, max_turns=None):
-    """Generate a single conversation and return it as a dictionary"""
+def difficulty_hint(difficulty) -> str:
+    """Interviewer prompt addition steering the interview towards EASY, MEDIUM or HARD questions"""
+    template = get_config().get("prompt_templates",{}).get("difficulty_hint_prompt",{}).get("template")
+    return "\n" + template.format(difficulty=difficulty.upper())
+
+def generate_text(system_instruction, history, stage=None) -> str:
+    """Runs one generation call through the shared client (rate limited and metered).
+    Turns are sampled, so they bypass the response cache: a cached reply would repeat
+    the same opening question and answers across conversations."""
+    return get_client().generate(history, MODEL_NAME, system_instruction=system_instruction, stage=stage,
+                                 use_cache=False)
+
+def interviewer_reply(persona, request) -> tuple:
+    """(reply text, control tags) of one interviewer turn.
+    When streamed, reading stops as soon as the parser has seen <END_OF_INTERVIEW>."""
+    if not STREAM_RESPONSES:
+        return parse_reply(generate_text(persona, request, "interviewer"))
+    parser = ControlTagParser()
+    marks = {}
+    stream = get_client().stream(request, MODEL_NAME, system_instruction=persona, stage="interviewer",
+                                 use_cache=False, marks=marks)
+    try:
+        for piece in stream:
+            parser.feed(piece)
+            if parser.tags and "tag" not in marks:
+                marks["tag"] = time.perf_counter()
+            if parser.complete:
+                break
+    finally:
+        stream.close()
+    return parser.finish()
+
+def summarize_turns(summary, turns) -> str:
+    """Folds turns that left the history window into the running summary"""
+    template = get_config().get("prompt_templates",{}).get("history_summary_prompt",{}).get("template")
+    prompt = template.format(summary=summary or "(none yet)", turns=format_turns(turns))
+    return generate_text(get_personas()[0], [{'role' : 'user', 'parts' : prompt}], "summary").strip()
+
+def plan_exchanges(student_type, exchanges, target_difficulty=None) -> list:
+    """[(difficulty, response type)] for the questions of a single-call conversation, types drawn
+    from the student persona's weights like next_prompt does; the last exchange is the closing one"""
+    config = get_config()
+    plan = []
+    for _ in range(exchanges - 1):
+        if target_difficulty and random.random() < TARGET_SHARE:
+            difficulty = target_difficulty.upper()
+        else:
+            difficulty = random.choice(DIFFICULTY_TAGS)
+        styles_config = config["student_personas"][student_type][difficulty]
+        response_type = random.choices(list(styles_config), weights=[style['weight'] for style in styles_config.values()], k=1)[0]
+        plan.append((difficulty, response_type))
+    return plan
+
+def single_call_prompt(topic, plan) -> str:
+    """The whole-interview prompt with one numbered line per planned exchange"""
+    config = get_config()
+    interviewer_persona, interviewee_persona = get_personas()
+    lines = []
+    for number, (difficulty, response_type) in enumerate(plan, 1):
+        reaction = config["interviewee_prompt_templates"][response_type]["template"].split("#Output Format")[0].strip()
+        lines.append(f"{number}. Interviewer: asks a question of difficulty {difficulty}, tagged <{difficulty}>. "
+                     f"Interviewee[{response_type}]: {reaction}")
+    lines.append(f"{len(plan) + 1}. Interviewer: reacts to the last answer and concludes the interview warmly, "
+                 f"ending with <END_OF_INTERVIEW>. Interviewee[closing]: a brief, natural closing reply.")
+    template = config.get("prompt_templates",{}).get("single_call_prompt",{}).get("template")
+    return template.format(topic=topic, interviewer_persona=interviewer_persona.strip(),
+                           interviewee_persona=interviewee_persona.strip(), plan="\n".join(lines))
+
+SPEAKER_LINE = re.compile(r"^\s*(Interviewer|Interviewee)\s*(?:\[(\w+)\])?\s*:\s*", re.IGNORECASE)
+
+def split_dialogue(text) -> list:
+    """[(speaker, type label or None, text)] of a written dialogue, lines without a speaker
+    label belong to the turn before them"""
+    parts = []
+    for line in text.splitlines():
+        match = SPEAKER_LINE.match(line)
+        if match:
+            parts.append([match.group(1).lower(), match.group(2), line[match.end():]])
+        elif parts and line.strip():
+            parts[-1][2] += "\n" + line
+    return [(speaker, label, speech.strip()) for speaker, label, speech in parts]
+
+def generate_conversation_single(topic, student_type, max_turns, target_difficulty=None) -> tuple:
+    """(turns, difficulty counts, response type counts) of a dialogue written in one request.
+    The difficulties are the tags the interviewer turns carry, the response types come from
+    the plan (or the turn's own label when it names a known type)."""
+    plan = plan_exchanges(student_type, max_turns, target_difficulty)
+    response_types = get_config().get("interviewee_prompt_templates",{}).keys()
+    prompt = single_call_prompt(topic, plan)
+    response_txt = generate_text(None, [{'role' : 'user', 'parts' : prompt}], "conversation")
+
+    turns = []
+    difficulty_counts = {"EASY": 0, "MEDIUM": 0, "HARD": 0}
+    response_type_counts = {"clear": 0, "confused": 0, "misunderstood": 0, "wrong": 0}
+    exchange_index = -1
+    is_last = False
+    for speaker, label, speech in split_dialogue(response_txt):
+        if speaker == "interviewer":
+            if is_last:
+                break
+            speech, tags = parse_reply(speech)
+            current_difficulty = next((tag for tag in reversed(tags) if tag in DIFFICULTY_TAGS), None)
+            if current_difficulty:
+                difficulty_counts[current_difficulty] += 1
+            is_last = END_TAG in tags
+            exchange_index += 1
+            current_response_type = None
+        else:
+            if not turns or turns[-1]["speaker"] != "interviewer":
+                continue  # an interviewee turn must answer an interviewer turn
+            current_difficulty = None
+            current_response_type = label.lower() if label and label.lower() in response_types else None
+            if current_response_type is None and exchange_index < len(plan):
+                current_response_type = plan[exchange_index][1]
+            if current_response_type:
+                response_type_counts[current_response_type] += 1
+        turns.append({
+            "turn_number": len(turns) + 1,
+            "speaker": speaker,
+            "content": speech,
+            "difficulty": current_difficulty,
+            "response_type": current_response_type
+        })
+    if turns and turns[-1]["speaker"] == "interviewer":
+        turns.pop()  # a question nobody answered
+    if not turns:
+        raise ValueError("Single-call reply did not contain a dialogue")
+    print(f"Wrote {len(turns)} turns in one request (planned {len(plan) + 1} exchanges)")
+    return turns, difficulty_counts, response_type_counts
+
+def generate_conversation(conversation_id, student_type=None, topic=None, max_turns=None, history_window=HISTORY_WINDOW,
+                          target_difficulty=None, single_call=None):
+    """Generate a single conversation and return it as a dictionary.
+    target_difficulty (EASY, MEDIUM or HARD) asks the interviewer to lean towards that
+    difficulty; the conversation's "difficulty" is still taken from the tags it actually used.
+    single_call (default SINGLE_CALL) writes the whole dialogue in one request instead of
+    one request per turn; the result has the same fields."""
+    INTERVIEWER_PERSONA, INTERVIEWEE_PERSONA = get_personas()
     topics_pool = [
         "Design a global live video streaming service like Youtube or Netflix",
         "Design a ride-sharing service like Uber or Lyft",
@@ -93,9 +240,16 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
         student_type = random.choice(["poor_student", "average_student", "good_student"])
     if max_turns is None:
         max_turns = random.randint(3, 6)
+    if single_call is None:
+        single_call = SINGLE_CALL
+    if single_call:
+        turns, difficulty_counts, response_type_counts = generate_conversation_single(topic, student_type, max_turns,
+                                                                                      target_difficulty)
+        return build_conversation(conversation_id, student_type, topic, turns, difficulty_counts, response_type_counts)
     
-    # Reset conversation state
-    conversation_history = [{'role' : 'user' ,'parts' : topic}]
+    # Reset conversation state, the history only ever holds the real dialogue
+    history = ConversationHistory(topic, window=history_window, summarizer=summarize_turns if history_window else None)
+    request_tokens = []
     question_difficulty = "EASY"
     turns = []
     difficulty_counts = {"EASY": 0, "MEDIUM": 0, "HARD": 0}
@@ -108,31 +262,18 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
     for exchange_index in range(max_turns):
         # Interviewer's turn
         prompt = next_prompt("Interviewer", is_last, student_type=student_type)
-        conversation_history.append({'role' : 'user', 'parts' : prompt})
-        response = interviewer.generate_content(conversation_history)
-        response_txt = response.text
-        current_difficulty = None
-        if "<EASY>" in response_txt:
-            question_difficulty = "EASY"
-            current_difficulty = "EASY"
-            response_txt = response_txt.replace("<EASY>","").strip()
-            difficulty_counts["EASY"] += 1
-        elif "<MEDIUM>" in response_txt:
-            question_difficulty = "MEDIUM"
-            current_difficulty = "MEDIUM"
-            response_txt = response_txt.replace("<MEDIUM>","").strip()
-            difficulty_counts["MEDIUM"] += 1
-        elif "<HARD>" in response_txt:
-            question_difficulty = "HARD"
-            current_difficulty = "HARD"
-            response_txt = response_txt.replace("<HARD>","").strip()
-            difficulty_counts["HARD"] += 1
-        elif "<END_OF_INTERVIEW>" in response_txt:
+        if target_difficulty:
+            prompt += difficulty_hint(target_difficulty)
+        request = history.build_request("interviewer", prompt)
+        request_tokens.append(estimate_tokens(request))
+        response_txt, tags = interviewer_reply(INTERVIEWER_PERSONA, request)
+        # A closing turn can carry a difficulty tag as well as <END_OF_INTERVIEW>
+        current_difficulty = next((tag for tag in reversed(tags) if tag in DIFFICULTY_TAGS), None)
+        if current_difficulty:
+            question_difficulty = current_difficulty
+            difficulty_counts[current_difficulty] += 1
+        if END_TAG in tags:
             is_last = True
-            response_txt = response_txt.replace("<END_OF_INTERVIEW>","").strip()
-        
-        if response_txt.startswith("Interviewer:"):
-            response_txt = response_txt[12:].strip()
         
         turn_number += 1
         turns.append({
@@ -142,15 +283,14 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
             "difficulty": current_difficulty,
             "response_type": None
         })
-        conversation_history.append({'role' : 'model','parts' : response_txt})
-        print(f"Turn {turn_number} (Interviewer): {response_txt[:100]}...")
-        time.sleep(2)
+        history.add("interviewer", response_txt)
+        print(f"Turn {turn_number} (Interviewer, ~{request_tokens[-1]} input tokens): {response_txt[:100]}...")
 
         # Interviewee's turn (always follow, even if interviewer ended)
         prompt = next_prompt("Interviewee", is_last, question_difficulty, student_type)
-        conversation_history.append({'role' : 'user', 'parts' : prompt})
-        response = interviewee.generate_content(conversation_history)
-        response_txt = response.text
+        request = history.build_request("interviewee", prompt)
+        request_tokens.append(estimate_tokens(request))
+        response_txt = generate_text(INTERVIEWEE_PERSONA, request, "interviewee")
         current_response_type = None
         if "TYPE :" in prompt:
             current_response_type = prompt.split("TYPE :")[1].split("\n")[0].strip()
@@ -168,14 +308,18 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
             "difficulty": None,
             "response_type": current_response_type
         })
-        conversation_history.append({'role' : 'model','parts' : response_txt})
-        print(f"Turn {turn_number} (Interviewee): {response_txt[:100]}...")
-        time.sleep(2)
+        history.add("interviewee", response_txt)
+        print(f"Turn {turn_number} (Interviewee, ~{request_tokens[-1]} input tokens): {response_txt[:100]}...")
 
         # If interviewer signaled end, finish after interviewee reply
         if is_last:
             break
     
+    print(f"Input tokens per request: {request_tokens} (total ~{sum(request_tokens)})")
+    return build_conversation(conversation_id, student_type, topic, turns, difficulty_counts, response_type_counts)
+
+def build_conversation(conversation_id, student_type, topic, turns, difficulty_counts, response_type_counts) -> dict:
+    """The dataset record of a finished conversation"""
     # Calculate most frequently occurring difficulty
     most_frequent_difficulty = max(difficulty_counts.items(), key=lambda x: x[1])[0] if any(difficulty_counts.values()) else "Easy"
     
@@ -191,7 +335,7 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
     exchanges = len([t for t in turns if t["speaker"] == "interviewee"])
     
     conversation = {
-        "id": int(conversation_id) if isinstance(conversation_id, int) else int(conversation_id.split("_")[1]),
+        "id": conversation_id if conversation_id is None or isinstance(conversation_id, int) else int(conversation_id.split("_")[1]),
         "student_level": student_type,
         "difficulty": most_frequent_difficulty.title(),  # Capitalize first letter
         "exchanges": exchanges,
@@ -203,81 +347,144 @@ def generate_conversation(conversation_id, student_type=None, topic=None, max_tu
     
     return conversation
 
-def generate_dataset(num_conversations=5, student_types=None, topics=None, output_file="interview_dataset.json"):
+DEFAULT_TOPICS = [
+    "Design a global live video streaming service like Youtube or Netflix",
+    "Design a ride-sharing service like Uber or Lyft",
+    "Design a real-time messaging system like WhatsApp or Slack",
+    "Design a URL shortening service like bit.ly",
+    "Design an e-commerce platform like Amazon",
+    "Design a large-scale logging and metrics system",
+    "Design a scalable job scheduler and worker system",
+    "Design a distributed file storage system like Google Drive",
+    "Design a recommendation engine for content platforms",
+    "Design a real-time analytics dashboard system",
+    "Design a multi-tenant SaaS application platform"
+]
+
+def open_dataset_store(output_file):
+    """Opens the append-only shard store backing output_file.
+    A dataset written before the store existed is imported into it once."""
+    store = DatasetStore.for_output_file(output_file)
+    if len(store) == 0:
+        imported = store.import_json(output_file)
+        if imported:
+            print(f"Imported existing dataset with {imported} conversations from {output_file}")
+    else:
+        print(f"Loaded existing dataset with {len(store)} conversations from {store.directory}")
+    return store
+
+_generations = itertools.count(1)
+
+def generation_tag() -> str:
+    """Metrics tag for the calls of a conversation whose id is only assigned once it completes"""
+    return f"generation-{next(_generations)}"
+
+def append_new_conversation(store, conversation) -> dict:
+    """Gives a conversation generated without an id the store's next id and appends it.
+    Ids handed out on completion leave no gaps when a conversation in flight fails."""
+    conversation["id"] = store.next_id()
+    store.append(conversation)
+    return conversation
+
+def export_dataset(store, generated, num_conversations, output_file):
+    """Compacts the shard store into output_file in the usual JSON layout"""
+    store.export_json(output_file, status=f"Generated {generated}/{num_conversations} conversations")
+    print(f"Dataset exported to {output_file}")
+
+def generate_dataset(num_conversations=5, student_types=None, topics=None, output_file="interview_dataset.json", concurrency=1):
     """Generate a dataset of multiple conversations with API limit handling.
-    Appends to output_file if it exists (does not overwrite)."""
+    Appends to output_file if it exists (does not overwrite).
+    Each conversation is appended to a JSONL shard store as soon as it is done,
+    output_file is exported from the store at the end of the run.
+    With concurrency > 1 the conversations are generated by generate_dataset_async."""
+    if concurrency > 1:
+        import asyncio
+        return asyncio.run(generate_dataset_async(num_conversations, student_types, topics, output_file, concurrency))
+
     if student_types is None:
         student_types = ["poor_student", "average_student", "good_student"]
     if topics is None:
-        # Use the same topics pool as generate_conversation
-        topics = [
-            "Design a global live video streaming service like Youtube or Netflix",
-            "Design a ride-sharing service like Uber or Lyft",
-            "Design a real-time messaging system like WhatsApp or Slack",
-            "Design a URL shortening service like bit.ly",
-            "Design an e-commerce platform like Amazon",
-            "Design a large-scale logging and metrics system",
-            "Design a scalable job scheduler and worker system",
-            "Design a distributed file storage system like Google Drive",
-            "Design a recommendation engine for content platforms",
-            "Design a real-time analytics dashboard system",
-            "Design a multi-tenant SaaS application platform"
-        ]
+        topics = DEFAULT_TOPICS
     
-    # Load existing dataset if present to append
+    # Open (or create) the shard store so new conversations are appended
+    store = open_dataset_store(output_file)
     conversations = []
-    existing_student_types = set()
-    existing_topics = set()
-    try:
-        with open(output_file, 'r', encoding='utf-8') as f:
-            existing = json.load(f)
-            if isinstance(existing, dict) and 'conversations' in existing:
-                conversations = existing['conversations']
-                di = existing.get('dataset_info', {})
-                for c in conversations:
-                    existing_student_types.add(c.get('student_level'))
-                    existing_topics.add(c.get('topic'))
-                print(f"Loaded existing dataset with {len(conversations)} conversations from {output_file}")
-    except FileNotFoundError:
-        pass
     
-    for i in range(num_conversations):
-        next_id = (max((c['id'] for c in conversations), default=0) + 1)
-        conversation_id = f"conversation_{next_id:03d}"
-        student_type = random.choice(student_types)
-        topic = random.choice(topics)
-        
-        print(f"\nGenerating conversation {i+1}/{num_conversations} (ID: {conversation_id})")
-        print(f"Student type: {student_type}, Topic: {topic}")
-        
-        try:
-            conversation = generate_conversation(conversation_id, student_type, topic, None)
-            conversations.append(conversation)
-            print(f"Completed conversation {i+1} with {conversation['exchanges']} exchanges")
-            
-            # Save progress after each conversation
-            dataset = {
-                "dataset_info": {
-                    "total_conversations": len(conversations),
-                    "generated_at": datetime.now().isoformat(),
-                    "student_types_used": list(set([c["student_level"] for c in conversations]) | existing_student_types),
-                    "topics_covered": list(set([c["topic"] for c in conversations]) | existing_topics),
-                    "status": f"Generated {len(conversations)}/{num_conversations} conversations"
-                },
-                "conversations": conversations
-            }
+    try:
+        for i in range(num_conversations):
+            next_id = store.next_id()
+            conversation_id = f"conversation_{next_id:03d}"
+            student_type = random.choice(student_types)
+            topic = random.choice(topics)
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(dataset, f, indent=2, ensure_ascii=False)
-            print(f"Progress saved to {output_file}")
+            print(f"\nGenerating conversation {i+1}/{num_conversations} (ID: {conversation_id})")
+            print(f"Student type: {student_type}, Topic: {topic}")
             
-        except Exception as e:
-            print(f"Error generating conversation {i+1}: {str(e)}")
-            print(f"API limit or error encountered. Saving {len(conversations)} completed conversations.")
-            break
+            try:
+                with get_metrics().context(conversation_id=next_id):
+                    conversation = generate_conversation(conversation_id, student_type, topic, None)
+                conversations.append(conversation)
+                print(f"Completed conversation {i+1} with {conversation['exchanges']} exchanges")
+                
+                # Save progress after each conversation
+                store.append(conversation)
+                
+            except Exception as e:
+                print(f"Error generating conversation {i+1}: {str(e)}")
+                print(f"API limit or error encountered. Saving {len(conversations)} completed conversations.")
+                break
+    finally:
+        export_dataset(store, len(conversations), num_conversations, output_file)
+        get_metrics().print_summary()
     
     return conversations
 
+async def generate_dataset_async(num_conversations=5, student_types=None, topics=None, output_file="interview_dataset.json", concurrency=4):
+    """Generate a dataset keeping up to `concurrency` conversations in flight at once.
+    Each conversation still runs its turns in order (in a worker thread); progress is
+    saved and the next free id assigned as each conversation completes, so a failed
+    conversation leaves no gap in the ids. After the first error no new conversations
+    are started."""
+    if student_types is None:
+        student_types = ["poor_student", "average_student", "good_student"]
+    if topics is None:
+        topics = DEFAULT_TOPICS
+
+    import asyncio
+    store = open_dataset_store(output_file)
+    conversations = []
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+
+    async def worker(i):
+        student_type = random.choice(student_types)
+        topic = random.choice(topics)
+        async with semaphore:
+            if stop.is_set():
+                return
+            print(f"\nGenerating conversation {i+1}/{num_conversations}")
+            print(f"Student type: {student_type}, Topic: {topic}")
+            try:
+                # to_thread copies the current context, so the worker's calls are tagged too
+                with get_metrics().context(generation=generation_tag()):
+                    conversation = await asyncio.to_thread(generate_conversation, None, student_type, topic, None)
+            except Exception as e:
+                stop.set()
+                print(f"Error generating conversation {i+1}: {str(e)}")
+                print(f"API limit or error encountered. No new conversations will be started.")
+                return
+        # Runs on the event loop thread, so ids and appends never interleave
+        append_new_conversation(store, conversation)
+        conversations.append(conversation)
+        print(f"Completed conversation {i+1} (ID: conversation_{conversation['id']:03d}) with {conversation['exchanges']} exchanges")
+
+    try:
+        await asyncio.gather(*(worker(i) for i in range(num_conversations)))
+    finally:
+        export_dataset(store, len(conversations), num_conversations, output_file)
+        get_metrics().print_summary()
+    return conversations
+
 # Generate a single conversation for testing
 if __name__ == "__main__":
     # Generate single conversation
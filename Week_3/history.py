@@ -0,0 +1,69 @@
+"""Conversation history for the dual-model generator.
+
+Only the real dialogue is stored. The per-turn instruction template is sent as a
+transient part of the final user message and never kept, so the request size
+grows with the dialogue only. Optionally only the last `window` turns are sent
+verbatim and older turns are folded into a running summary.
+"""
+
+SPEAKER_NAMES = {"interviewer": "Interviewer", "interviewee": "Interviewee"}
+
+
+class ConversationHistory:
+
+    def __init__(self, topic, window=None, summarizer=None):
+        """window: number of most recent turns sent verbatim (None sends all of them).
+        summarizer(summary, turns) -> new summary, called when turns fall out of the window."""
+        self.topic = topic
+        self.window = window
+        self.summarizer = summarizer
+        self.turns = []
+        self.summary = ""
+        self.summarized = 0
+
+    def add(self, speaker, text):
+        self.turns.append((speaker, text))
+
+    def _fold_old_turns(self):
+        if self.window is None or self.summarizer is None:
+            return
+        cutoff = len(self.turns) - self.window
+        if cutoff > self.summarized:
+            self.summary = self.summarizer(self.summary, self.turns[self.summarized:cutoff])
+            self.summarized = cutoff
+
+    def visible_turns(self) -> list:
+        self._fold_old_turns()
+        if self.window is None:
+            return self.turns
+        return self.turns[max(self.summarized, len(self.turns) - self.window):]
+
+    def build_request(self, speaker, instruction) -> list:
+        """Gemini contents as seen by `speaker`: their own turns are 'model' messages,
+        the other side's turns are 'user' messages, and the instruction is appended
+        to the final user message. Consecutive messages of one role are merged."""
+        visible = self.visible_turns()
+        opening = [self.topic]
+        if self.summary:
+            opening.append(f"Summary of the interview so far:\n{self.summary}")
+        messages = [{'role': 'user', 'parts': opening}]
+
+        for turn_speaker, text in visible:
+            if turn_speaker == speaker:
+                role, part = 'model', text
+            else:
+                role, part = 'user', f"{SPEAKER_NAMES[turn_speaker]}: {text}"
+            if messages[-1]['role'] == role:
+                messages[-1]['parts'].append(part)
+            else:
+                messages.append({'role': role, 'parts': [part]})
+
+        if messages[-1]['role'] == 'user':
+            messages[-1]['parts'].append(instruction)
+        else:
+            messages.append({'role': 'user', 'parts': [instruction]})
+        return messages
+
+
+def format_turns(turns) -> str:
+    return "\n".join(f"{SPEAKER_NAMES[speaker]}: {text}" for speaker, text in turns)
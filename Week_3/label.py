@@ -1,31 +1,37 @@
-import json
-import os
-import google.generativeai as genai
-from datasets import Dataset
-from dotenv import load_dotenv
-import random, time
-# Configure Gemini API
-
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel(model_name="gemini-2.5-pro")  # or gemini-pro
+import os, sys
+import datetime
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.client import get_client
+from common.metrics import get_metrics
+from common.cache import get_cache
+from common.checkpoint import LabelCheckpoint
+from common.dataset_reader import sample_conversations
+from common.label_schema import SYSTEM_DESIGN, label_with_repair
+
+# Gemini is configured by the shared client on first use (GEMINI_API_KEY, .env)
+
+MODEL_NAME = "gemini-2.5-pro"  # or gemini-pro
+rubric_cache = None  # explicit cached-content handle, created on first use
+rubric_cache_lock = threading.Lock()
+GENERATION_CONFIG = {"response_mime_type" : "application/json"}
 
 # === CONFIG ===
 INPUT_FILE = "interview_dataset_5.json"
 OUTPUT_FILE = "labels.json"
+SAMPLE_SIZE = 7
+ID_RANGE = None  # e.g. (1, 100) to sample only from that id range
 
-# === PROMPT TEMPLATE ===
-def build_prompt(conversation):
+# Explicit context caching needs a minimum prompt size; if creating the cache fails
+# the rubric is still sent as a system_instruction, which the API caches implicitly.
+USE_EXPLICIT_CACHE = False
+CACHE_TTL = datetime.timedelta(hours=1)
 
-    topic = conversation["topic"]
-    convo = ""
-    for exchange in conversation["conversation"] : 
-        if exchange["speaker"] == "interviewer" :
-            convo += ("Interviewer : " + exchange["speech"])
-        else :
-            convo += ("Interviewee : " + exchange["speech"])
-        convo += "\n"
-    prompt = f"""
+# === PROMPT TEMPLATE ===
+# The rubric is the static, cacheable prefix of every request, so it goes into the
+# system instruction and the conversation is the only variable part of the prompt.
+LABEL_RUBRIC = """
         You are an expert technical interviewer and evaluator.  
     Your task is to **evaluate the candidate’s performance** in the following system design interview conversation.
 
@@ -75,9 +81,7 @@ def build_prompt(conversation):
 
     ---
 
-    ### Input Conversation
-
-    {convo}
+    The conversation to evaluate is given in the user message.
 
     ---
 
@@ -85,7 +89,7 @@ def build_prompt(conversation):
 
     Return **only** the following JSON, with integer scores from 0–2 for each rubric category:
 
-    {{
+    {
     "problem_understanding": int,
     "structured_approach": int,
     "architecture_evolution": int,
@@ -96,66 +100,99 @@ def build_prompt(conversation):
     "reliability": int,
     "communication": int,
     "completeness": int
-    }}
+    }
 
     Do not include explanations, comments, or reasoning.  
     Return valid JSON **only**.
+""".strip()
 
 
+def build_prompt(conversation):
+
+    topic = conversation["topic"]
+    convo = ""
+    for exchange in conversation["conversation"] : 
+        if exchange["speaker"] == "interviewer" :
+            convo += ("Interviewer : " + exchange["speech"])
+        else :
+            convo += ("Interviewee : " + exchange["speech"])
+        convo += "\n"
+    prompt = f"""
+    ### Input Conversation
+
+    {convo}
     """
     return prompt.strip()
 
 
-def label_dataset():
-    # with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    #     data = json.load(f)
-    # Extract the "conversations" field first
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)["conversations"]
-
-    # Then load into a Dataset object
-    dataset = Dataset.from_list(data)
-    indices = random.sample(range(len(dataset)),7)
-    dataset = dataset.select(indices)
-    # print(dataset)
-    results = []
-    count = 0
-    samples = [sample for sample in dataset]
-    for sample in samples:
-        count += 1
-        prompt = build_prompt(sample)
-        print(f"Labelling entry no. : {count}, id no. : {sample["id"]}")
-        try:
-            response = model.generate_content(prompt,
-            generation_config={
-                "response_mime_type" : "application/json"
-            })
-            # parse JSON safely
-            text = response.text.strip()
+def get_rubric_cache():
+    """Explicit cached-content handle for the rubric when USE_EXPLICIT_CACHE is set,
+    None to rely on implicit prefix caching of the system instruction"""
+    global rubric_cache, USE_EXPLICIT_CACHE
+    if not USE_EXPLICIT_CACHE:
+        return None
+    with rubric_cache_lock:
+        if rubric_cache is None:
             try:
-                label = json.loads(text)
-            except json.JSONDecodeError:
-                # handle model returning extra text or invalid JSON
-                start = text.find("{")
-                end = text.rfind("}")
-                label = json.loads(text[start:end+1])
-
-            results.append({
-                "conversation" : sample,
-                "label": label
-            })
+                get_client().gemini()  # configures the API key before creating the cache
+                from google.generativeai import caching
+                rubric_cache = caching.CachedContent.create(
+                    model=f"models/{MODEL_NAME}",
+                    display_name="label-rubric",
+                    system_instruction=LABEL_RUBRIC,
+                    ttl=CACHE_TTL,
+                )
+                print(f"Using cached rubric {rubric_cache.name}")
+            except Exception as e:
+                print(f"Could not create cached content, using system_instruction: {e}")
+                USE_EXPLICIT_CACHE = False
+        return rubric_cache
+
+
+def label_sample(sample):
+    """Labels one conversation, returns the rubric scores
+    (per-call input / cached / output tokens go to the metrics file)"""
+    prompt = build_prompt(sample)
+    # Missing or invalid criteria are asked for again in a short follow-up
+    return label_with_repair(prompt, SYSTEM_DESIGN, ask)
+
+
+def ask(messages, stage):
+    return get_client().generate(messages, MODEL_NAME, GENERATION_CONFIG, system_instruction=LABEL_RUBRIC,
+                                 stage=stage, cached_content=get_rubric_cache())
 
-            time.sleep(35)
 
-        except Exception as e:
-            print(f"Error on sample: {e}")
-            continue
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+def label_dataset():
+    checkpoint = LabelCheckpoint(OUTPUT_FILE)
+    # Stream the dataset and sample only among conversations that are not labelled yet
+    samples = sample_conversations(INPUT_FILE, SAMPLE_SIZE, id_range=ID_RANGE,
+                                   where=lambda conversation: not checkpoint.is_done(conversation["id"]))
+    count = 0
+    try:
+        for sample in samples:
+            count += 1
+            if checkpoint.is_done(sample["id"]):
+                continue
+            print(f"Labelling entry no. : {count}, id no. : {sample['id']}")
+            try:
+                with get_metrics().context(conversation_id=sample["id"]):
+                    label = label_sample(sample)
+                checkpoint.record({
+                    "conversation" : sample,
+                    "label": label
+                })
+
+            except Exception as e:
+                print(f"Error on sample: {e}")
+                checkpoint.record_failure(sample["id"], e)
+                continue
+    finally:
+        checkpoint.finalize()
 
     print(f"✅ Saved labeled dataset to {OUTPUT_FILE}")
     print(count)
+    print(f"Cache: {get_cache().stats()}")
+    get_metrics().print_summary()
 
 if __name__ == "__main__":
     label_dataset()
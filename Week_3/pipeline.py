@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Generate and label in one pipelined run.
+
+    python pipeline.py --conversations 50 --labeller gpt --output interview_dataset.json
+
+Every conversation is put on a bounded queue as soon as it is generated and a
+pool of labellers takes it from there right away, so the generation and the
+labelling quotas are used at the same time and the wall time comes close to
+that of the slower stage instead of the sum of both. When the labellers fall
+behind the queue fills up and generation waits before starting more
+(back-pressure); when generation is slower the labellers simply wait for work.
+
+Conversations are saved to the dataset's shard store and labels to the
+labeller's checkpoint as they finish, like the standalone scripts do.
+Conversations already in the dataset that have no label yet are labelled too.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.checkpoint import LabelCheckpoint
+from common.metrics import get_metrics
+
+# === CONFIG ===
+NUM_CONVERSATIONS = 10
+OUTPUT_FILE = "interview_dataset.json"
+LABELLER = "gpt"
+LABELS_FILE = "interview_labels.json"
+GENERATE_CONCURRENCY = 4
+LABEL_CONCURRENCY = 4
+QUEUE_SIZE = 8  # finished conversations waiting for a labeller before generation pauses
+
+
+async def run_pipeline(num_conversations=NUM_CONVERSATIONS, output_file=OUTPUT_FILE, labeller=LABELLER,
+                       labels_file=LABELS_FILE, generate_concurrency=GENERATE_CONCURRENCY,
+                       label_concurrency=LABEL_CONCURRENCY, queue_size=QUEUE_SIZE,
+                       student_types=None, topics=None) -> tuple:
+    """Returns (generated conversations, label records made in this run)"""
+    import asyncio
+    import generator
+    from queue_worker import STUDENT_TYPES, label_with
+
+    store = generator.open_dataset_store(output_file)
+    checkpoint = LabelCheckpoint(labels_file)
+    label = label_with(labeller)
+    queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(generate_concurrency)
+    stop = asyncio.Event()
+    first_id = store.next_id()
+    generated, labelled = [], []
+    waits = {"generate": 0.0, "label": 0.0}  # producers blocked on a full queue / labellers on an empty one
+
+    async def hand_over(conversation):
+        started = time.perf_counter()
+        await queue.put(conversation)
+        waits["generate"] += time.perf_counter() - started
+
+    async def produce(i):
+        student_type = random.choice(student_types or STUDENT_TYPES)
+        topic = random.choice(topics or generator.DEFAULT_TOPICS)
+        async with semaphore:
+            if stop.is_set():
+                return
+            print(f"\nGenerating conversation {i+1}/{num_conversations}")
+            try:
+                with get_metrics().context(generation=generator.generation_tag()):
+                    conversation = await asyncio.to_thread(generator.generate_conversation, None,
+                                                           student_type, topic, None)
+            except Exception as e:
+                stop.set()
+                print(f"Error generating conversation {i+1}: {str(e)}")
+                print(f"API limit or error encountered. No new conversations will be started.")
+                return
+            # The id is assigned on completion, so failed conversations leave no gaps
+            generator.append_new_conversation(store, conversation)
+            generated.append(conversation)
+            # Still holding the generation slot, so a full queue pauses generation
+            await hand_over(conversation)
+
+    async def backlog():
+        for conversation in store.iter_conversations():
+            if conversation["id"] < first_id and not checkpoint.is_done(conversation["id"]):
+                await hand_over(conversation)
+
+    async def consume():
+        while True:
+            started = time.perf_counter()
+            conversation = await queue.get()
+            waits["label"] += time.perf_counter() - started
+            if conversation is None:
+                return
+            print(f"Labelling id no. : {conversation['id']} ({queue.qsize()} waiting)")
+            try:
+                with get_metrics().context(conversation_id=conversation["id"]):
+                    record = await asyncio.to_thread(label, conversation)
+            except Exception as e:
+                print(f"Error on sample: {e}")
+                checkpoint.record_failure(conversation["id"], e)
+                continue
+            # Runs on the event loop thread, so checkpoint appends never interleave
+            checkpoint.record(record)
+            labelled.append(record)
+
+    async def produce_all():
+        await asyncio.gather(backlog(), *(produce(i) for i in range(num_conversations)))
+        for _ in consumers:
+            await queue.put(None)
+
+    consumers = [asyncio.create_task(consume()) for _ in range(label_concurrency)]
+    producers = asyncio.create_task(produce_all())
+    try:
+        # Raises as soon as a labeller dies, instead of leaving the producers blocked on a full queue;
+        # the finally below then cancels them
+        await asyncio.gather(producers, *consumers)
+    except Exception as e:
+        stop.set()
+        print(f"Pipeline stopped: {e!r}")
+        raise
+    finally:
+        for task in [producers, *consumers]:
+            task.cancel()
+        generator.export_dataset(store, len(generated), num_conversations, output_file)
+        checkpoint.finalize()
+    print(f"\nGenerated {len(generated)} conversations, labelled {len(labelled)}")
+    print(f"Generation waited {waits['generate']:.1f}s on a full queue, "
+          f"labellers waited {waits['label']:.1f}s for work")
+    return generated, labelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and label conversations in one pipelined run")
+    parser.add_argument("--conversations", type=int, default=NUM_CONVERSATIONS)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--labeller", choices=["gpt", "gemini", "cascade"], default=LABELLER)
+    parser.add_argument("--labels-output", default=LABELS_FILE)
+    parser.add_argument("--generate-concurrency", type=int, default=GENERATE_CONCURRENCY)
+    parser.add_argument("--label-concurrency", type=int, default=LABEL_CONCURRENCY)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--single-call", action="store_true", help="write each conversation in one request")
+    args = parser.parse_args()
+
+    import asyncio
+    import generator
+    generator.SINGLE_CALL = args.single_call
+    started = time.perf_counter()
+    asyncio.run(run_pipeline(args.conversations, args.output, args.labeller, args.labels_output,
+                             args.generate_concurrency, args.label_concurrency, args.queue_size))
+    print(f"Pipeline finished in {time.perf_counter() - started:.1f}s")
+    get_metrics().print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Generate and label through the shared work queue (common/work_queue.py).
+
+    python queue_worker.py enqueue-generate --count 200
+    python queue_worker.py enqueue-labels --input interview_dataset.json --labeller gpt
+    python queue_worker.py work --kind generate --threads 4     # start as many of these as you like
+    python queue_worker.py status
+    python queue_worker.py export-generated --output interview_dataset.json
+    python queue_worker.py export-labels --labeller gpt --output interview_labels.json
+
+Workers in any number of processes (or machines sharing the queue file) claim
+tasks under a lease, keep it alive while they work and store the result in the
+queue. Exporting appends the finished results to the dataset / label files in
+one place. Generated conversations get their ids there, from the dataset's
+shard store, so ids continue after whatever is already in it and a task that
+failed for good leaves no gap. Only one process should write to a shard store
+at a time, so do not export while generator.py appends to the same dataset.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "labelling"))
+from common.work_queue import WorkQueue, worker_name
+from common.checkpoint import LabelCheckpoint
+from common.dataset_reader import iter_conversations
+
+# === CONFIG ===
+QUEUE_FILE = "work_queue.sqlite"
+LEASE_SECONDS = 600  # a generate task makes ~10 rate-limited calls, keep the lease well above that
+STUDENT_TYPES = ["poor_student", "average_student", "good_student"]
+
+
+def label_with(labeller):
+    """Returns fn(conversation) -> label record, in the output format of that labeller"""
+    if labeller == "gemini":
+        import label
+        return lambda conversation: {"conversation": conversation, "label": label.label_sample(conversation)}
+    if labeller == "cascade":
+        import cascade_label
+        return cascade_label.label_conversation
+    if labeller == "dsa":
+        import label_gpt_dsa
+        return lambda conversation: {"id": conversation["id"], "label": label_gpt_dsa.label_interview(conversation)}
+    import label_gpt
+    return lambda conversation: {"id": conversation["id"], "label": label_gpt.label_sample(conversation)}
+
+
+def run_task(task):
+    from common.metrics import get_metrics
+    payload = task["payload"]
+    if task["kind"] == "generate":
+        import generator
+        with get_metrics().context(generation=task["key"]):
+            return generator.generate_conversation(None, payload["student_type"],
+                                                   payload["topic"], payload.get("max_turns"))
+    with get_metrics().context(conversation_id=payload["conversation"]["id"]):
+        return label_with(payload["labeller"])(payload["conversation"])
+
+
+def keep_alive(queue, task, done):
+    """Extends the lease every third of its length until the task is finished"""
+    while not done.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(task):
+            print(f"Lost the lease on task {task['key']}")
+            return
+
+
+def work(queue_file, kinds, threads=1, max_tasks=None):
+    """Claims and runs tasks until the queue has nothing left for these kinds"""
+    processed = [0]
+    counter_lock = threading.Lock()
+
+    def worker(index):
+        queue = WorkQueue(queue_file, LEASE_SECONDS)
+        name = worker_name(index)
+        while True:
+            with counter_lock:
+                if max_tasks is not None and processed[0] >= max_tasks:
+                    break
+            task = next((t for t in (queue.claim(kind, name) for kind in kinds) if t), None)
+            if task is None:
+                break
+            print(f"[{name}] {task['kind']} {task['key']} (attempt {task['attempts']})")
+            done = threading.Event()
+            threading.Thread(target=keep_alive, args=(queue, task, done), daemon=True).start()
+            try:
+                result = run_task(task)
+            except Exception as e:
+                print(f"[{name}] Error on {task['key']}: {e}")
+                queue.fail(task, e)
+                continue
+            finally:
+                done.set()
+            if not queue.complete(task, result):
+                print(f"[{name}] Lease on {task['key']} expired, result dropped")
+            with counter_lock:
+                processed[0] += 1
+        queue.close()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    print(f"Worker finished, {processed[0]} tasks done")
+    from common.metrics import get_metrics
+    get_metrics().print_summary()
+
+
+def enqueue_generate(queue, count, student_types=None, topics=None):
+    """Adds `count` generate tasks; the conversations get their ids on export"""
+    import generator
+    added = 0
+    for number in queue.reserve_ids(count, name="generate_task"):
+        payload = {
+            "student_type": random.choice(student_types or STUDENT_TYPES),
+            "topic": random.choice(topics or generator.DEFAULT_TOPICS),
+        }
+        added += queue.enqueue("generate", f"generate:{number}", payload)
+    print(f"Enqueued {added} generate tasks")
+
+
+def enqueue_labels(queue, input_file, labeller, id_range=None):
+    """Adds one label task per conversation in input_file (already queued ids are skipped)"""
+    added = 0
+    for conversation in iter_conversations(input_file, id_range=id_range):
+        payload = {"labeller": labeller, "conversation": conversation}
+        added += queue.enqueue("label", f"label:{labeller}:{conversation['id']}", payload)
+    print(f"Enqueued {added} label tasks")
+
+
+def export_generated(queue, output_file):
+    """Appends finished conversations to output_file's shard store with the store's next ids
+    and re-exports the JSON.
+    The id is saved in the queue before the append and the task is marked exported right
+    after it, so an export interrupted in between finds the conversation in the store
+    on the next run instead of appending it twice."""
+    import generator
+    store = generator.open_dataset_store(output_file)
+    finished = queue.unexported("generate")
+    assigned = {conversation["id"]: conversation for _, conversation in finished if conversation.get("id")}
+    stored = set()
+    if assigned:
+        stored = {c["id"] for c in store.iter_conversations() if assigned.get(c["id"]) == c}
+    for task_id, conversation in finished:
+        if conversation.get("id") not in stored:
+            conversation["id"] = store.next_id()
+            queue.set_result(task_id, conversation)
+            store.append(conversation)
+        queue.mark_exported([task_id])
+    print(f"Exported {len(finished)} conversations, {len(finished) - len(stored)} new")
+    generator.export_dataset(store, len(finished), len(finished), output_file)
+
+
+def export_labels(queue, labeller, output_file):
+    """Merges finished labels of one labeller into output_file"""
+    checkpoint = LabelCheckpoint(output_file)
+    exported = []
+    for task_id, record in queue.unexported("label", f"label:{labeller}:"):
+        checkpoint.record(record)
+        exported.append(task_id)
+    queue.mark_exported(exported)
+    results = checkpoint.finalize()
+    print(f"Exported {len(exported)} labels, {len(results)} in {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work queue for parallel generation and labelling")
+    parser.add_argument("--queue", default=QUEUE_FILE, help="SQLite queue file shared by all workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("enqueue-generate")
+    p.add_argument("--count", type=int, required=True)
+    p.add_argument("--student-types", nargs="*")
+    p = sub.add_parser("enqueue-labels")
+    p.add_argument("--input", required=True)
+    p.add_argument("--labeller", choices=["gpt", "dsa", "gemini", "cascade"], default="gpt")
+    p.add_argument("--id-range", type=int, nargs=2)
+    p = sub.add_parser("work")
+    p.add_argument("--kind", choices=["generate", "label", "any"], default="any")
+    p.add_argument("--threads", type=int, default=1)
+    p.add_argument("--max-tasks", type=int)
+    sub.add_parser("status")
+    p = sub.add_parser("requeue-failed")
+    p.add_argument("--kind", choices=["generate", "label"])
+    p = sub.add_parser("export-generated")
+    p.add_argument("--output", default="interview_dataset.json")
+    p = sub.add_parser("export-labels")
+    p.add_argument("--labeller", choices=["gpt", "dsa", "gemini", "cascade"], default="gpt")
+    p.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    if args.command == "work":
+        kinds = ["generate", "label"] if args.kind == "any" else [args.kind]
+        return work(args.queue, kinds, args.threads, args.max_tasks)
+
+    queue = WorkQueue(args.queue, LEASE_SECONDS)
+    if args.command == "enqueue-generate":
+        enqueue_generate(queue, args.count, args.student_types)
+    elif args.command == "enqueue-labels":
+        enqueue_labels(queue, args.input, args.labeller, args.id_range)
+    elif args.command == "status":
+        for kind, counts in queue.stats().items():
+            print(f"{kind}: {counts}")
+    elif args.command == "requeue-failed":
+        print(f"Requeued {queue.requeue_failed(args.kind)} tasks")
+    elif args.command == "export-generated":
+        export_generated(queue, args.output)
+    else:
+        export_labels(queue, args.labeller, args.output)
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
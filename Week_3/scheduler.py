@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Generate conversations until target counts per (topic, student_level, difficulty) are met.
+
+    python scheduler.py --per-cell 2 --output interview_dataset.json
+    python scheduler.py --quotas quotas.json --concurrency 4
+    python scheduler.py --per-cell 2 --plan          # only show what is missing
+
+Quotas come from --per-cell (the same target for every topic x student level x
+difficulty) or a JSON file with [{"topic", "student_level", "difficulty", "count"}].
+The current counts are read from the dataset's shard store, so only the
+conversations still missing are generated, and a rerun picks up where the last
+one stopped.
+
+Topic and student level are inputs of a generation, the difficulty is not: it is
+the most frequent tag the interviewer used. Each generation therefore targets a
+cell with a difficulty hint and the outcome is only counted where it lands. The
+hint used for a (topic, level) is the open difficulty most likely to land in an
+open cell, from the hint -> difficulty outcomes seen so far in the run. A miss
+leaves the intended cell open, so it is planned again. No more generations are
+in flight than cells still open, new ones stop as soon as every quota is met,
+and MAX_EXTRA caps the generations spent on misses.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import get_metrics
+
+# === CONFIG ===
+OUTPUT_FILE = "interview_dataset.json"
+PER_CELL = 1
+CONCURRENCY = 4
+STUDENT_TYPES = ["poor_student", "average_student", "good_student"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+MAX_EXTRA = 1.0  # generations allowed on top of the missing count, as a share of it
+HINT_PRIOR = 2.0  # pseudo-count of a hint landing on its own difficulty before any outcome is seen
+
+
+def uniform_quotas(per_cell, topics=None, student_types=None, difficulties=None) -> dict:
+    """{(topic, student_level, difficulty): per_cell} for every combination"""
+    import generator
+    return {(topic, level, difficulty): per_cell
+            for topic in topics or generator.DEFAULT_TOPICS
+            for level in student_types or STUDENT_TYPES
+            for difficulty in difficulties or DIFFICULTIES}
+
+
+def load_quotas(path) -> dict:
+    """Quotas from a JSON list of {"topic", "student_level", "difficulty", "count"}"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    quotas = {}
+    for entry in entries:
+        difficulty = entry["difficulty"].title()
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"Unknown difficulty in {path}: {entry['difficulty']}")
+        quotas[(entry["topic"], entry["student_level"], difficulty)] = int(entry["count"])
+    return quotas
+
+
+def cell_of(conversation) -> tuple:
+    return conversation.get("topic"), conversation.get("student_level"), str(conversation.get("difficulty")).title()
+
+
+def current_counts(store) -> Counter:
+    """Conversations per cell already in the shard store"""
+    return Counter(cell_of(conversation) for conversation in store.iter_conversations())
+
+
+class QuotaPlanner:
+    """Picks the next (topic, student_level, target difficulty) to generate and keeps the counts"""
+
+    def __init__(self, quotas, counts, hint_prior=HINT_PRIOR):
+        self.quotas = dict(quotas)
+        self.counts = Counter(counts)
+        self.pending = Counter()  # generations in flight per intended cell
+        self.outcomes = {difficulty: Counter() for difficulty in DIFFICULTIES}  # hint -> landed difficulty
+        self.hint_prior = hint_prior
+
+    def missing(self, cell) -> int:
+        return max(0, self.quotas[cell] - self.counts[cell])
+
+    def open(self, cell) -> int:
+        """Missing conversations not yet covered by a generation in flight"""
+        return self.missing(cell) - self.pending[cell]
+
+    def total_missing(self) -> int:
+        return sum(self.missing(cell) for cell in self.quotas)
+
+    def done(self) -> bool:
+        return self.total_missing() == 0
+
+    def landing(self, hint) -> dict:
+        """P(difficulty | hint) from the outcomes so far"""
+        seen = self.outcomes[hint]
+        weights = {d: seen[d] + (self.hint_prior if d == hint else 0.0) for d in DIFFICULTIES}
+        total = sum(weights.values())
+        return {d: weight / total for d, weight in weights.items()}
+
+    def next(self):
+        """(topic, student_level, hint) of the next generation, None when no cell is open.
+        The generation is counted as in flight for that cell until record / release."""
+        open_cells = [cell for cell in self.quotas if self.open(cell) > 0]
+        if not open_cells:
+            return None
+        topic, level, _ = max(open_cells, key=self.open)
+        wanted = {d for d in DIFFICULTIES if (topic, level, d) in self.quotas and self.open((topic, level, d)) > 0}
+
+        def expected_useful(hint):
+            chances = self.landing(hint)
+            return sum(chances[d] for d in wanted), self.open((topic, level, hint))
+
+        hint = max(sorted(wanted), key=expected_useful)
+        self.pending[(topic, level, hint)] += 1
+        return topic, level, hint
+
+    def release(self, plan):
+        """A planned generation that did not produce a conversation"""
+        self.pending[plan] -= 1
+
+    def record(self, plan, conversation) -> bool:
+        """Counts a finished conversation, True when it filled a missing slot"""
+        self.release(plan)
+        cell = cell_of(conversation)
+        self.outcomes[plan[2]][cell[2]] += 1
+        useful = cell in self.quotas and self.missing(cell) > 0
+        self.counts[cell] += 1
+        return useful
+
+
+def print_plan(planner):
+    missing = [(cell, planner.missing(cell)) for cell in planner.quotas if planner.missing(cell)]
+    met = len(planner.quotas) - len(missing)
+    print(f"Quotas: {len(planner.quotas)} cells, {met} met, {planner.total_missing()} conversations missing")
+    for (topic, level, difficulty), count in sorted(missing):
+        print(f"  {count:>3}  {level:<16} {difficulty:<7} {topic}")
+
+
+def print_report(planner, generated, useful):
+    print("\n=== Quota scheduler ===")
+    print(f"Generated {generated}: {useful} filled a missing slot, {generated - useful} landed elsewhere")
+    for hint in DIFFICULTIES:
+        seen = planner.outcomes[hint]
+        if sum(seen.values()):
+            landed = ", ".join(f"{d} {seen[d]}" for d in DIFFICULTIES if seen[d])
+            print(f"  hint {hint:<6} -> {landed}")
+    if planner.done():
+        print("All quotas met")
+    else:
+        print_plan(planner)
+
+
+async def fill_quotas(quotas, output_file=OUTPUT_FILE, concurrency=CONCURRENCY, max_generations=None) -> list:
+    """Generates conversations into output_file's shard store until the quotas are met.
+    After the first error no new conversations are started."""
+    import asyncio
+    import generator
+
+    store = generator.open_dataset_store(output_file)
+    planner = QuotaPlanner(quotas, current_counts(store))
+    print_plan(planner)
+    missing = planner.total_missing()
+    if max_generations is None:
+        max_generations = math.ceil(missing * (1 + MAX_EXTRA))
+    conversations = []
+    running = {}
+    started = useful = 0
+    stopped = False
+
+    async def generate(plan):
+        topic, level, hint = plan
+        print(f"\nGenerating: {level}, target {hint}, {topic}")
+        with get_metrics().context(generation=generator.generation_tag()):
+            return await asyncio.to_thread(generator.generate_conversation, None, level, topic,
+                                           None, target_difficulty=hint.upper())
+
+    try:
+        while True:
+            while not stopped and len(running) < concurrency and started < max_generations:
+                plan = planner.next()
+                if plan is None:
+                    break
+                running[asyncio.create_task(generate(plan))] = plan
+                started += 1
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                plan = running.pop(task)
+                try:
+                    conversation = task.result()
+                except Exception as e:
+                    planner.release(plan)
+                    stopped = True
+                    print(f"Error generating conversation: {str(e)}")
+                    print(f"API limit or error encountered. No new conversations will be started.")
+                    continue
+                # Runs on the event loop thread, so ids and appends never interleave
+                generator.append_new_conversation(store, conversation)
+                conversations.append(conversation)
+                filled = planner.record(plan, conversation)
+                useful += filled
+                print(f"Completed id {conversation['id']}: landed {conversation['difficulty']} "
+                      f"({'filled' if filled else 'not needed'}), {planner.total_missing()} missing")
+        if not stopped and not planner.done():
+            print(f"\nStopped after {started} generations (max {max_generations})")
+    finally:
+        generator.export_dataset(store, len(conversations), missing, output_file)
+        print_report(planner, len(conversations), useful)
+        get_metrics().print_summary()
+    return conversations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate conversations until per-cell quotas are met")
+    parser.add_argument("--per-cell", type=int, default=PER_CELL, help="target for every topic x level x difficulty")
+    parser.add_argument("--quotas", help="JSON list of {topic, student_level, difficulty, count}")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--max-generations", type=int, default=None)
+    parser.add_argument("--plan", action="store_true", help="only print the missing counts")
+    parser.add_argument("--single-call", action="store_true", help="write each conversation in one request")
+    args = parser.parse_args()
+
+    quotas = load_quotas(args.quotas) if args.quotas else uniform_quotas(args.per_cell)
+    if args.plan:
+        import generator
+        print_plan(QuotaPlanner(quotas, current_counts(generator.open_dataset_store(args.output))))
+        return
+
+    import asyncio
+    import generator
+    generator.SINGLE_CALL = args.single_call
+    asyncio.run(fill_quotas(quotas, args.output, args.concurrency, args.max_generations))
+
+
+if __name__ == "__main__":
+    main()
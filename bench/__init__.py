@@ -0,0 +1 @@
+"""Offline benchmarks: a fake LLM API server and the end-to-end throughput harness."""
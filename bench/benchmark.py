@@ -0,0 +1,191 @@
+"""End-to-end throughput benchmark against the fake LLM server.
+
+    python -m bench.benchmark --conversations 50 --concurrency 8 --latency lognormal:0.5,0.4
+    python -m bench.benchmark --labeller dsa --labels 200 --error-429 0.05 --report bench.json
+
+Starts bench/fake_llm_server.py in-process, points the Gemini and OpenAI
+clients at it, then runs Week_3/generator.generate_dataset followed by a
+labeller's label_dataset in a scratch directory (or both at once through
+Week_3/pipeline.py with --pipeline). Reports conversations/sec,
+labels/sec, latency percentiles and peak memory per phase. The response cache
+is disabled and the rate limits are lifted (unless --respect-limits) so the
+numbers measure the pipeline, not the quota.
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "Week_3"), os.path.join(ROOT_DIR, "labelling")]
+
+from bench.fake_llm_server import FakeLLMServer, add_server_arguments, server_options
+
+LABELLERS = {
+    "gpt": ("label_gpt", None),
+    "dsa": ("label_gpt_dsa", os.path.join(ROOT_DIR, "dataset", "dsa_dataset.json")),
+    "gemini": ("label", None),
+}
+
+
+def configure_clients(url):
+    """Points the shared client at the fake server (read when it first connects)"""
+    os.environ["OPENAI_BASE_URL"] = url + "/v1"
+    os.environ["GEMINI_BASE_URL"] = url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["GEMINI_API_KEY"] = "fake"
+
+
+def prepare_shared_state(workdir, respect_limits):
+    from common.cache import get_cache
+    from common.metrics import get_metrics
+    from common.rate_limiter import get_limiter
+
+    get_cache().enabled = False
+    metrics = get_metrics()
+    metrics.path = os.path.join(workdir, "metrics.jsonl")
+    if not respect_limits:
+        limiter = get_limiter()
+        limiter.limits = {"default": {"rpm": 10 ** 7, "tpm": 10 ** 12}}
+        limiter.base_delay, limiter.max_delay = 0.05, 1.0
+    return metrics
+
+
+@contextlib.contextmanager
+def measured(name, results, metrics, quiet, trace_memory):
+    """Times a phase, captures its output and records peak memory and call metrics"""
+    first_record = len(metrics.records)
+    if trace_memory:
+        tracemalloc.start()
+    output = io.StringIO()
+    started = time.perf_counter()
+    phase = {}
+    try:
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            yield phase
+    finally:
+        phase["seconds"] = round(time.perf_counter() - started, 3)
+        if trace_memory:
+            phase["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            tracemalloc.stop()
+        phase["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        phase["calls"] = metrics.summary(metrics.records[first_record:])
+        results[name] = phase
+
+
+def run(args) -> dict:
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="llm_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+    results = {"server": server_options(args), "workdir": workdir}
+
+    with FakeLLMServer(**server_options(args)) as server:
+        configure_clients(server.url)
+        metrics = prepare_shared_state(workdir, args.respect_limits)
+        import generator
+        generator.STREAM_RESPONSES = not args.no_stream
+        os.chdir(workdir)
+
+        dataset_file = os.path.join(workdir, "interview_dataset.json")
+        if args.pipeline:
+            import asyncio
+            import pipeline
+            labels_file = os.path.join(workdir, f"{args.labeller}_labels.json")
+            with measured("pipeline", results, metrics, not args.verbose, not args.no_tracemalloc) as phase:
+                conversations, labels = asyncio.run(pipeline.run_pipeline(
+                    args.conversations, dataset_file, args.labeller, labels_file,
+                    args.concurrency, args.concurrency, args.queue_size))
+            phase["conversations"] = len(conversations)
+            phase["labels"] = len(labels)
+            phase["conversations_per_sec"] = round(len(conversations) / phase["seconds"], 3)
+            results["server_requests"] = server.llm.requests
+            return results
+
+        if args.conversations:
+            with measured("generate", results, metrics, not args.verbose, not args.no_tracemalloc) as phase:
+                conversations = generator.generate_dataset(args.conversations, output_file=dataset_file,
+                                                           concurrency=args.concurrency)
+            phase["conversations"] = len(conversations)
+            phase["conversations_per_sec"] = round(len(conversations) / phase["seconds"], 3)
+
+        if args.labeller:
+            module_name, default_input = LABELLERS[args.labeller]
+            labeller = importlib.import_module(module_name)
+            labeller.INPUT_FILE = default_input or dataset_file
+            labeller.OUTPUT_FILE = os.path.join(workdir, f"{args.labeller}_labels.json")
+            if args.labels and hasattr(labeller, "ID_RANGE"):
+                labeller.ID_RANGE = (1, args.labels)
+            if args.labeller == "gemini":
+                labeller.SAMPLE_SIZE = args.labels or labeller.SAMPLE_SIZE
+            with measured("label", results, metrics, not args.verbose, not args.no_tracemalloc) as phase:
+                labeller.label_dataset()
+            with open(labeller.OUTPUT_FILE, "r", encoding="utf-8") as f:
+                phase["labels"] = len(json.load(f))
+            phase["labels_per_sec"] = round(phase["labels"] / phase["seconds"], 3)
+        results["server_requests"] = server.llm.requests
+    return results
+
+
+def print_report(results):
+    print(f"\n=== Benchmark ({results['workdir']}) ===")
+    for name in ("generate", "label", "pipeline"):
+        phase = results.get(name)
+        if not phase:
+            continue
+        calls = phase["calls"]
+        rate = (f"{phase['labels_per_sec']} labels/s" if name == "label"
+                else f"{phase['conversations_per_sec']} conversations/s")
+        count = phase.get("conversations", phase.get("labels"))
+        if name == "pipeline":
+            count = f"{count} (+{phase['labels']} labels)"
+        print(f"{name:9s}: {count} in {phase['seconds']}s -> {rate}")
+        print(f"           calls {calls['calls']}, latency p50/p95/p99 {calls['latency_p50']}/{calls['latency_p95']}/{calls['latency_p99']}s, "
+              f"errors {sum(calls['errors'].values())}, retries {calls['retries']}")
+        if calls.get("streamed"):
+            print(f"           streamed {calls['streamed']} (stopped early {calls['stopped_early']}), "
+                  f"TTFT p50/p95 {calls['ttft_p50']}/{calls['ttft_p95']}s, time to tag p50/p95 {calls['time_to_tag_p50']}/{calls['time_to_tag_p95']}s")
+        memory = f"max RSS {phase['max_rss_mb']} MB"
+        if "peak_traced_mb" in phase:
+            memory = f"peak traced {phase['peak_traced_mb']} MB, " + memory
+        print(f"           {memory}")
+    print(f"Server requests: {results['server_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline generate + label throughput benchmark")
+    parser.add_argument("--conversations", type=int, default=10, help="conversations to generate (0 skips generation)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--labeller", choices=sorted(LABELLERS), default="gpt",
+                        help="gpt labels the generated dataset, dsa the bundled DSA dataset, gemini runs Week_3/label.py")
+    parser.add_argument("--labels", type=int, default=None, help="label only ids 1..N (sample size for gemini)")
+    parser.add_argument("--no-label", dest="labeller", action="store_const", const=None)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="generate and label in one pipelined run (Week_3/pipeline.py) instead of two phases")
+    parser.add_argument("--queue-size", type=int, default=8, help="pipeline queue size")
+    parser.add_argument("--no-stream", action="store_true", help="wait for whole interviewer replies instead of streaming them")
+    parser.add_argument("--respect-limits", action="store_true", help="keep the rpm / tpm limits from models.yaml")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip Python heap tracing (it slows the run down)")
+    parser.add_argument("--workdir", default=None, help="scratch directory, a fresh temp dir by default")
+    parser.add_argument("--report", default=None, help="also write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own progress output")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    if args.pipeline and args.labeller not in ("gpt", "gemini"):
+        parser.error("--pipeline labels the generated conversations, use --labeller gpt or gemini")
+    report = os.path.abspath(args.report) if args.report else None
+
+    results = run(args)
+    print_report(results)
+    if report:
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
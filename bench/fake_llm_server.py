@@ -0,0 +1,557 @@
+"""Local stand-in for the Gemini and OpenAI APIs, for offline benchmarks.
+
+    python -m bench.fake_llm_server --port 8765 --latency lognormal:0.8,0.4 --error-429 0.05
+
+Speaks enough of both REST APIs for the generator and the labellers:
+  Gemini  POST /v1beta/models/<model>:generateContent
+          POST /v1beta/models/<model>:streamGenerateContent  (JSON array or ?alt=sse)
+          POST /v1beta/cachedContents
+  OpenAI  POST /v1/chat/completions                            (optionally stream=true)
+          POST /v1/files, GET /v1/files/<id>/content
+          POST /v1/batches, GET /v1/batches/<id>
+
+Replies are templated from the request: interviewer turns end with a
+<EASY>/<MEDIUM>/<HARD> tag (sometimes followed by an aside) and eventually
+<END_OF_INTERVIEW> (sometimes right after a difficulty tag; a difficulty hint in
+the prompt is followed most of the time), interviewee
+turns follow the TYPE the prompt asks for, single-call prompts get the whole
+dialogue their plan describes, and labelling prompts get JSON with
+an integer 0-2 score for every `"criterion": int` listed in the rubric
+(one entry per id for packed prompts; with n > 1 the extra choices redraw a
+few of the scores). Latency is drawn from a configurable
+distribution and a fraction of requests fail with 429 or 500 (or, with
+--bad-labels, return a label with a missing / out of range score).
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+QUESTIONS = {
+    "EASY": [
+        "Let's start simple. Who are the users of this system and what are the core features you would support?",
+        "What kind of database would you pick for the main entities here, and why?",
+        "How would a client talk to the backend, which APIs would you expose?",
+    ],
+    "MEDIUM": [
+        "Good. How would you estimate the storage and bandwidth needs for the first year?",
+        "How would you cache the hottest reads, and how do you keep the cache consistent with the database?",
+        "Walk me through what happens end to end when a user makes a request, which services are involved?",
+    ],
+    "HARD": [
+        "Suppose one region goes down during peak traffic. How does your design keep serving users without losing writes?",
+        "How would you partition the data so no single shard becomes hot, and how do you rebalance when you add nodes?",
+        "What consistency guarantees do you give across regions, and what trade-offs does that force on you?",
+    ],
+}
+ANSWERS = {
+    "clear": "Okay, so I would split this into a few services behind a load balancer, keep the metadata in a replicated SQL store and put the large blobs in object storage with a CDN in front. Writes go through a queue so spikes do not hit the database directly.",
+    "confused": "Hmm, let me think... I guess we could add more servers? I'm not completely sure how the data would stay in sync between them, maybe a shared database?",
+    "misunderstood": "Right, so I guess you are asking about the user interface. I would keep the pages simple and load the content lazily so the app feels fast.",
+    "wrong": "I think a single big database server would be enough here, we can just scale it vertically and it will handle any amount of traffic.",
+}
+ASIDE = "(Take your time, and feel free to sketch the main components first. I care more about how you reason through the trade-offs than about one right answer, so think out loud as you go.)"
+CLOSING = "Thanks, that was a good discussion. We covered the main parts of the design, and the team will follow up on next steps."
+SUMMARY = "The candidate outlined the core services and storage, answered questions on caching and scaling, and struggled somewhat with multi-region consistency."
+HINT_FOLLOWED = 0.6  # share of questions that take the difficulty the interviewer prompt asks for
+SAMPLE_NOISE = 0.15  # share of scores redrawn in the extra candidates of a labelling request
+
+
+def estimate_tokens(text) -> int:
+    return len(text) // 4 + 1
+
+
+class LatencyModel:
+    """Parses fixed:S, uniform:A,B, normal:MEAN,STD or lognormal:MEDIAN,SIGMA (seconds)"""
+
+    def __init__(self, spec="fixed:0"):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self, rng) -> float:
+        if self.kind == "fixed":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(self.args[0], self.args[1])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(self.args[0], self.args[1]))
+        return rng.lognormvariate(0, self.args[1]) * self.args[0]
+
+
+class FakeLLM:
+    """Reply generation and fault injection shared by both API dialects"""
+
+    def __init__(self, latency="fixed:0", error_429=0.0, error_500=0.0, bad_labels=0.0, ttft_fraction=0.3,
+                 stream_chunks=8, seed=None):
+        self.latency = LatencyModel(latency)
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.bad_labels = bad_labels
+        self.ttft_fraction = ttft_fraction
+        self.stream_chunks = stream_chunks
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.cached_contents = {}
+        self.files = {}
+        self.batches = {}
+        self.requests = 0
+
+    def draw(self):
+        """(latency, injected error status or None) for one request"""
+        with self.lock:
+            self.requests += 1
+            latency = self.latency.sample(self.rng)
+            roll = self.rng.random()
+        if roll < self.error_429:
+            return latency * 0.1, 429
+        if roll < self.error_429 + self.error_500:
+            return latency * 0.5, 500
+        return latency, None
+
+    @staticmethod
+    def _seeded(text) -> random.Random:
+        return random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+    def reply(self, system, turns, sample=0) -> str:
+        """turns: [(role, text)] with role 'user' or 'model'; sample > 0 gives another
+        candidate for the same request (OpenAI n > 1)"""
+        prompt = "\n".join(text for _, text in turns)
+        everything = system + "\n" + prompt
+        rng = self._seeded(everything)
+
+        criteria = [c for c in dict.fromkeys(re.findall(r'"(\w+)"\s*:\s*int', everything)) if c != "id"]
+        if criteria:
+            # other candidates are noisy copies of the first label
+            text = self.label(everything, criteria, rng, self._seeded(f"{everything}#{sample}") if sample else None)
+            with self.lock:
+                defective = self.rng.random() < self.bad_labels
+            return self.defective(text, rng) if defective else text
+        if "#New exchanges" in prompt:
+            return SUMMARY
+        if "# Plan" in prompt:
+            return self.script(prompt, rng)
+        match = re.search(r"TYPE : (\w+)", turns[-1][1] if turns else "")
+        if match:
+            return "Interviewee: " + ANSWERS.get(match.group(1), ANSWERS["clear"])
+        own_turns = sum(1 for role, _ in turns if role == "model")
+        if own_turns >= 3 and rng.random() < 0.4:
+            # some closings still tag the difficulty of the last question
+            tag = f" <{rng.choice(list(QUESTIONS))}>" if rng.random() < 0.3 else ""
+            return f"Interviewer: {CLOSING}{tag} <END_OF_INTERVIEW>"
+        difficulty = rng.choice(list(QUESTIONS))
+        hint = re.search(r"Ask mostly (EASY|MEDIUM|HARD) questions", turns[-1][1] if turns else "")
+        if hint and rng.random() < HINT_FOLLOWED:
+            difficulty = hint.group(1)
+        # and some questions run on past their tag
+        aside = f"\n\n{ASIDE}" if rng.random() < 0.3 else ""
+        return f"Interviewer: {rng.choice(QUESTIONS[difficulty])} <{difficulty}>{aside}"
+
+    @staticmethod
+    def script(prompt, rng) -> str:
+        """A whole dialogue following the numbered plan of a single-call prompt"""
+        lines = []
+        for difficulty, response_type in re.findall(r"of difficulty (\w+),.*?Interviewee\[(\w+)\]", prompt):
+            lines.append(f"Interviewer: {rng.choice(QUESTIONS.get(difficulty, QUESTIONS['EASY']))} <{difficulty}>")
+            lines.append(f"Interviewee[{response_type}]: {ANSWERS.get(response_type, ANSWERS['clear'])}")
+        lines.append(f"Interviewer: {CLOSING} <END_OF_INTERVIEW>")
+        lines.append("Interviewee[closing]: Thank you, I enjoyed working through this with you.")
+        return "\n".join(lines)
+
+    @staticmethod
+    def label(prompt, criteria, rng, noise=None) -> str:
+        def scores():
+            drawn = {c: rng.choices([0, 1, 2], weights=[2, 5, 3])[0] for c in criteria}
+            if noise:
+                drawn = {c: noise.choice([0, 1, 2]) if noise.random() < SAMPLE_NOISE else score
+                         for c, score in drawn.items()}
+            return drawn
+        ids = re.search(r"\(ids: ([^)]*)\)", prompt)
+        if '"labels"' in prompt and ids:
+            entries = []
+            for raw in ids.group(1).split(","):
+                raw = raw.strip()
+                entries.append({"id": int(raw) if raw.lstrip("-").isdigit() else raw, "label": scores()})
+            return json.dumps({"labels": entries})
+        return json.dumps(scores())
+
+    @staticmethod
+    def defective(text, rng) -> str:
+        """A single label with one criterion missing or out of range, or wrapped in prose"""
+        scores = json.loads(text)
+        if "labels" in scores:
+            return text
+        criterion = rng.choice(list(scores))
+        kind = rng.choice(["missing", "range", "prose"])
+        if kind == "missing":
+            del scores[criterion]
+        elif kind == "range":
+            scores[criterion] = 3
+        else:
+            return f"Here are the scores: {json.dumps(scores)} Let me know if you need more detail."
+        return json.dumps(scores)
+
+    def chunks(self, text) -> list:
+        words = text.split(" ")
+        size = max(1, -(-len(words) // self.stream_chunks))
+        parts = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+        return [part + (" " if i < len(parts) - 1 else "") for i, part in enumerate(parts)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm: FakeLLM = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading a stream early
+
+    # --- plumbing ---
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, payload, content_type="application/json", headers=None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _error(self, status, gemini):
+        if status == 429:
+            message = "Resource has been exhausted (e.g. check quota). Please retry in 1s."
+            code = "RESOURCE_EXHAUSTED" if gemini else "rate_limit_exceeded"
+            headers = {"retry-after": "1"}
+        else:
+            message = "Internal error encountered."
+            code = "INTERNAL" if gemini else "server_error"
+            headers = {}
+        if gemini:
+            payload = {"error": {"code": status, "message": message, "status": code}}
+        else:
+            payload = {"error": {"message": message, "type": code, "code": code}}
+        self._send(status, payload, headers=headers)
+
+    def _stream_delays(self, latency, pieces):
+        ttft = latency * self.llm.ttft_fraction
+        rest = (latency - ttft) / max(1, pieces - 1)
+        return [ttft] + [rest] * (pieces - 1)
+
+    # --- routing ---
+    def do_GET(self):
+        path = urlparse(self.path).path
+        match = re.fullmatch(r"/v1/files/([\w-]+)/content", path)
+        if match and match.group(1) in self.llm.files:
+            return self._send(200, self.llm.files[match.group(1)]["content"], "application/octet-stream")
+        match = re.fullmatch(r"/v1/batches/([\w-]+)", path)
+        if match and match.group(1) in self.llm.batches:
+            return self._send(200, self._batch_status(match.group(1)))
+        match = re.fullmatch(r"/v1beta/(cachedContents/[\w-]+)", path)
+        if match and match.group(1) in self.llm.cached_contents:
+            return self._send(200, self.llm.cached_contents[match.group(1)]["resource"])
+        self._send(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._body()
+        if url.path == "/v1/chat/completions":
+            return self._openai_chat(json.loads(body))
+        if url.path == "/v1/files":
+            return self._openai_upload(body)
+        if url.path == "/v1/batches":
+            return self._openai_batch(json.loads(body))
+        if url.path == "/v1beta/cachedContents":
+            return self._gemini_cache(json.loads(body))
+        match = re.fullmatch(r"/v1beta/models/([\w.-]+):(generateContent|streamGenerateContent)", url.path)
+        if match:
+            sse = parse_qs(url.query).get("alt", [""])[0] == "sse"
+            return self._gemini_generate(match.group(1), match.group(2) == "streamGenerateContent", sse, json.loads(body))
+        self._send(404, {"error": {"code": 404, "message": f"Unknown path {url.path}"}})
+
+    # --- Gemini ---
+    @staticmethod
+    def _gemini_text(content) -> str:
+        if not content:
+            return ""
+        return "".join(part.get("text", "") for part in content.get("parts", []))
+
+    def _gemini_cache(self, request):
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        system = self._gemini_text(request.get("systemInstruction") or request.get("system_instruction"))
+        resource = {"name": name, "model": request.get("model"), "displayName": request.get("displayName", ""),
+                    "usageMetadata": {"totalTokenCount": estimate_tokens(system)}}
+        self.llm.cached_contents[name] = {"resource": resource, "system": system}
+        self._send(200, resource)
+
+    def _gemini_generate(self, model, stream, sse, request):
+        latency, error = self.llm.draw()
+        if error:
+            time.sleep(latency)
+            return self._error(error, gemini=True)
+
+        system = self._gemini_text(request.get("systemInstruction") or request.get("system_instruction"))
+        cached_tokens = 0
+        cached = self.llm.cached_contents.get(request.get("cachedContent") or request.get("cached_content"))
+        if cached:
+            system = cached["system"] + "\n" + system
+            cached_tokens = estimate_tokens(cached["system"])
+        turns = [(c.get("role", "user"), self._gemini_text(c)) for c in request.get("contents", [])]
+        text = self.llm.reply(system, turns)
+        usage = {
+            "promptTokenCount": estimate_tokens(system) + sum(estimate_tokens(t) for _, t in turns),
+            "candidatesTokenCount": estimate_tokens(text),
+            "cachedContentTokenCount": cached_tokens,
+        }
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+
+        def response(piece, last):
+            candidate = {"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}
+            payload = {"candidates": [candidate], "modelVersion": model}
+            if last:
+                candidate["finishReason"] = "STOP"
+                payload["usageMetadata"] = usage
+            return payload
+
+        if not stream:
+            time.sleep(latency)
+            return self._send(200, response(text, True))
+
+        pieces = self.llm.chunks(text)
+        self._start_stream("text/event-stream" if sse else "application/json")
+        if not sse:
+            self._write_chunk("[")
+        for index, (piece, delay) in enumerate(zip(pieces, self._stream_delays(latency, len(pieces)))):
+            time.sleep(delay)
+            payload = json.dumps(response(piece, index == len(pieces) - 1))
+            if sse:
+                self._write_chunk(f"data: {payload}\r\n\r\n")
+            else:
+                self._write_chunk(("," if index else "") + payload)
+        if not sse:
+            self._write_chunk("]")
+        self._end_stream()
+
+    # --- OpenAI ---
+    def _openai_reply(self, request, sample=0):
+        system, turns = "", []
+        for message in request.get("messages", []):
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+            if message.get("role") in ("system", "developer"):
+                system += content + "\n"
+            else:
+                turns.append(("model" if message.get("role") == "assistant" else "user", content))
+        text = self.llm.reply(system, turns, sample)
+        usage = {
+            "prompt_tokens": estimate_tokens(system) + sum(estimate_tokens(t) for _, t in turns),
+            "completion_tokens": estimate_tokens(text),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return text, usage
+
+    def _chat_completion(self, request, texts, usage):
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{"index": i, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                        for i, text in enumerate(texts)],
+            "usage": usage,
+        }
+
+    def _openai_chat(self, request):
+        latency, error = self.llm.draw()
+        if error:
+            time.sleep(latency)
+            return self._error(error, gemini=False)
+        text, usage = self._openai_reply(request)
+        if not request.get("stream"):
+            texts = [text]
+            for sample in range(1, request.get("n") or 1):
+                other, extra = self._openai_reply(request, sample)
+                texts.append(other)
+                usage["completion_tokens"] += extra["completion_tokens"]
+                usage["total_tokens"] += extra["completion_tokens"]
+            time.sleep(latency)
+            return self._send(200, self._chat_completion(request, texts, usage))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        pieces = self.llm.chunks(text)
+        self._start_stream("text/event-stream")
+        for index, (piece, delay) in enumerate(zip(pieces, self._stream_delays(latency, len(pieces)))):
+            time.sleep(delay)
+            last = index == len(pieces) - 1
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", ""),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": "stop" if last else None}],
+            }
+            if last and (request.get("stream_options") or {}).get("include_usage"):
+                chunk["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+    def _openai_upload(self, body):
+        boundary = self.headers.get("Content-Type", "").split("boundary=")[-1].strip('"').encode()
+        content, filename, purpose = b"", "upload.jsonl", "batch"
+        for part in body.split(b"--" + boundary):
+            head, _, data = part.partition(b"\r\n\r\n")
+            data = data[:-2] if data.endswith(b"\r\n") else data
+            if b'name="file"' in head:
+                content = data
+                match = re.search(rb'filename="([^"]*)"', head)
+                filename = match.group(1).decode() if match else filename
+            elif b'name="purpose"' in head:
+                purpose = data.decode().strip()
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.llm.files[file_id] = {"content": content}
+        self._send(200, self._file_object(file_id, filename, purpose, len(content)))
+
+    @staticmethod
+    def _file_object(file_id, filename, purpose, size):
+        return {"id": file_id, "object": "file", "bytes": size, "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def _openai_batch(self, request):
+        """Answers every request of the batch up front; the first poll reports it in progress"""
+        lines = self.llm.files[request["input_file_id"]]["content"].decode("utf-8").splitlines()
+        outputs, failed = [], 0
+        for line in filter(None, lines):
+            item = json.loads(line)
+            _, error = self.llm.draw()
+            if error:
+                failed += 1
+                response = {"status_code": error, "body": {"error": {"message": "injected error"}}}
+            else:
+                text, usage = self._openai_reply(item["body"])
+                response = {"status_code": 200, "body": self._chat_completion(item["body"], [text], usage)}
+            outputs.append(json.dumps({"id": f"batch_req_{uuid.uuid4().hex[:16]}",
+                                       "custom_id": item["custom_id"], "response": response, "error": None}))
+        output_id = f"file-{uuid.uuid4().hex[:24]}"
+        output = ("\n".join(outputs) + "\n").encode("utf-8")
+        self.llm.files[output_id] = {"content": output}
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        self.llm.batches[batch_id] = {
+            "request": request, "output_file_id": output_id, "polls": 0,
+            "counts": {"total": len(outputs), "completed": len(outputs), "failed": failed},
+        }
+        self._send(200, self._batch_object(batch_id, "validating"))
+
+    def _batch_object(self, batch_id, status):
+        batch = self.llm.batches[batch_id]
+        done = status == "completed"
+        return {
+            "id": batch_id, "object": "batch", "endpoint": batch["request"].get("endpoint"),
+            "input_file_id": batch["request"]["input_file_id"],
+            "completion_window": batch["request"].get("completion_window", "24h"),
+            "status": status, "created_at": int(time.time()),
+            "output_file_id": batch["output_file_id"] if done else None, "error_file_id": None,
+            "request_counts": batch["counts"] if done else {"total": batch["counts"]["total"], "completed": 0, "failed": 0},
+        }
+
+    def _batch_status(self, batch_id):
+        batch = self.llm.batches[batch_id]
+        batch["polls"] += 1
+        return self._batch_object(batch_id, "in_progress" if batch["polls"] == 1 else "completed")
+
+
+class FakeLLMServer:
+    """Runs the fake API in a background thread: `with FakeLLMServer(...) as server: server.url`"""
+
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.llm = FakeLLM(**options)
+        handler = type("BoundHandler", (Handler,), {"llm": self.llm})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0",
+                        help="fixed:S, uniform:A,B, normal:MEAN,STD or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-500", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--bad-labels", type=float, default=0.0,
+                        help="fraction of labelling replies with a missing / out of range score or extra text")
+    parser.add_argument("--ttft-fraction", type=float, default=0.3, help="share of the latency spent before the first streamed chunk")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def server_options(args) -> dict:
+    return {"latency": args.latency, "error_429": args.error_429, "error_500": args.error_500,
+            "bad_labels": args.bad_labels, "ttft_fraction": args.ttft_fraction, "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini / OpenAI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, **server_options(args))
+    print(f"Fake LLM server on {server.url}")
+    print(f"  export GEMINI_BASE_URL={server.url} OPENAI_BASE_URL={server.url}/v1")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start import benchmark for the generator and the labellers.
+
+    python -m bench.import_time                     # this checkout
+    python -m bench.import_time --compare HEAD~1    # also measure another revision
+
+Every module is imported in a fresh interpreter with `-X importtime`, several
+times, and the median of the module's cumulative import time is reported
+together with the slowest imports it pulled in. With --compare the same
+modules are measured in a `git archive` copy of the given revision, so the
+effect of a change on startup can be read off directly. Imports that fail
+(e.g. a dependency not installed, or a module exiting at import time) are
+reported as errors.
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    ("Week_3", "generator"),
+    ("Week_3", "label"),
+    ("labelling", "label_gpt"),
+    ("labelling", "label_gpt_dsa"),
+    ("labelling", "batch_label"),
+    (".", "common.client"),
+]
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(root, folder, module, runs=5) -> dict:
+    """Median cumulative import time of `module` in a fresh interpreter, started from an empty directory"""
+    code = (f"import sys; sys.path[:0] = [{os.path.join(root, folder)!r}, {root!r}]; "
+            f"import {module}")
+    totals, slowest = [], {}
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                    cwd=cwd, capture_output=True, text=True)
+            if result.returncode != 0:
+                output = [line for line in (result.stdout + result.stderr).splitlines() if not line.startswith("import time:")]
+                error = output[-1] if output else f"exit code {result.returncode}"
+                return {"error": error}
+            total = None
+            for match in LINE.finditer(result.stderr):
+                cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+                if name == module:
+                    total = cumulative
+                elif depth <= 3:
+                    slowest[name] = max(slowest.get(name, 0), cumulative)
+            totals.append(total or 0)
+    top = sorted(slowest.items(), key=lambda item: -item[1])[:3]
+    return {"ms": statistics.median(totals) / 1000, "top": [(name, us / 1000) for name, us in top]}
+
+
+def checkout(revision) -> str:
+    """Extracts `revision` into a temporary directory"""
+    target = tempfile.mkdtemp(prefix="import_time_")
+    archive = subprocess.run(["git", "-C", ROOT_DIR, "archive", revision], capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", target], input=archive.stdout, check=True)
+    return target
+
+
+def report(label, root, runs):
+    print(f"\n=== {label} ===")
+    results = {}
+    for folder, module in MODULES:
+        result = measure(root, folder, module, runs)
+        results[module] = result
+        if "error" in result:
+            print(f"{module:15s}  error: {result['error']}")
+        else:
+            top = ", ".join(f"{name} {ms:.1f}" for name, ms in result["top"])
+            print(f"{module:15s} {result['ms']:8.1f} ms   ({top})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the pipeline scripts")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--compare", default=None, help="git revision to measure as well, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    current = report("working tree", ROOT_DIR, args.runs)
+    if args.compare:
+        root = checkout(args.compare)
+        try:
+            before = report(args.compare, root, args.runs)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"\n=== {args.compare} -> working tree ===")
+        for module, result in current.items():
+            if "ms" in result and "ms" in before[module]:
+                print(f"{module:15s} {before[module]['ms']:8.1f} -> {result['ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
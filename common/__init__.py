@@ -0,0 +1 @@
+"""Helpers shared by the Week_3 generator and the labelling scripts."""
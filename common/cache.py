@@ -0,0 +1,153 @@
+"""Persistent content-addressed cache for LLM responses.
+
+Responses are stored in SQLite keyed on a SHA-256 of the model name, system
+instruction, generation config and messages, so a rerun or relabel never pays
+twice for the same request. The database is capped in size and evicts the
+least recently used entries first. Settings live under `cache:` in models.yaml.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from common.rate_limiter import CONFIG_FILE
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ResponseCache:
+    """SQLite backed LRU cache of response texts. Safe to share between threads
+    and between processes using the same database file."""
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, deterministic_only=False, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.deterministic_only = deterministic_only
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_config(cls, filepath=CONFIG_FILE):
+        import yaml
+        with open(filepath, 'r') as f:
+            settings = yaml.safe_load(f).get("cache", {})
+        path = settings.get("path", "llm_cache.sqlite")
+        if not os.path.isabs(path):
+            path = os.path.join(ROOT_DIR, path)
+        return cls(
+            path,
+            max_bytes=int(settings.get("max_mb", 200) * 1024 * 1024),
+            deterministic_only=settings.get("deterministic_only", False),
+            enabled=settings.get("enabled", True),
+        )
+
+    def _connect(self):
+        if self._conn is None:
+            import sqlite3
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(model, messages, system_instruction=None, generation_config=None) -> str:
+        payload = json.dumps({
+            "model": model,
+            "system_instruction": system_instruction,
+            "generation_config": generation_config,
+            "messages": messages,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, generation_config=None) -> bool:
+        """With deterministic_only set, only temperature 0 calls are cached"""
+        if not self.enabled:
+            return False
+        if not self.deterministic_only:
+            return True
+        return (generation_config or {}).get("temperature") == 0
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value, model=None):
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, size, now, now)
+            )
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drops least recently used entries until the cache is back under 90% of max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= target:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        conn.commit()
+        self.evictions += len(stale)
+
+    def cached(self, model, messages, fn, system_instruction=None, generation_config=None):
+        """Returns the cached response text for this request, or calls fn() and caches its text"""
+        if not self.is_cacheable(generation_config):
+            return fn()
+        key = self.make_key(model, messages, system_instruction, generation_config)
+        value = self.get(key)
+        if value is None:
+            value = fn()
+            self.put(key, value, model)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Process-wide response cache shared by all callers"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache.from_config()
+        return _cache
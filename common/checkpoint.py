@@ -0,0 +1,104 @@
+"""Append-only checkpointing for the labellers.
+
+Every label is appended to `<output>.partial.jsonl` (flushed and fsync'd) as
+soon as it is produced, so a crash or Ctrl-C never loses paid labels. On start
+the ids already present there (and in the final output file) are loaded into an
+index and skipped. Failed ids are kept in `<output>.failed.json` and retried on
+the next run. `finalize` writes the usual JSON list to the output file.
+"""
+import json
+import os
+
+
+def record_id(record):
+    """Id of a label record, either {"id": ..} or {"conversation": {"id": ..}}"""
+    if "id" in record:
+        return record["id"]
+    return record["conversation"]["id"]
+
+
+class LabelCheckpoint:
+
+    def __init__(self, output_file, key=record_id):
+        self.output_file = output_file
+        base = os.path.splitext(output_file)[0]
+        self.partial_file = base + ".partial.jsonl"
+        self.failed_file = base + ".failed.json"
+        self.key = key
+        self._records = {}
+        self._failed = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.output_file, "r", encoding="utf-8") as f:
+                for record in json.load(f):
+                    self._records[self.key(record)] = record
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        try:
+            with open(self.partial_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line may be cut short by a crash mid-write
+                        continue
+                    self._records[self.key(record)] = record
+        except FileNotFoundError:
+            pass
+
+        try:
+            with open(self.failed_file, "r", encoding="utf-8") as f:
+                self._failed = {entry["id"]: entry["error"] for entry in json.load(f)}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        if self._records:
+            print(f"Resuming: {len(self._records)} ids already labelled in {self.output_file}")
+        if self._failed:
+            print(f"Retrying {len(self._failed)} previously failed ids")
+
+    def is_done(self, conversation_id) -> bool:
+        return conversation_id in self._records
+
+    @property
+    def done_ids(self) -> set:
+        return set(self._records)
+
+    @property
+    def failed_ids(self) -> list:
+        return list(self._failed)
+
+    def record(self, record):
+        """Durably appends one label record"""
+        with open(self.partial_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        conversation_id = self.key(record)
+        self._records[conversation_id] = record
+        if self._failed.pop(conversation_id, None) is not None:
+            self._save_failed()
+
+    def record_failure(self, conversation_id, error):
+        """Adds an id to the retry list instead of silently dropping it"""
+        self._failed[conversation_id] = str(error)
+        self._save_failed()
+
+    def _save_failed(self):
+        with open(self.failed_file, "w", encoding="utf-8") as f:
+            json.dump([{"id": i, "error": e} for i, e in self._failed.items()], f, indent=2, ensure_ascii=False)
+
+    def records(self) -> list:
+        return list(self._records.values())
+
+    def finalize(self) -> list:
+        """Writes all labels collected so far to the output file in its usual JSON layout"""
+        results = self.records()
+        with open(self.output_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        if self._failed:
+            print(f"{len(self._failed)} ids failed, see {self.failed_file}")
+        return results
@@ -0,0 +1,288 @@
+"""One provider-neutral LLM client shared by the generator and the labellers.
+
+    from common.client import get_client
+    text = get_client().generate(messages, "gemini-2.5-flash", {"temperature": 0.7},
+                                 system_instruction=PERSONA, stage="interviewer")
+
+`messages` is a prompt string or a list of {"role": "user" | "assistant" |
+"model", "content": str} or Gemini-style {"role", "parts"} dicts. `config`
+takes neutral keys (temperature, max_output_tokens, response_format="json",
+candidates), anything else is passed to the provider unchanged.
+
+Every call goes through the response cache, the per-call metrics and the rate
+limiter. `stream` yields the reply text chunk by chunk instead, `sample` asks
+for several replies to the same request in one call. Provider clients are
+built once on first use and reused by every thread: the OpenAI client runs on
+one pooled keep-alive httpx client (HTTP/2 when the `h2` package is
+installed), Gemini keeps a single gRPC channel (or a pooled REST session when
+`gemini_transport: rest` / GEMINI_BASE_URL is set).
+Timeouts are set explicitly and the SDKs' own retries are turned off so the
+rate limiter is the only place that retries. Settings live under `client:` in
+models.yaml.
+"""
+import json
+import os
+import threading
+
+from common.cache import get_cache
+from common.metrics import get_metrics
+from common.rate_limiter import CONFIG_FILE, estimate_tokens
+
+OPENAI_PREFIXES = ("gpt-", "o1", "o3", "o4")
+
+
+def provider_for(model) -> str:
+    return "openai" if model.startswith(OPENAI_PREFIXES) else "gemini"
+
+
+def _text_of(message) -> str:
+    if "content" in message:
+        return message["content"]
+    parts = message.get("parts", "")
+    return parts if isinstance(parts, str) else "\n\n".join(str(part) for part in parts)
+
+
+def to_gemini_contents(messages) -> list:
+    if isinstance(messages, str):
+        return [{"role": "user", "parts": [messages]}]
+    contents = []
+    for message in messages:
+        role = "model" if message["role"] in ("assistant", "model") else "user"
+        parts = message.get("parts", [message.get("content", "")])
+        contents.append({"role": role, "parts": [parts] if isinstance(parts, str) else list(parts)})
+    return contents
+
+
+def to_openai_messages(messages, system_instruction=None) -> list:
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    converted = [{"role": "system", "content": system_instruction}] if system_instruction else []
+    for message in messages:
+        role = "assistant" if message["role"] in ("assistant", "model") else message["role"]
+        converted.append({"role": role, "content": _text_of(message)})
+    return converted
+
+
+def gemini_generation_config(config) -> dict:
+    config = dict(config or {})
+    if config.pop("response_format", None) == "json":
+        config["response_mime_type"] = "application/json"
+    if "candidates" in config:
+        config["candidate_count"] = config.pop("candidates")
+    return config
+
+
+def openai_request_options(config) -> dict:
+    config = dict(config or {})
+    if config.get("response_format") == "json":
+        config["response_format"] = {"type": "json_object"}
+    if "max_output_tokens" in config:
+        config["max_completion_tokens"] = config.pop("max_output_tokens")
+    if "candidates" in config:
+        config["n"] = config.pop("candidates")
+    return config
+
+
+class LLMClient:
+    """Thread safe; build it once (get_client) and share it"""
+
+    def __init__(self, timeout=120.0, connect_timeout=10.0, max_connections=32,
+                 keepalive_expiry=60.0, http2=True, gemini_transport="grpc"):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.gemini_transport = gemini_transport
+        self._lock = threading.Lock()
+        self._openai = None
+        self._genai = None
+        self._gemini_models = {}
+
+    @classmethod
+    def from_config(cls, filepath=CONFIG_FILE):
+        import yaml
+        with open(filepath, 'r') as f:
+            return cls(**yaml.safe_load(f).get("client", {}))
+
+    # --- provider clients, built once on first use ---
+
+    @staticmethod
+    def _load_env():
+        """API keys and base urls may come from a .env file"""
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    def openai(self):
+        with self._lock:
+            if self._openai is None:
+                self._load_env()
+                import httpx
+                from openai import OpenAI
+                try:
+                    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+                    http2 = self.http2
+                except ImportError:
+                    http2 = False
+                http_client = httpx.Client(
+                    http2=http2,
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections,
+                                        keepalive_expiry=self.keepalive_expiry),
+                )
+                self._openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"),
+                                      http_client=http_client, max_retries=0)
+            return self._openai
+
+    def gemini(self):
+        """The configured google.generativeai module"""
+        with self._lock:
+            if self._genai is None:
+                self._load_env()
+                import google.generativeai as genai
+                options = {"api_key": os.getenv("GEMINI_API_KEY")}
+                base_url = os.getenv("GEMINI_BASE_URL")
+                if base_url or self.gemini_transport == "rest":
+                    options["transport"] = "rest"
+                if base_url:
+                    options["client_options"] = {"api_endpoint": base_url}
+                genai.configure(**options)
+                self._genai = genai
+            return self._genai
+
+    def gemini_model(self, model, system_instruction=None, cached_content=None):
+        """GenerativeModel for this model / system instruction, created once and reused"""
+        key = (model, system_instruction, getattr(cached_content, "name", cached_content))
+        self.gemini()
+        with self._lock:
+            if key not in self._gemini_models:
+                if cached_content is not None:
+                    self._gemini_models[key] = self._genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                else:
+                    self._gemini_models[key] = self._genai.GenerativeModel(model_name=model, system_instruction=system_instruction)
+            return self._gemini_models[key]
+
+    # --- calls ---
+
+    def _request(self, messages, model, config, system_instruction, cached_content, stream=False):
+        """Returns a function that sends the request and gives back the raw provider response
+        (with stream=True an iterator over the response chunks)"""
+        if provider_for(model) == "openai":
+            client = self.openai()
+            request = openai_request_options(config)
+            if stream:
+                request.update(stream=True, stream_options={"include_usage": True})
+            converted = to_openai_messages(messages, system_instruction)
+            return lambda: client.chat.completions.create(model=model, messages=converted, **request)
+        gemini = self.gemini_model(model, system_instruction, cached_content)
+        contents = to_gemini_contents(messages)
+        generation_config = gemini_generation_config(config) or None
+        return lambda: gemini.generate_content(contents, generation_config=generation_config, stream=stream,
+                                               request_options={"timeout": self.timeout})
+
+    @staticmethod
+    def response_text(response) -> str:
+        if hasattr(response, "choices"):
+            return response.choices[0].message.content
+        return response.text
+
+    @staticmethod
+    def response_texts(response) -> list:
+        """Text of every candidate / choice of a response"""
+        if hasattr(response, "choices"):
+            return [choice.message.content for choice in response.choices]
+        return ["".join(part.text for part in candidate.content.parts) for candidate in response.candidates]
+
+    @staticmethod
+    def chunk_text(chunk) -> str:
+        if hasattr(chunk, "choices"):
+            # the last OpenAI chunk only carries the usage
+            return (chunk.choices[0].delta.content or "") if chunk.choices else ""
+        try:
+            return chunk.text
+        except ValueError:  # Gemini chunk without text parts
+            return ""
+
+    def generate(self, messages, model, config=None, system_instruction=None, stage=None,
+                 cached_content=None, use_cache=True) -> str:
+        """Sends one request (rate limited, metered, served from the response cache when possible)
+        and returns the reply text"""
+        send = self._request(messages, model, config, system_instruction, cached_content)
+        tokens = estimate_tokens(messages) + (estimate_tokens(system_instruction) if system_instruction else 0)
+
+        def call():
+            return self.response_text(get_metrics().call(model, send, tokens, stage))
+
+        if not use_cache:
+            return call()
+        return get_cache().cached(model, messages, call, system_instruction=system_instruction,
+                                  generation_config=config)
+
+    def sample(self, messages, model, n, config=None, system_instruction=None, stage=None,
+               cached_content=None, use_cache=True) -> list:
+        """n independent replies to one request, asked for as candidates of a single call
+        (OpenAI `n`, Gemini `candidate_count`), so the prompt is sent and billed once.
+        The replies are cached together as a JSON list."""
+        config = {**(config or {}), "candidates": n}
+        send = self._request(messages, model, config, system_instruction, cached_content)
+        tokens = estimate_tokens(messages) + (estimate_tokens(system_instruction) if system_instruction else 0)
+
+        def call():
+            return json.dumps(self.response_texts(get_metrics().call(model, send, tokens, stage)))
+
+        if not use_cache:
+            return json.loads(call())
+        return json.loads(get_cache().cached(model, messages, call, system_instruction=system_instruction,
+                                             generation_config=config))
+
+    def stream(self, messages, model, config=None, system_instruction=None, stage=None,
+               cached_content=None, use_cache=True, marks=None):
+        """generate() that yields the reply text as it arrives. Closing the generator (e.g.
+        breaking out of the loop once the reply has what is needed) stops reading the
+        provider stream. A cached reply is yielded in one piece; only replies read to the end
+        are cached, a reply the reader stopped early is partial and never stored.
+        `marks` is passed on to MetricsRecorder.stream."""
+        cache = get_cache()
+        key = None
+        if use_cache and cache.is_cacheable(config):
+            key = cache.make_key(model, messages, system_instruction, config)
+            cached = cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        send = self._request(messages, model, config, system_instruction, cached_content, stream=True)
+        tokens = estimate_tokens(messages) + (estimate_tokens(system_instruction) if system_instruction else 0)
+        chunks = get_metrics().stream(model, send, self.chunk_text, tokens, stage, marks)
+        received, complete = [], False
+        try:
+            for text in chunks:
+                received.append(text)
+                yield text
+            complete = True
+        finally:
+            chunks.close()
+            if key is not None and complete and received:
+                cache.put(key, "".join(received), model)
+
+    async def agenerate(self, messages, model, config=None, **kwargs) -> str:
+        """generate() for asyncio code; runs on a worker thread over the same pooled connections"""
+        import asyncio
+        return await asyncio.to_thread(self.generate, messages, model, config, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """Process-wide client shared by all callers"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient.from_config()
+        return _client
+
+
+def generate(messages, model, config=None, **kwargs) -> str:
+    return get_client().generate(messages, model, config, **kwargs)
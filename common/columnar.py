@@ -0,0 +1,229 @@
+"""Columnar Parquet / Arrow export of conversations, turns and labels.
+
+    python -m common.columnar export dataset/dsa_dataset.json dataset/dsa_labels.json --out dataset/dsa_columnar
+    python -m common.columnar show dataset/dsa_columnar 42
+    python -m common.columnar query dataset/dsa_columnar --student-level poor_student --difficulty Hard
+
+Each table is written twice: as Parquet (zstd, sorted by student_level /
+difficulty / topic so row-group statistics make predicate pushdown effective)
+and as an uncompressed Arrow IPC file that is memory-mapped for id lookups.
+Students, difficulties, topics and speakers are dictionary encoded and scores
+are stored as int8.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from common.dataset_reader import iter_conversations
+
+DIFFICULTIES = ("EASY", "MEDIUM", "HARD")
+REPLY_TYPES = ("clear", "confused", "misunderstood", "wrong")
+SORT_KEYS = [("student_level", "ascending"), ("difficulty", "ascending"), ("topic", "ascending")]
+
+
+def _dictionary(values, index_type=pa.int16()):
+    return pa.array(values, pa.string()).dictionary_encode().cast(pa.dictionary(index_type, pa.string()))
+
+
+def _small_ints(values):
+    return pa.array(values, pa.int8())
+
+
+def labels_table(labels_path) -> pa.Table:
+    """id plus one int8 column per rubric criterion from a labeller's output file"""
+    with open(labels_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    ids, scores = [], []
+    for entry in entries:
+        ids.append(entry["id"] if "id" in entry else entry["conversation"]["id"])
+        scores.append(entry["label"])
+    criteria = list(dict.fromkeys(key for label in scores for key in label))
+    return pa.table({
+        "id": pa.array(ids, pa.int32()),
+        **{criterion: _small_ints([label.get(criterion) for label in scores]) for criterion in criteria},
+    })
+
+
+def build_tables(dataset_path, labels_path=None, with_turns=True) -> dict:
+    """Reads a dataset (and optionally its labels) into conversations / turns / labels tables"""
+    conv = {key: [] for key in ("id", "student_level", "difficulty", "exchanges", "topic")}
+    counts = {f"difficulty_{d.lower()}": [] for d in DIFFICULTIES}
+    counts.update({f"reply_{r}": [] for r in REPLY_TYPES})
+    turns = {"id": [], "turn": [], "speaker": [], "speech": []}
+
+    for conversation in iter_conversations(dataset_path):
+        conversation_id = conversation["id"]
+        conv["id"].append(conversation_id)
+        conv["student_level"].append(conversation.get("student_level") or conversation.get("student_type"))
+        conv["difficulty"].append(conversation.get("difficulty"))
+        conv["exchanges"].append(conversation.get("exchanges"))
+        conv["topic"].append(conversation.get("topic"))
+        difficulty_distribution = conversation.get("difficulty_distribution") or {}
+        reply_distribution = conversation.get("reply_distribution") or {}
+        for d in DIFFICULTIES:
+            counts[f"difficulty_{d.lower()}"].append(difficulty_distribution.get(d))
+        for r in REPLY_TYPES:
+            counts[f"reply_{r}"].append(reply_distribution.get(r))
+        for index, exchange in enumerate(conversation.get("conversation", []) if with_turns else []):
+            turns["id"].append(conversation_id)
+            turns["turn"].append(index)
+            turns["speaker"].append(exchange["speaker"])
+            turns["speech"].append(exchange["speech"])
+
+    conversations = pa.table({
+        "id": pa.array(conv["id"], pa.int32()),
+        "student_level": _dictionary(conv["student_level"], pa.int8()),
+        "difficulty": _dictionary(conv["difficulty"], pa.int8()),
+        "exchanges": _small_ints(conv["exchanges"]),
+        "topic": _dictionary(conv["topic"]),
+        **{name: _small_ints(values) for name, values in counts.items()},
+    })
+    tables = {"conversations": conversations}
+    if with_turns:
+        tables["turns"] = pa.table({
+            "id": pa.array(turns["id"], pa.int32()),
+            "turn": pa.array(turns["turn"], pa.int16()),
+            "speaker": _dictionary(turns["speaker"], pa.int8()),
+            "speech": pa.array(turns["speech"], pa.string()),
+        })
+    if labels_path:
+        tables["labels"] = labels_table(labels_path)
+    return tables
+
+
+def export(dataset_path, labels_path, out_dir, row_group_size=4096):
+    """Writes <table>.parquet and <table>.arrow for every table into out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in build_tables(dataset_path, labels_path).items():
+        by_id = table.sort_by([("id", "ascending")] + ([("turn", "ascending")] if name == "turns" else []))
+        with pa.OSFile(os.path.join(out_dir, f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, by_id.schema) as writer:
+                writer.write_table(by_id)
+        if name == "conversations":
+            # Dictionary columns cannot be sorted directly, sort on their decoded values
+            keys = pa.table({key: table[key].cast(pa.string()) for key, _ in SORT_KEYS})
+            clustered = table.take(pc.sort_indices(keys, sort_keys=SORT_KEYS))
+        else:
+            clustered = by_id
+        pq.write_table(clustered, os.path.join(out_dir, f"{name}.parquet"),
+                       compression="zstd", row_group_size=row_group_size)
+        print(f"Wrote {name}: {table.num_rows} rows")
+
+
+def map_table(directory, name) -> pa.Table:
+    """<directory>/<name>.arrow, memory-mapped (zero-copy: columns point straight into the file)"""
+    return pa.ipc.open_file(pa.memory_map(os.path.join(directory, f"{name}.arrow"), "r")).read_all()
+
+
+class ColumnarDataset:
+    """Memory-mapped view of an exported dataset with O(1) lookup by id"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.conversations = self._map("conversations")
+        self.turns = self._map("turns")
+        self.labels = self._map("labels") if os.path.exists(self._path("labels", "arrow")) else None
+
+        self._conversation_rows = self._index(self.conversations)
+        self._label_rows = self._index(self.labels) if self.labels is not None else {}
+        # turns are sorted by id, so one searchsorted pass gives every conversation's slice
+        turn_ids = self.turns["id"].to_numpy()
+        conversation_ids = self.conversations["id"].to_numpy()
+        self._turn_starts = dict(zip(conversation_ids.tolist(), np.searchsorted(turn_ids, conversation_ids, "left").tolist()))
+        self._turn_ends = dict(zip(conversation_ids.tolist(), np.searchsorted(turn_ids, conversation_ids, "right").tolist()))
+
+    def _path(self, name, extension):
+        return os.path.join(self.directory, f"{name}.{extension}")
+
+    def _map(self, name):
+        return map_table(self.directory, name)
+
+    @staticmethod
+    def _index(table):
+        ids = table["id"].to_numpy()
+        return dict(zip(ids.tolist(), range(len(ids))))
+
+    def __len__(self):
+        return self.conversations.num_rows
+
+    def get(self, conversation_id) -> dict | None:
+        """Conversation metadata, turns and label for one id"""
+        row = self._conversation_rows.get(conversation_id)
+        if row is None:
+            return None
+        record = self.conversations.slice(row, 1).to_pylist()[0]
+        start, end = self._turn_starts[conversation_id], self._turn_ends[conversation_id]
+        record["conversation"] = [
+            {"speaker": turn["speaker"], "speech": turn["speech"]}
+            for turn in self.turns.slice(start, end - start).select(["speaker", "speech"]).to_pylist()
+        ]
+        label_row = self._label_rows.get(conversation_id)
+        if label_row is not None:
+            label = self.labels.slice(label_row, 1).to_pylist()[0]
+            label.pop("id")
+            record["label"] = label
+        return record
+
+    def query(self, student_level=None, difficulty=None, topic=None, with_labels=True, columns=None):
+        """Conversations matching the given fields (joined with labels), filtered with
+        predicate pushdown on the clustered Parquet file"""
+        expression = None
+        for field, value in (("student_level", student_level), ("difficulty", difficulty), ("topic", topic)):
+            if value is None:
+                continue
+            condition = pc.field(field) == value
+            expression = condition if expression is None else expression & condition
+        # The label join needs the ids even when the caller did not ask for them
+        read_columns = columns
+        if columns is not None and "id" not in columns:
+            read_columns = list(columns) + ["id"]
+        table = ds.dataset(self._path("conversations", "parquet"), format="parquet").to_table(
+            columns=read_columns, filter=expression)
+        if with_labels and self.labels is not None and table.num_rows:
+            # Join through the id index instead of a hash join (dictionary columns stay encoded)
+            rows = [self._label_rows.get(conversation_id) for conversation_id in table["id"].to_pylist()]
+            table = table.filter(pa.array([row is not None for row in rows]))
+            scores = self.labels.take(pa.array([row for row in rows if row is not None], pa.int32()))
+            for name in scores.column_names[1:]:
+                table = table.append_column(name, scores[name])
+        if columns is not None and "id" not in columns:
+            table = table.drop_columns(["id"])
+        return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar export and lookup of conversation datasets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export")
+    p_export.add_argument("dataset")
+    p_export.add_argument("labels", nargs="?")
+    p_export.add_argument("--out", required=True)
+    p_show = sub.add_parser("show")
+    p_show.add_argument("directory")
+    p_show.add_argument("id", type=int)
+    p_query = sub.add_parser("query")
+    p_query.add_argument("directory")
+    p_query.add_argument("--student-level")
+    p_query.add_argument("--difficulty")
+    p_query.add_argument("--topic")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.dataset, args.labels, args.out)
+    elif args.command == "show":
+        print(json.dumps(ColumnarDataset(args.directory).get(args.id), indent=2, ensure_ascii=False))
+    else:
+        table = ColumnarDataset(args.directory).query(args.student_level, args.difficulty, args.topic)
+        print(f"{table.num_rows} conversations")
+        for record in table.slice(0, 20).to_pylist():
+            print(record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Streaming reader for conversation datasets.
+
+Yields one conversation at a time without loading the whole file, from:
+  - a {"dataset_info", "conversations": [...]} JSON file,
+  - a JSON file holding a top-level list of conversations,
+  - a JSONL file, or a shard directory written by common/dataset_store.py.
+Selection by id range and by an arbitrary predicate happens while streaming.
+"""
+import glob
+import heapq
+import json
+import os
+import random
+
+CHUNK_SIZE = 1 << 16
+
+
+class _JsonStream:
+    """Incremental reader over a JSON document, decoding one value at a time"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found '{self.peek()}'")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value, reading more of the file as needed"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow geometrically so a large value is not re-parsed once per chunk
+            self._fill(max(self.chunk_size, len(self.buf)))
+
+    def array(self):
+        """Yields the elements of the array starting at the current position"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def _iter_json(path, key="conversations"):
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        first = stream.peek()
+        if first == "[":
+            yield from stream.array()
+            return
+        stream.expect("{")
+        while stream.peek() not in ("}", ""):
+            name = stream.value()
+            stream.expect(":")
+            if name == key:
+                yield from stream.array()
+            else:
+                stream.value()  # skip e.g. dataset_info
+            if stream.peek() == ",":
+                stream.pos += 1
+
+
+def _iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash mid-write
+                continue
+
+
+def _iter_source(path):
+    if os.path.isdir(path):
+        for shard in sorted(glob.glob(os.path.join(path, "*.jsonl"))):
+            yield from _iter_jsonl(shard)
+    elif path.endswith(".jsonl"):
+        yield from _iter_jsonl(path)
+    else:
+        yield from _iter_json(path)
+
+
+def iter_conversations(path, id_range=None, where=None):
+    """Yields conversations from path one at a time.
+    id_range = (first, last) keeps ids in that inclusive range,
+    where = predicate(conversation) keeps conversations it returns True for."""
+    for conversation in _iter_source(path):
+        if id_range is not None:
+            conversation_id = conversation.get("id")
+            if conversation_id is None or not id_range[0] <= conversation_id <= id_range[1]:
+                continue
+        if where is not None and not where(conversation):
+            continue
+        yield conversation
+
+
+def sample_conversations(path, k, id_range=None, where=None) -> list:
+    """Uniform random sample of k conversations in one streaming pass, keeping only k in memory"""
+    keyed = ((random.random(), index, conversation)
+             for index, conversation in enumerate(iter_conversations(path, id_range, where)))
+    return [conversation for _, _, conversation in heapq.nlargest(k, keyed, key=lambda item: item[0])]
@@ -0,0 +1,172 @@
+"""Append-only, sharded JSONL storage for generated conversations.
+
+A store is a directory of `part-NNNNN.jsonl` shards plus a small `meta.json`
+holding the incrementally maintained `dataset_info` counters. Appending a
+conversation writes one fsync'd line and rewrites only the meta file, so the
+cost of saving progress no longer grows with the dataset. `export_json`
+compacts the shards into the usual {"dataset_info", "conversations"} layout.
+"""
+import json
+import os
+import textwrap
+from datetime import datetime
+
+
+class DatasetStore:
+
+    def __init__(self, directory, shard_size=1000):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.meta_file = os.path.join(directory, "meta.json")
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self._load_meta()
+
+    @staticmethod
+    def for_output_file(output_file, shard_size=1000):
+        """Store kept next to a dataset JSON file: interview_dataset.json -> interview_dataset_shards/"""
+        return DatasetStore(os.path.splitext(output_file)[0] + "_shards", shard_size)
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {
+                "total_conversations": 0,
+                "next_id": 1,
+                "student_types_used": [],
+                "topics_covered": [],
+                "shards": {}
+            }
+        self._student_types = set(meta["student_types_used"])
+        self._topics = set(meta["topics_covered"])
+        self._recover(meta)
+        return meta
+
+    def _recover(self, meta):
+        """Catches meta up with records written just before a crash: the last shard can be ahead,
+        and a shard opened right before the crash may be on disk without being listed in meta"""
+        listed = sorted(meta["shards"])
+        unlisted = sorted(name for name in os.listdir(self.directory)
+                          if name.startswith("part-") and name.endswith(".jsonl") and name not in meta["shards"])
+        for name in listed[-1:] + unlisted:
+            known = meta["shards"].setdefault(name, 0)
+            self._truncate_partial_line(name)
+            for index, record in enumerate(self._read_shard(name)):
+                if index >= known:
+                    self._count(meta, record)
+                    meta["shards"][name] += 1
+
+    def _truncate_partial_line(self, name):
+        """Drops a trailing line cut short by a crash so the next append starts on a fresh line"""
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def _count(self, meta, conversation):
+        meta["total_conversations"] += 1
+        meta["next_id"] = max(meta["next_id"], conversation["id"] + 1)
+        self._student_types.add(conversation.get("student_level"))
+        self._topics.add(conversation.get("topic"))
+        meta["student_types_used"] = sorted(t for t in self._student_types if t)
+        meta["topics_covered"] = sorted(t for t in self._topics if t)
+
+    def _save_meta(self):
+        tmp = self.meta_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.meta_file)
+
+    def _current_shard(self):
+        shards = sorted(self.meta["shards"])
+        if shards and self.meta["shards"][shards[-1]] < self.shard_size:
+            return shards[-1]
+        name = f"part-{len(shards):05d}.jsonl"
+        self.meta["shards"][name] = 0
+        return name
+
+    def _read_shard(self, name):
+        try:
+            with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash mid-write
+                        continue
+        except FileNotFoundError:
+            return
+
+    def __len__(self):
+        return self.meta["total_conversations"]
+
+    def next_id(self) -> int:
+        return self.meta["next_id"]
+
+    def append(self, conversation):
+        """Durably appends one conversation and updates the dataset_info counters"""
+        shard = self._current_shard()
+        with open(os.path.join(self.directory, shard), "a", encoding="utf-8") as f:
+            f.write(json.dumps(conversation, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.meta["shards"][shard] += 1
+        self._count(self.meta, conversation)
+        self._save_meta()
+
+    def shard_paths(self) -> list:
+        return [os.path.join(self.directory, name) for name in sorted(self.meta["shards"])]
+
+    def iter_conversations(self):
+        for name in sorted(self.meta["shards"]):
+            yield from self._read_shard(name)
+
+    def dataset_info(self, status=None) -> dict:
+        info = {
+            "total_conversations": self.meta["total_conversations"],
+            "generated_at": datetime.now().isoformat(),
+            "student_types_used": self.meta["student_types_used"],
+            "topics_covered": self.meta["topics_covered"],
+        }
+        if status:
+            info["status"] = status
+        return info
+
+    def import_json(self, input_file) -> int:
+        """Seeds an empty store from an existing {"dataset_info", "conversations"} file"""
+        try:
+            with open(input_file, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+        except FileNotFoundError:
+            return 0
+        conversations = existing.get("conversations", []) if isinstance(existing, dict) else existing
+        for conversation in conversations:
+            self.append(conversation)
+        return len(conversations)
+
+    def export_json(self, output_file, status=None):
+        """Compacts the shards into the {"dataset_info", "conversations"} JSON layout,
+        streaming one record at a time"""
+        write_dataset_json(output_file, self.dataset_info(status), self.iter_conversations())
+
+
+def write_dataset_json(output_file, info, conversations) -> int:
+    """Writes {"dataset_info", "conversations"} from an iterable of conversations,
+    one record at a time, and returns how many were written"""
+    tmp = output_file + ".tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        info = json.dumps(info, indent=2, ensure_ascii=False)
+        f.write('{\n  "dataset_info": ' + textwrap.indent(info, "  ")[2:] + ',\n  "conversations": [')
+        for conversation in conversations:
+            record = json.dumps(conversation, indent=2, ensure_ascii=False)
+            f.write(("\n" if count == 0 else ",\n") + textwrap.indent(record, "    "))
+            count += 1
+        f.write("\n  ]\n}" if count else "]\n}")
+    os.replace(tmp, output_file)
+    return count
@@ -0,0 +1,29 @@
+"""Vectorised text hashing shared by labelling/dedupe.py and labelling/surrogate_grader.py.
+
+Texts are split into lowercased words, each word is mapped to a 32 bit number
+and all texts end up in one flat uint64 array with start offsets, so n-grams
+can be hashed for every text at once with `mix`.
+"""
+import re
+from array import array
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+
+def mix(x):
+    """splitmix64 finaliser on a uint64 array (the multiplications wrap around)"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def word_arrays(texts, word_numbers) -> tuple:
+    """(word numbers of all texts as one flat uint64 array, start offset of each text);
+    word_numbers maps a lowercased word to a number below 2**32, e.g. a dict with __missing__"""
+    words, offsets = array("I"), array("q", [0])
+    for text in texts:
+        words.extend(map(word_numbers.__getitem__, WORD.findall(text.lower())))
+        offsets.append(len(words))
+    return np.frombuffer(words, dtype=np.uint32).astype(np.uint64), np.frombuffer(offsets, dtype=np.int64)
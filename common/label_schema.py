@@ -0,0 +1,150 @@
+"""Rubric schemas for the labellers: parsing, per-field validation and a targeted re-ask.
+
+    from common.label_schema import SYSTEM_DESIGN, label_with_repair
+    label = label_with_repair(messages, SYSTEM_DESIGN, ask)   # ask(messages, stage) -> reply text
+
+A reply is parsed leniently (JSON, or the outermost {...} inside other text)
+and every criterion of the rubric is checked on its own: present, an integer
+(2, 2.0 and "2" are accepted) and within the rubric's score range. Keys are
+matched after normalising case and spacing, extra keys are dropped.
+
+When some criteria are missing or invalid, the conversation is continued with
+the model's own reply and a short follow-up asking for just those criteria,
+instead of labelling the sample again. The original prompt is an unchanged
+prefix of the follow-up, so the provider's prompt caching serves it (cached
+input tokens) and only the few missing scores are generated. Follow-ups are
+made with stage="label_repair" so they show up separately in the metrics
+file. After MAX_REASKS follow-ups InvalidLabelError is raised.
+"""
+import json
+import re
+
+MAX_REASKS = 2
+
+
+class InvalidLabelError(ValueError):
+    """A reply that still misses valid scores after the follow-ups"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("invalid label: " + ", ".join(f"{c} ({reason})" for c, reason in problems.items()))
+
+
+def parse_reply(text):
+    """The JSON object in a reply, None when there is none"""
+    text = (text or "").strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # handle model returning extra text around the object
+        start = text.find("{")
+        end = text.rfind("}")
+        try:
+            return json.loads(text[start:end + 1]) if 0 <= start < end else None
+        except json.JSONDecodeError:
+            return None
+
+
+def _key(name) -> str:
+    return re.sub(r"\W+", "_", str(name).strip().lower()).strip("_")
+
+
+def _score(value):
+    """value as an int, None when it is not a whole number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+class Rubric:
+
+    def __init__(self, name, criteria, scores=(0, 1, 2)):
+        self.name = name
+        self.criteria = tuple(criteria)
+        self.scores = tuple(scores)
+
+    def validate(self, label, only=None) -> tuple:
+        """(valid scores, {criterion: problem}) of a parsed reply, checking `only` these
+        criteria when given"""
+        criteria = self.criteria if only is None else [c for c in self.criteria if c in only]
+        if not isinstance(label, dict):
+            return {}, {c: "no JSON object" for c in criteria}
+        given = {_key(name): value for name, value in label.items()}
+        scores, problems = {}, {}
+        for criterion in criteria:
+            if criterion not in given:
+                problems[criterion] = "missing"
+                continue
+            score = _score(given[criterion])
+            if score is None or score not in self.scores:
+                problems[criterion] = f"got {given[criterion]!r}"
+            else:
+                scores[criterion] = score
+        return scores, problems
+
+    def followup(self, problems) -> str:
+        """Follow-up message asking for just the criteria in `problems`"""
+        listed = "\n".join(f'- "{c}": {reason}' for c, reason in problems.items())
+        keys = ", ".join(f'"{c}": int' for c in problems)
+        return (f"Your previous reply did not give a valid score for these rubric criteria:\n{listed}\n\n"
+                f"Score only these criteria, each an integer from {self.scores[0]} to {self.scores[-1]}. "
+                f"Return valid JSON only, exactly in this form: {{{keys}}}")
+
+
+SYSTEM_DESIGN = Rubric("system_design", [
+    "problem_understanding",
+    "structured_approach",
+    "architecture_evolution",
+    "technical_depth",
+    "scalability_reasoning",
+    "tradeoff_analysis",
+    "adaptability",
+    "reliability",
+    "communication",
+    "completeness",
+])
+
+DSA = Rubric("dsa", [
+    "ask_clarifying_questions",
+    "propose_brute_force",
+    "space_time_complexity",
+    "reach_optimal_solution",
+    "handle_edge_cases",
+    "correct_explanation",
+    "polite_respectful_tone",
+    "logical_progression",
+])
+
+
+def repair(messages, text, rubric, ask, max_reasks=MAX_REASKS) -> dict:
+    """Validated label from the reply `text` to `messages`, re-asking for the criteria that
+    are missing or invalid. ask(messages, stage) sends a request and returns the reply text."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    label, problems = rubric.validate(parse_reply(text))
+    for _ in range(max_reasks):
+        if not problems:
+            break
+        if len(problems) == len(rubric.criteria) and parse_reply(text) is None:
+            print("Reply was not JSON, asking again for every criterion")
+        else:
+            print(f"Re-asking for {len(problems)} criteria: {', '.join(problems)}")
+        messages = messages + [{"role": "assistant", "content": text},
+                               {"role": "user", "content": rubric.followup(problems)}]
+        text = ask(messages, "label_repair")
+        fixed, problems = rubric.validate(parse_reply(text), only=problems)
+        label.update(fixed)
+    if problems:
+        raise InvalidLabelError(problems)
+    return {c: label[c] for c in rubric.criteria}
+
+
+def label_with_repair(messages, rubric, ask, max_reasks=MAX_REASKS) -> dict:
+    """Sends the labelling request and returns its validated (and if need be repaired) label"""
+    return repair(messages, ask(messages, "label"), rubric, ask, max_reasks)
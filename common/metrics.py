@@ -0,0 +1,291 @@
+"""Per-call metrics for every LLM request.
+
+`MetricsRecorder.call` wraps `RateLimiter.call` and appends one JSON line per
+request to the metrics file: model, stage, latency of the successful attempt,
+total wall time including rate-limit waits, input / cached / output tokens,
+retries, estimated cost and the error type if the call failed. Callers tag
+records with the conversation being worked on (or, while a new conversation
+is generated and has no id yet, a `generation` tag) through `context`, which also
+follows calls made with asyncio.to_thread. `print_summary` reports
+p50/p95/p99 latency, tokens per conversation, cost, errors and retries for the
+current run, plus time to first token (and to the control tag) for calls
+streamed through `stream`. Settings and prices live under `metrics:` and
+`pricing:` in models.yaml.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+from common.rate_limiter import CONFIG_FILE, estimate_tokens, get_limiter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_context = contextvars.ContextVar("metrics_context", default={})
+
+
+def usage_from_response(response) -> tuple:
+    """(input, cached, output) token counts reported by a Gemini or OpenAI response"""
+    # Gemini: response.usage_metadata
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        return (
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "cached_content_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0,
+        )
+    # OpenAI: response.usage
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        return (
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+    return (0, 0, 0)
+
+
+def percentile(values, q) -> float:
+    """q-th percentile (0-100) with linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class MetricsRecorder:
+    """Thread safe writer of per-call records plus the in-memory run summary"""
+
+    def __init__(self, path, prices=None, enabled=True, limiter=None):
+        self.path = path
+        self.prices = prices or {}
+        self.enabled = enabled
+        self.limiter = limiter
+        self.records = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, filepath=CONFIG_FILE):
+        import yaml
+        with open(filepath, 'r') as f:
+            config = yaml.safe_load(f)
+        settings = config.get("metrics", {})
+        path = settings.get("path", "llm_metrics.jsonl")
+        if not os.path.isabs(path):
+            path = os.path.join(ROOT_DIR, path)
+        return cls(path, config.get("pricing", {}), enabled=settings.get("enabled", True))
+
+    @staticmethod
+    @contextlib.contextmanager
+    def context(**fields):
+        """Adds fields (e.g. conversation_id, stage) to every record made inside the block"""
+        token = _context.set({**_context.get(), **fields})
+        try:
+            yield
+        finally:
+            _context.reset(token)
+
+    def cost(self, model, input_tokens, cached_tokens, output_tokens) -> float:
+        """Estimated USD cost from the per-million-token prices in models.yaml"""
+        price = self.prices.get(model) or self.prices.get("default") or {}
+        uncached = max(input_tokens - cached_tokens, 0)
+        return (uncached * price.get("input", 0)
+                + cached_tokens * price.get("cached_input", price.get("input", 0))
+                + output_tokens * price.get("output", 0)) / 1_000_000
+
+    def call(self, model, fn, tokens=0, stage=None):
+        """Runs fn() through the rate limiter and records one metrics line for it"""
+        retries = []
+        attempt_started = [0.0]
+
+        def timed():
+            attempt_started[0] = time.perf_counter()
+            return fn()
+
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = (self.limiter or get_limiter()).call(model, timed, tokens,
+                                         on_retry=lambda attempt, e, delay: retries.append(type(e).__name__))
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record_call(model, stage, tokens, started, attempt_started[0], retries, error,
+                              usage_from_response(response))
+
+    def stream(self, model, fn, text_of, tokens=0, stage=None, marks=None):
+        """Streamed counterpart of call(): fn() opens the stream through the rate limiter
+        (so only opening it is retried) and text_of(chunk) of every chunk is yielded as it
+        arrives. The record gets the time to first token and whether the reader stopped
+        early; `marks` is a dict the reader may fill with time.perf_counter() stamps while
+        reading (e.g. marks["tag"]), recorded as time_to_<name> like the TTFT."""
+        retries = []
+        attempt_started = [0.0]
+
+        def timed():
+            attempt_started[0] = time.perf_counter()
+            return fn()
+
+        started = time.perf_counter()
+        chunks, error, usage = None, None, (0, 0, 0)
+        first_token, received, finished = None, [], False
+        try:
+            chunks = (self.limiter or get_limiter()).call(model, timed, tokens,
+                                       on_retry=lambda attempt, e, delay: retries.append(type(e).__name__))
+            for chunk in chunks:
+                chunk_usage = usage_from_response(chunk)
+                if any(chunk_usage):
+                    usage = chunk_usage
+                text = text_of(chunk)
+                if text:
+                    first_token = first_token or time.perf_counter()
+                    received.append(text)
+                    yield text
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not finished and hasattr(chunks, "close"):
+                chunks.close()
+            if not any(usage):
+                # Stopped before the provider reported usage: estimate it
+                usage = (tokens, 0, estimate_tokens("".join(received)) if received else 0)
+            attempt = attempt_started[0]
+            timings = {"ttft": round(first_token - attempt, 4) if first_token and attempt else None}
+            for name, stamp in (marks or {}).items():
+                timings[f"time_to_{name}"] = round(stamp - attempt, 4) if attempt else None
+            self._record_call(model, stage, tokens, started, attempt, retries, error, usage,
+                              streamed=True, stopped_early=not finished and error is None, **timings)
+
+    def _record_call(self, model, stage, tokens, started, attempt_started, retries, error, usage, **extra):
+        finished = time.perf_counter()
+        input_tokens, cached_tokens, output_tokens = usage
+        fields = dict(_context.get())
+        if stage is not None:
+            fields["stage"] = stage
+        self.record({
+            "time": time.time(),
+            "model": model,
+            **fields,
+            "latency": round(finished - attempt_started, 4) if attempt_started else None,
+            "wall_time": round(finished - started, 4),
+            "estimated_input_tokens": tokens,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            "retries": len(retries),
+            "cost": round(self.cost(model, input_tokens, cached_tokens, output_tokens), 8),
+            "ok": error is None,
+            "error": type(error).__name__ if error is not None else None,
+            **extra,
+        })
+
+    def record(self, record):
+        with self._lock:
+            self.records.append(record)
+            if not self.enabled:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self, records=None) -> dict:
+        """Aggregates the given records (default: every call made in this process)"""
+        with self._lock:
+            records = list(self.records if records is None else records)
+        latencies = [r["latency"] for r in records if r.get("ok") and r.get("latency") is not None]
+        per_conversation = {}
+        for r in records:
+            # A packed request (conversation_ids) is split evenly between its conversations;
+            # a conversation still being generated has no id yet, only a generation tag
+            key = r["conversation_id"] if r.get("conversation_id") is not None else r.get("generation")
+            ids = r.get("conversation_ids") or ([key] if key is not None else [])
+            for conversation_id in ids:
+                per_conversation[conversation_id] = (per_conversation.get(conversation_id, 0)
+                                                     + (r["input_tokens"] + r["output_tokens"]) / len(ids))
+        conversation_tokens = list(per_conversation.values())
+        streamed = [r for r in records if r.get("streamed") and r.get("ok")]
+        ttfts = [r["ttft"] for r in streamed if r.get("ttft") is not None]
+        tag_times = [r["time_to_tag"] for r in streamed if r.get("time_to_tag") is not None]
+        errors = {}
+        for r in records:
+            if r.get("error"):
+                errors[r["error"]] = errors.get(r["error"], 0) + 1
+        return {
+            "calls": len(records),
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p95": round(percentile(latencies, 95), 3),
+            "latency_p99": round(percentile(latencies, 99), 3),
+            "input_tokens": sum(r["input_tokens"] for r in records),
+            "cached_tokens": sum(r["cached_tokens"] for r in records),
+            "output_tokens": sum(r["output_tokens"] for r in records),
+            "conversations": len(conversation_tokens),
+            "tokens_per_conversation": round(sum(conversation_tokens) / len(conversation_tokens), 1) if conversation_tokens else 0,
+            "max_tokens_per_conversation": round(max(conversation_tokens, default=0)),
+            "cost": round(sum(r["cost"] for r in records), 4),
+            "errors": errors,
+            "retries": sum(r["retries"] for r in records),
+            "streamed": len(streamed),
+            "stopped_early": sum(1 for r in streamed if r.get("stopped_early")),
+            "ttft_p50": round(percentile(ttfts, 50), 3),
+            "ttft_p95": round(percentile(ttfts, 95), 3),
+            "time_to_tag_p50": round(percentile(tag_times, 50), 3),
+            "time_to_tag_p95": round(percentile(tag_times, 95), 3),
+        }
+
+    def print_summary(self, records=None):
+        s = self.summary(records)
+        if not s["calls"]:
+            return
+        print("\n=== LLM call metrics ===")
+        print(f"Calls: {s['calls']}, errors: {sum(s['errors'].values())} {s['errors'] or ''}, retries: {s['retries']}")
+        print(f"Latency p50/p95/p99: {s['latency_p50']}s / {s['latency_p95']}s / {s['latency_p99']}s")
+        if s["streamed"]:
+            print(f"Streamed: {s['streamed']} (stopped early {s['stopped_early']}), TTFT p50/p95: "
+                  f"{s['ttft_p50']}s / {s['ttft_p95']}s, time to tag p50/p95: {s['time_to_tag_p50']}s / {s['time_to_tag_p95']}s")
+        print(f"Tokens: input {s['input_tokens']} (cached {s['cached_tokens']}), output {s['output_tokens']}")
+        if s["conversations"]:
+            print(f"Tokens per conversation: mean {s['tokens_per_conversation']}, max {s['max_tokens_per_conversation']}")
+        print(f"Estimated cost: ${s['cost']:.4f}")
+        if self.enabled:
+            print(f"Per-call records: {self.path}")
+
+
+def load_records(path) -> list:
+    """Reads a metrics JSONL file, e.g. to summarise an earlier run"""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRecorder:
+    """Process-wide metrics recorder shared by all callers"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRecorder.from_config()
+        return _metrics
+
+
+if __name__ == "__main__":
+    # python -m common.metrics [metrics.jsonl] summarises a recorded run
+    import sys
+    metrics = get_metrics()
+    metrics.print_summary(load_records(sys.argv[1] if len(sys.argv) > 1 else metrics.path))
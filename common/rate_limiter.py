@@ -0,0 +1,168 @@
+"""Shared token-bucket rate limiter for every LLM caller.
+
+Each model gets two buckets: one for requests per minute and one for tokens
+per minute, both read from models.yaml. Callers wrap their API call in
+`RateLimiter.call`, which waits for budget before sending and retries
+429 / ResourceExhausted errors with jittered exponential backoff, honouring
+any retry-after hint the provider sends.
+"""
+import os
+import random
+import re
+import threading
+import time
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.yaml")
+
+
+def estimate_tokens(payload) -> int:
+    """Rough token estimate (~4 characters per token) for a prompt or message list"""
+    if isinstance(payload, str):
+        return len(payload) // 4 + 1
+    if isinstance(payload, dict):
+        return sum(estimate_tokens(v) for v in payload.values() if isinstance(v, (str, list, dict)))
+    if isinstance(payload, (list, tuple)):
+        return sum(estimate_tokens(p) for p in payload)
+    return 0
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for OpenAI RateLimitError, google ResourceExhausted or any HTTP 429"""
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    try:
+        return int(status) == 429
+    except (TypeError, ValueError):
+        return False
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """Extracts the provider's retry-after hint from an error, if it sent one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        if headers.get("retry-after"):
+            try:
+                return float(headers["retry-after"])
+            except ValueError:
+                pass
+
+    # Gemini puts a RetryInfo in the error details / message:
+    # "Please retry in 12.5s" or "retry_delay { seconds: 12 }"
+    text = str(error) + " " + str(getattr(error, "details", ""))
+    match = re.search(r"retry in ([\d.]+)\s*s", text, re.IGNORECASE)
+    if not match:
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Classic token bucket. Reservations may drive the level negative, the
+    returned wait is how long the caller must sleep before using its reservation."""
+
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = float(capacity)
+        self.rate = float(per_minute) / 60.0
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A single request larger than the bucket could never be satisfied
+        self.level -= min(amount, self.capacity)
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.rate
+
+
+class RateLimiter:
+    """Per-model requests/minute and tokens/minute limiter with 429 backoff.
+    Safe to share between threads (and asyncio code running calls in threads)."""
+
+    def __init__(self, limits: dict, max_retries=6, base_delay=2.0, max_delay=90.0):
+        self.limits = limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._blocked_until = {}
+
+    @classmethod
+    def from_config(cls, filepath=CONFIG_FILE):
+        import yaml
+        with open(filepath, 'r') as f:
+            config = yaml.safe_load(f)
+        return cls(config.get("models", {}), **config.get("backoff", {}))
+
+    def _model_limits(self, model: str) -> dict:
+        return self.limits.get(model) or self.limits.get("default", {"rpm": 10, "tpm": 250000})
+
+    def _get_buckets(self, model: str):
+        if model not in self._buckets:
+            limits = self._model_limits(model)
+            self._buckets[model] = (
+                TokenBucket(limits["rpm"], limits["rpm"]),
+                TokenBucket(limits["tpm"], limits["tpm"]),
+            )
+        return self._buckets[model]
+
+    def acquire(self, model: str, tokens: int = 0):
+        """Blocks until `model` has budget for one request of `tokens` tokens"""
+        tokens += self._model_limits(model).get("output_tokens", 0)
+        with self._lock:
+            requests_bucket, tokens_bucket = self._get_buckets(model)
+            wait = max(requests_bucket.reserve(1), tokens_bucket.reserve(tokens))
+            wait = max(wait, self._blocked_until.get(model, 0) - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Retry-after hint if present, otherwise full-jitter exponential backoff"""
+        hint = retry_after_seconds(error)
+        if hint is not None:
+            return hint + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, model: str, fn, tokens: int = 0, on_retry=None):
+        """Runs fn() under the model's budget, retrying rate-limit errors.
+        on_retry(attempt, error, delay) is called before each retry."""
+        attempt = 0
+        while True:
+            self.acquire(model, tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                # Pause every caller of this model, not just this thread
+                with self._lock:
+                    self._blocked_until[model] = max(self._blocked_until.get(model, 0), time.monotonic() + delay)
+                print(f"Rate limited on {model}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                attempt += 1
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Process-wide limiter shared by all callers"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter.from_config()
+        return _limiter
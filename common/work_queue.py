@@ -0,0 +1,205 @@
+"""Persistent SQLite work queue shared by generator and labelling workers.
+
+Tasks are "generate" (one conversation for a topic / student type) and
+"label" (one conversation id for one labeller). Any number of worker threads
+and processes can point at the same database file:
+
+  - `claim` atomically leases the oldest available task for `lease_seconds`;
+    a task whose lease expired (worker crashed or was killed) is available
+    again, so no work is lost,
+  - `heartbeat` extends a lease while a long task is still running,
+  - `complete` stores the result in the queue, only for the current lease
+    holder, so a task that was re-claimed is never recorded twice,
+  - `fail` puts the task back until it has been tried `max_attempts` times.
+
+Generate tasks carry no conversation id: ids are given out when the results
+are exported (see Week_3/queue_worker.py), so a task that fails for good leaves
+no gap. Results stay in the queue until then. Several machines can share a
+queue only through a filesystem with working file locks.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind          TEXT NOT NULL,
+    key           TEXT NOT NULL UNIQUE,
+    payload       TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    exported      INTEGER NOT NULL DEFAULT 0,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks(kind, status, id);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """Thread safe; every process opens its own WorkQueue on the shared file"""
+
+    def __init__(self, path="work_queue.sqlite", lease_seconds=600, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so claims from several processes serialise"""
+        return _Transaction(self._conn, self._lock)
+
+    # --- ids ---
+
+    def reserve_ids(self, count, name="task", start=1) -> list:
+        """Reserves `count` consecutive numbers from a shared counter (first one at least `start`)"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+            first = max(row[0] if row else 1, start)
+            conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, first + count))
+        return list(range(first, first + count))
+
+    # --- producing ---
+
+    def enqueue(self, kind, key, payload) -> bool:
+        """Adds a task unless one with the same key exists; returns whether it was added"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tasks (kind, key, payload, updated) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(payload, ensure_ascii=False), time.time()))
+        return cursor.rowcount == 1
+
+    # --- consuming ---
+
+    def claim(self, kind, worker) -> dict | None:
+        """Leases the oldest pending (or lease-expired) task of this kind, None when there is none"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases that used up their attempts are given up on
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'lease expired', updated = ?"
+                " WHERE kind = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, kind, now, self.max_attempts))
+            row = conn.execute(
+                "SELECT id, key, payload, attempts FROM tasks WHERE kind = ?"
+                " AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+                " ORDER BY id LIMIT 1", (kind, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row[0]))
+        return {"id": row[0], "kind": kind, "key": row[1], "payload": json.loads(row[2]),
+                "attempts": row[3] + 1, "worker": worker}
+
+    def _finish(self, task, sql, params) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                sql + " WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                params + (time.time(), task["id"], task["worker"]))
+        return cursor.rowcount == 1
+
+    def heartbeat(self, task) -> bool:
+        """Extends the lease; False means it was lost to another worker"""
+        return self._finish(task, "UPDATE tasks SET lease_expires = ?, updated = ?",
+                            (time.time() + self.lease_seconds,))
+
+    def complete(self, task, result) -> bool:
+        """Stores the result; False (and nothing stored) if the lease was lost"""
+        return self._finish(task, "UPDATE tasks SET status = 'done', result = ?, error = NULL, updated = ?",
+                            (json.dumps(result, ensure_ascii=False),))
+
+    def fail(self, task, error) -> bool:
+        """Returns the task to the queue, or marks it failed after max_attempts"""
+        status = "failed" if task["attempts"] >= self.max_attempts else "pending"
+        return self._finish(task, "UPDATE tasks SET status = ?, error = ?, lease_owner = NULL, updated = ?",
+                            (status, str(error)))
+
+    # --- inspecting ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status").fetchall()
+        stats = {}
+        for kind, status, count in rows:
+            stats.setdefault(kind, {})[status] = count
+        return stats
+
+    def pending(self, kind) -> int:
+        """Tasks of this kind that are not finished yet (pending or leased)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE kind = ? AND status IN ('pending', 'leased')", (kind,)).fetchone()[0]
+
+    def unexported(self, kind, key_prefix=""):
+        """(task id, result) for finished tasks not exported yet, in task order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, result FROM tasks WHERE kind = ? AND key LIKE ? AND status = 'done' AND exported = 0"
+                " ORDER BY id", (kind, key_prefix + "%")).fetchall()
+        return [(task_id, json.loads(result)) for task_id, result in rows]
+
+    def set_result(self, task_id, result):
+        """Replaces the stored result of a finished task"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET result = ? WHERE id = ? AND status = 'done'",
+                         (json.dumps(result, ensure_ascii=False), task_id))
+
+    def mark_exported(self, task_ids):
+        with self._transaction() as conn:
+            conn.executemany("UPDATE tasks SET exported = 1 WHERE id = ?", [(task_id,) for task_id in task_ids])
+
+    def requeue_failed(self, kind=None) -> int:
+        """Gives failed tasks a fresh set of attempts"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, lease_owner = NULL, updated = ?"
+                " WHERE status = 'failed'" + (" AND kind = ?" if kind else ""),
+                (time.time(), kind) if kind else (time.time(),))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+def worker_name(suffix="") -> str:
+    """host:pid[:suffix], unique per worker thread across machines"""
+    import socket
+    return f"{socket.gethostname()}:{os.getpid()}" + (f":{suffix}" if suffix != "" else "")
@@ -0,0 +1,244 @@
+"""
+Offline batch labelling through the OpenAI Batch API.
+
+Steps (each can be run on its own, state is kept in <dataset>_batch_state.json
+so an interrupted run resumes where it stopped):
+
+    python batch_label.py prepare --dataset dsa     # write the JSONL batch file
+    python batch_label.py submit  --dataset dsa     # upload it and create the batch
+    python batch_label.py poll    --dataset dsa     # wait for it and download results
+    python batch_label.py merge   --dataset dsa     # merge results into dsa_labels.json
+    python batch_label.py run     --dataset dsa     # all of the above
+
+Use --base-url (or OPENAI_BASE_URL) to point the client at a local stand-in server.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.checkpoint import LabelCheckpoint
+from common.client import get_client
+from common.dataset_reader import iter_conversations
+from common.label_schema import DSA, SYSTEM_DESIGN, parse_reply, repair
+import label_gpt
+import label_gpt_dsa
+
+# === CONFIG ===
+DATASETS = {
+    "interview": label_gpt,
+    "dsa": label_gpt_dsa,
+}
+RUBRICS = {"interview": SYSTEM_DESIGN, "dsa": DSA}
+POLL_INTERVAL = 30  # seconds between batch status checks
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_client(base_url=None):
+    """The shared pooled OpenAI client, optionally pointed at another server"""
+    if base_url:
+        os.environ["OPENAI_BASE_URL"] = base_url
+    return get_client().openai()
+
+
+def state_file(dataset):
+    return f"{dataset}_batch_state.json"
+
+
+def load_state(dataset):
+    try:
+        with open(state_file(dataset), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(dataset, state):
+    with open(state_file(dataset), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def load_conversations(dataset):
+    """Streams the conversations the given labeller works on"""
+    return iter_conversations(DATASETS[dataset].INPUT_FILE)
+
+
+def build_prompt(dataset, conversation):
+    if dataset == "dsa":
+        return label_gpt_dsa.build_prompt(conversation.get("conversation", []))
+    return label_gpt.build_prompt(conversation)
+
+
+def prepare(dataset):
+    """Writes one chat completion request per conversation, custom_id = conversation id"""
+    module = DATASETS[dataset]
+    batch_file = f"{dataset}_batch_input.jsonl"
+    count = 0
+    with open(batch_file, "w", encoding="utf-8") as f:
+        for conversation in load_conversations(dataset):
+            request = {
+                "custom_id": str(conversation["id"]),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": module.MODEL_NAME,
+                    "messages": [{"role": "user", "content": build_prompt(dataset, conversation)}],
+                    "response_format": {"type": "json_object"}
+                }
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+
+    save_state(dataset, {"input_file": batch_file})
+    print(f"Wrote {count} requests to {batch_file}")
+
+
+def submit(dataset, client):
+    """Uploads the batch file and creates the batch, unless one is already running"""
+    state = load_state(dataset)
+    if "input_file" not in state:
+        prepare(dataset)
+        state = load_state(dataset)
+    if state.get("batch_id") and state.get("status") not in ("failed", "expired", "cancelled"):
+        print(f"Batch {state['batch_id']} already submitted (status: {state.get('status')}), resuming")
+        return state
+
+    if not state.get("input_file_id"):
+        with open(state["input_file"], "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        state["input_file_id"] = uploaded.id
+        save_state(dataset, state)
+
+    batch = client.batches.create(
+        input_file_id=state["input_file_id"],
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    state.update({"batch_id": batch.id, "status": batch.status})
+    save_state(dataset, state)
+    print(f"Submitted batch {batch.id}")
+    return state
+
+
+def poll(dataset, client, interval=POLL_INTERVAL):
+    """Waits for the batch to finish and downloads its output file"""
+    state = load_state(dataset)
+    if not state.get("batch_id"):
+        raise SystemExit(f"No submitted batch for '{dataset}', run submit first")
+
+    while True:
+        batch = client.batches.retrieve(state["batch_id"])
+        state.update({
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id
+        })
+        save_state(dataset, state)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"Batch {batch.id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+        else:
+            print(f"Batch {batch.id}: {batch.status}")
+        if batch.status in TERMINAL_STATUSES:
+            break
+        time.sleep(interval)
+
+    if state["status"] != "completed" or not state.get("output_file_id"):
+        raise SystemExit(f"Batch ended with status {state['status']}")
+
+    output_file = f"{dataset}_batch_output.jsonl"
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(client.files.content(state["output_file_id"]).text)
+    state["output_file"] = output_file
+    save_state(dataset, state)
+    print(f"Downloaded results to {output_file}")
+    return state
+
+
+def merge(dataset):
+    """Merges batch results into the labeller's OUTPUT_FILE, replacing labels with the same id.
+    Results with missing or invalid criteria are completed with a short follow-up request.
+    Labels go through the labeller's checkpoint, so a later label_gpt / label_gpt_dsa run
+    resumes from them instead of older partial records, and failed ids are retried there."""
+    module = DATASETS[dataset]
+    rubric = RUBRICS[dataset]
+    state = load_state(dataset)
+    output_file = state.get("output_file", f"{dataset}_batch_output.jsonl")
+    checkpoint = LabelCheckpoint(module.OUTPUT_FILE)
+
+    merged, failed, incomplete = 0, {}, {}
+    with open(output_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            custom_id = result["custom_id"]
+            conversation_id = int(custom_id) if custom_id.isdigit() else custom_id
+            response = result.get("response") or {}
+            try:
+                if response.get("status_code") != 200:
+                    raise ValueError(result.get("error") or f"status {response.get('status_code')}")
+                text = response["body"]["choices"][0]["message"]["content"]
+                label, problems = rubric.validate(parse_reply(text))
+                if problems:
+                    incomplete[conversation_id] = text
+                    continue
+                checkpoint.record({"id": conversation_id, "label": label})
+                merged += 1
+            except Exception as e:
+                print(f"Error on id {custom_id}: {e}")
+                failed[conversation_id] = e
+
+    if incomplete:
+        print(f"Completing {len(incomplete)} labels with missing or invalid criteria")
+        for conversation in iter_conversations(module.INPUT_FILE, where=lambda c: c["id"] in incomplete):
+            conversation_id = conversation["id"]
+            messages = [{"role": "user", "content": build_prompt(dataset, conversation)}]
+            try:
+                label = repair(messages, incomplete.pop(conversation_id), rubric, module.ask)
+                checkpoint.record({"id": conversation_id, "label": label})
+                merged += 1
+            except Exception as e:
+                print(f"Error on id {conversation_id}: {e}")
+                failed[conversation_id] = e
+        # Whatever is left is no longer in the dataset
+        failed.update((conversation_id, "not in the dataset") for conversation_id in incomplete)
+
+    for conversation_id, error in failed.items():
+        if not checkpoint.is_done(conversation_id):
+            checkpoint.record_failure(conversation_id, error)
+    results = checkpoint.finalize()
+
+    print(f"\n✅ Merged {merged} batch labels into {module.OUTPUT_FILE} ({len(results)} total)")
+    if failed:
+        print(f"Failed ids: {list(failed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label a dataset through the OpenAI Batch API")
+    parser.add_argument("step", choices=["prepare", "submit", "poll", "merge", "run"])
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="interview")
+    parser.add_argument("--base-url", default=None, help="API base url, e.g. a local stand-in server")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="poll interval in seconds")
+    args = parser.parse_args()
+
+    if args.step == "prepare":
+        prepare(args.dataset)
+    elif args.step == "merge":
+        merge(args.dataset)
+    else:
+        client = make_client(args.base_url)
+        if args.step in ("submit", "run"):
+            if args.step == "run" and not load_state(args.dataset).get("batch_id"):
+                prepare(args.dataset)
+            submit(args.dataset, client)
+        if args.step in ("poll", "run"):
+            poll(args.dataset, client, args.interval)
+        if args.step == "run":
+            merge(args.dataset)
+
+
+if __name__ == "__main__":
+    main()
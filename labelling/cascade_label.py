@@ -0,0 +1,207 @@
+"""
+Cascaded labelling: the cheap labeller (label_gpt.py, gpt-5-nano) labels every
+conversation and only the ones it is unsure about go to the expensive one
+(Week_3/label.py, gemini-2.5-pro).
+
+    python cascade_label.py --input interview_dataset.json --output interview_labels_cascade.json
+
+The cheap model is asked for SAMPLES labels of a conversation in a single
+request (OpenAI `n`, so the conversation is sent and billed once). The
+conversation is escalated when
+  - a sample is not valid JSON or misses a criterion / gives a score outside 0-2,
+  - the samples disagree: a criterion's scores span more than MAX_SPREAD,
+  - more than MAX_SPLIT criteria are split: fewer than MIN_AGREEMENT of the
+    samples give the majority score. With 3 samples that is any 2-1 vote,
+    with 5 a 3-2 vote but not 4-1. A single split criterion is normal
+    sampling noise, several of them mean the model is unsure.
+Otherwise the label is the per-criterion majority of the samples.
+
+Cheap labelling keeps going while escalations wait for the expensive model's
+much smaller quota. Records are {"id", "label", "labeller"} plus "escalated"
+(the reasons) when the expensive model labelled it, in the label_gpt.py file
+format. The report shows the escalation rate and the cost against labelling
+everything with the expensive model.
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Week_3"))
+from common.client import get_client
+from common.metrics import get_metrics
+from common.checkpoint import LabelCheckpoint
+from common.dataset_reader import iter_conversations
+from common.label_schema import SYSTEM_DESIGN, parse_reply
+import label_gpt
+import label as expensive_labeller
+
+# === CONFIG ===
+INPUT_FILE = "interview_dataset.json"
+OUTPUT_FILE = "interview_labels_cascade.json"
+CHEAP_MODEL = label_gpt.MODEL_NAME
+EXPENSIVE_MODEL = expensive_labeller.MODEL_NAME
+SAMPLES = 3  # cheap labels per conversation, 1 escalates on invalid output only
+MAX_SPREAD = 1  # samples scoring a criterion both 0 and 2 disagree
+MIN_AGREEMENT = 0.7  # share of samples behind a criterion's majority score, below it the criterion is split
+MAX_SPLIT = 2  # split criteria tolerated before escalating
+CHEAP_CONCURRENCY = 8
+EXPENSIVE_CONCURRENCY = 2
+ID_RANGE = None  # e.g. (1, 100) to label only that id range
+
+CRITERIA = SYSTEM_DESIGN.criteria
+
+
+def parse_label(text):
+    """Rubric scores of one reply, None unless it has a valid score for every criterion"""
+    label, problems = SYSTEM_DESIGN.validate(parse_reply(text))
+    return None if problems else label
+
+
+def assess(samples) -> tuple:
+    """(majority label, reasons to escalate) of the cheap model's samples"""
+    labels = [parse_label(text) for text in samples]
+    if not labels or None in labels:
+        return None, ["invalid"]
+    label, reasons, split = {}, [], 0
+    for criterion in CRITERIA:
+        values = [l[criterion] for l in labels]
+        label[criterion], votes = Counter(values).most_common(1)[0]
+        if max(values) - min(values) > MAX_SPREAD and "disagreement" not in reasons:
+            reasons.append("disagreement")
+        if votes < MIN_AGREEMENT * len(values):
+            split += 1
+    if split > MAX_SPLIT:
+        reasons.append("split")
+    return label, reasons
+
+
+def cheap_label(conversation, samples=SAMPLES) -> tuple:
+    """(label, reasons to escalate) from the cheap model"""
+    messages = [{"role": "user", "content": label_gpt.build_prompt(conversation)}]
+    texts = get_client().sample(messages, CHEAP_MODEL, samples, {"response_format": label_gpt.RESPONSE_FORMAT},
+                                stage="label")
+    return assess(texts)
+
+
+def label_conversation(conversation, samples=SAMPLES) -> dict:
+    """Label record of one conversation, escalated when the cheap model is unsure"""
+    label, reasons = cheap_label(conversation, samples)
+    if not reasons:
+        return {"id": conversation["id"], "label": label, "labeller": CHEAP_MODEL}
+    return {"id": conversation["id"], "label": expensive_labeller.label_sample(conversation),
+            "labeller": EXPENSIVE_MODEL, "escalated": reasons}
+
+
+async def label_cascade(input_file=INPUT_FILE, output_file=OUTPUT_FILE, samples=SAMPLES,
+                        cheap_concurrency=CHEAP_CONCURRENCY, expensive_concurrency=EXPENSIVE_CONCURRENCY,
+                        id_range=ID_RANGE) -> list:
+    """Labels every conversation not in output_file yet, returns the records made in this run"""
+    import asyncio
+    checkpoint = LabelCheckpoint(output_file)
+    conversations = iter_conversations(input_file, id_range=id_range,
+                                       where=lambda conversation: not checkpoint.is_done(conversation["id"]))
+    expensive_slots = asyncio.Semaphore(expensive_concurrency)
+    escalations = set()
+    records = []
+
+    def save(record):
+        # Runs on the event loop thread, so checkpoint appends never interleave
+        checkpoint.record(record)
+        records.append(record)
+
+    async def escalate(conversation, reasons):
+        async with expensive_slots:
+            try:
+                label = await asyncio.to_thread(expensive_labeller.label_sample, conversation)
+            except Exception as e:
+                print(f"Error on sample: {e}")
+                checkpoint.record_failure(conversation["id"], e)
+                return
+        save({"id": conversation["id"], "label": label, "labeller": EXPENSIVE_MODEL, "escalated": reasons})
+
+    async def worker():
+        # Workers share the iterator, each takes the next conversation when it is free
+        for conversation in conversations:
+            print(f"Labelling id no. : {conversation['id']}")
+            with get_metrics().context(conversation_id=conversation["id"]):
+                try:
+                    label, reasons = await asyncio.to_thread(cheap_label, conversation, samples)
+                except Exception as e:
+                    print(f"Error on sample: {e}")
+                    checkpoint.record_failure(conversation["id"], e)
+                    continue
+                if reasons:
+                    print(f"Escalating id no. : {conversation['id']} ({', '.join(reasons)})")
+                    # The escalation waits for the expensive model on its own, cheap labelling goes on
+                    task = asyncio.create_task(escalate(conversation, reasons))
+                    escalations.add(task)
+                    task.add_done_callback(escalations.discard)
+                    continue
+            save({"id": conversation["id"], "label": label, "labeller": CHEAP_MODEL})
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(cheap_concurrency)))
+        await asyncio.gather(*list(escalations))
+    finally:
+        for task in list(escalations):
+            task.cancel()
+        checkpoint.finalize()
+    return records
+
+
+def print_report(records, calls, samples=SAMPLES):
+    """Escalation rate and cost of this run against labelling everything with the expensive model"""
+    if not records:
+        return
+    escalated = [r for r in records if r.get("escalated")]
+    reasons = Counter(reason for r in escalated for reason in r["escalated"])
+    print("\n=== Cascade ===")
+    print(f"Labelled {len(records)}: {len(records) - len(escalated)} by {CHEAP_MODEL}, "
+          f"{len(escalated)} escalated to {EXPENSIVE_MODEL} ({len(escalated) / len(records):.1%})")
+    if reasons:
+        print("Escalation reasons: " + ", ".join(f"{reason} {count}" for reason, count in reasons.most_common()))
+
+    metrics = get_metrics()
+    cheap_calls = [c for c in calls if c["model"] == CHEAP_MODEL and c["ok"]]
+    expensive_calls = [c for c in calls if c["model"] == EXPENSIVE_MODEL and c["ok"]]
+    cheap_cost = sum(c["cost"] for c in calls if c["model"] == CHEAP_MODEL)
+    expensive_cost = sum(c["cost"] for c in calls if c["model"] == EXPENSIVE_MODEL)
+    if expensive_calls:
+        per_conversation = sum(c["cost"] for c in expensive_calls) / len(expensive_calls)
+    elif cheap_calls:
+        # Nothing escalated: price the cheap requests (one sample's output) at the expensive rates
+        per_conversation = sum(metrics.cost(EXPENSIVE_MODEL, c["input_tokens"], 0, c["output_tokens"] / samples)
+                               for c in cheap_calls) / len(cheap_calls)
+    else:
+        return  # every reply came from the response cache
+    all_expensive = per_conversation * len(records)
+    spent = cheap_cost + expensive_cost
+    print(f"Cost: {CHEAP_MODEL} ${cheap_cost:.4f} + {EXPENSIVE_MODEL} ${expensive_cost:.4f} = ${spent:.4f}")
+    print(f"All with {EXPENSIVE_MODEL}: ~${all_expensive:.4f}, saved ~${all_expensive - spent:.4f}"
+          + (f" ({1 - spent / all_expensive:.0%})" if all_expensive else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cheap-then-expensive cascaded labelling")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--cheap-concurrency", type=int, default=CHEAP_CONCURRENCY)
+    parser.add_argument("--expensive-concurrency", type=int, default=EXPENSIVE_CONCURRENCY)
+    parser.add_argument("--id-range", type=int, nargs=2)
+    args = parser.parse_args()
+
+    import asyncio
+    metrics = get_metrics()
+    first_call = len(metrics.records)
+    records = asyncio.run(label_cascade(args.input, args.output, args.samples, args.cheap_concurrency,
+                                        args.expensive_concurrency, args.id_range or ID_RANGE))
+    print(f"✅ Saved labeled dataset to {args.output}")
+    print_report(records, metrics.records[first_call:], args.samples)
+    metrics.print_summary()
+
+
+if __name__ == "__main__":
+    main()
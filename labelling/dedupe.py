@@ -0,0 +1,256 @@
+"""Near-duplicate detection before labelling (MinHash + LSH).
+
+    python dedupe.py --input ../dataset/dsa_dataset.json --output dsa_dataset_dedup.json
+    python dedupe.py --input interview_dataset.json --threshold 0.7 --clusters duplicates.json
+
+The turns of every conversation are lowercased, split into words and hashed
+into word SHINGLE_SIZE-grams. Each conversation gets a NUM_PERM value MinHash
+signature (one-permutation hashing), and LSH banding over the signatures proposes candidate pairs,
+which are kept when their estimated Jaccard similarity reaches THRESHOLD.
+Duplicates are grouped into clusters (connected components) and the first
+conversation of each cluster is kept. Everything after tokenising runs on
+numpy arrays in fixed size chunks, so hundreds of thousands of conversations
+take seconds.
+
+Writes the clusters and a filtered dataset in the usual layout; point a
+labeller's INPUT_FILE at the filtered dataset so quota is only spent on
+distinct conversations. Conversations shorter than SHINGLE_SIZE words are
+never reported as duplicates.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.dataset_reader import iter_conversations
+from common.dataset_store import write_dataset_json
+from common.hashing import mix, word_arrays
+
+# === CONFIG ===
+INPUT_FILE = "interview_dataset.json"
+OUTPUT_FILE = "interview_dataset_dedup.json"
+CLUSTERS_FILE = "duplicate_clusters.json"
+THRESHOLD = 0.8   # estimated Jaccard similarity from which two conversations count as duplicates
+NUM_PERM = 128
+SHINGLE_SIZE = 5  # words per shingle
+CHUNK_SHINGLES = 1 << 22  # shingles hashed per batch, memory ~ CHUNK_SHINGLES * 40 bytes
+SEED = 1
+
+UINT32_MAX = np.iinfo(np.uint32).max
+
+
+def conversation_text(conversation) -> str:
+    return "\n".join(turn.get("speech", "") for turn in conversation.get("conversation", []))
+
+
+class _Vocabulary(dict):
+    """word -> id, new words get the next id"""
+
+    def __missing__(self, word):
+        self[word] = len(self)
+        return self[word]
+
+
+def tokenize(conversations) -> tuple:
+    """(ids, word ids of all conversations as one flat uint64 array, start offset of each conversation)"""
+    vocabulary = _Vocabulary()
+    ids = []
+
+    def texts():
+        for conversation in conversations:
+            ids.append(conversation["id"])
+            yield conversation_text(conversation)
+
+    words, offsets = word_arrays(texts(), vocabulary)
+    return ids, words, offsets
+
+
+def shingle_hashes(words, offsets, size=SHINGLE_SIZE) -> tuple:
+    """(32 bit hash of every word `size`-gram, start offset of each conversation's shingles);
+    shingles never span two conversations"""
+    lengths = np.diff(offsets)
+    counts = np.maximum(lengths - size + 1, 0)
+    shingle_offsets = np.concatenate(([0], np.cumsum(counts)))
+    if len(words) < size:
+        return np.zeros(0, dtype=np.uint64), shingle_offsets
+    windows = len(words) - size + 1
+    rolling = np.zeros(windows, dtype=np.uint64)
+    for position in range(size):
+        rolling = mix(rolling + words[position:position + windows])
+    # Window starts that stay inside their conversation
+    starts = np.repeat(offsets[:-1], counts) + (np.arange(shingle_offsets[-1]) - np.repeat(shingle_offsets[:-1], counts))
+    return rolling[starts] & np.uint64(UINT32_MAX), shingle_offsets
+
+
+def minhash_signatures(hashes, shingle_offsets, num_perm=NUM_PERM, seed=SEED, chunk=CHUNK_SHINGLES) -> np.ndarray:
+    """(conversations, num_perm) uint32 MinHash signatures by one-permutation hashing:
+    every shingle is hashed once, the hash picks one of num_perm bins and each bin
+    keeps its minimum, so the cost grows with the number of shingles only (not
+    shingles x num_perm). Empty bins borrow the value of the next non-empty bin,
+    mixed with the distance (rotation densification). Conversations without
+    shingles keep UINT32_MAX everywhere."""
+    n = len(shingle_offsets) - 1
+    signatures = np.full(n * num_perm, UINT32_MAX, dtype=np.uint32)
+    salt = np.uint64((seed * 0x9E3779B97F4A7C15) % 2 ** 64)
+    start = 0
+    while start < n:
+        # as many whole conversations as fit into one chunk, at least one
+        end = max(int(np.searchsorted(shingle_offsets, shingle_offsets[start] + chunk, side="right")) - 1, start + 1)
+        first, last = shingle_offsets[start], shingle_offsets[end]
+        if last > first:
+            mixed = mix(hashes[first:last] ^ salt)
+            bins = ((mixed >> np.uint64(32)) % np.uint64(num_perm)).astype(np.int64)
+            values = np.minimum(mixed & np.uint64(UINT32_MAX), UINT32_MAX - 1).astype(np.uint32)
+            rows = np.repeat(np.arange(start, end), np.diff(shingle_offsets[start:end + 1]))
+            np.minimum.at(signatures, rows * num_perm + bins, values)
+        start = end
+    signatures = signatures.reshape(n, num_perm)
+    return _densify(signatures)
+
+
+def _densify(signatures) -> np.ndarray:
+    empty = signatures == UINT32_MAX
+    partial = np.flatnonzero(empty.any(axis=1) & ~empty.all(axis=1))
+    if len(partial) == 0:
+        return signatures
+    num_perm = signatures.shape[1]
+    filled = ~np.concatenate([empty[partial], empty[partial]], axis=1)
+    positions = np.where(filled, np.arange(2 * num_perm), 2 * num_perm)
+    # next non-empty bin at or after each bin, wrapping around
+    source = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+    distance = (source - np.arange(num_perm)).astype(np.uint64)
+    borrowed = np.take_along_axis(signatures[partial], source % num_perm, axis=1).astype(np.uint64)
+    densified = np.minimum(mix(borrowed ^ (distance << np.uint64(32))) & np.uint64(UINT32_MAX), UINT32_MAX - 1)
+    signatures[partial] = np.where(distance == 0, borrowed, densified).astype(np.uint32)
+    return signatures
+
+
+def choose_bands(threshold, num_perm=NUM_PERM) -> tuple:
+    """(bands, rows) with bands * rows == num_perm whose LSH S-curve midpoint
+    (1 / bands) ** (1 / rows) is the highest one not above the threshold, so pairs
+    at the threshold are still found with high probability"""
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold] or options[-1:]
+    return max(below, key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+def candidate_pairs(signatures, bands, rows) -> np.ndarray:
+    """(i, j) row pairs, i < j, that land in the same bucket of at least one band.
+    Every bucket member is paired with the bucket's first row."""
+    rows_with_shingles = np.flatnonzero(signatures[:, 0] != UINT32_MAX)
+    pairs = []
+    for band in range(bands):
+        block = signatures[rows_with_shingles, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = np.zeros(len(rows_with_shingles), dtype=np.uint64)
+        for column in block.T:
+            keys = mix(keys + column)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leader = first[inverse.ravel()]
+        member = np.flatnonzero(leader != np.arange(len(keys)))
+        pairs.append(np.stack([rows_with_shingles[leader[member]], rows_with_shingles[member]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def estimated_similarity(signatures, pairs, chunk=1 << 16) -> np.ndarray:
+    """Share of equal MinHash values per pair, an estimate of the Jaccard similarity"""
+    similarity = np.empty(len(pairs))
+    for start in range(0, len(pairs), chunk):
+        part = pairs[start:start + chunk]
+        similarity[start:start + chunk] = (signatures[part[:, 0]] == signatures[part[:, 1]]).mean(axis=1)
+    return similarity
+
+
+def connected_components(n, pairs) -> np.ndarray:
+    """Component label per row: the lowest row index connected to it"""
+    labels = np.arange(n)
+    while len(pairs):
+        low = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], low)
+        np.minimum.at(updated, pairs[:, 1], low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels
+
+
+def find_duplicates(conversations, threshold=THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE) -> tuple:
+    """(ids in input order, component label per conversation, clusters) where each
+    cluster is {"representative", "duplicates", "min_similarity"} by conversation id"""
+    timings = {}
+    started = time.perf_counter()
+    ids, words, offsets = tokenize(conversations)
+    timings["tokenize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hashes, shingle_offsets = shingle_hashes(words, offsets, shingle_size)
+    signatures = minhash_signatures(hashes, shingle_offsets, num_perm)
+    timings["minhash"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bands, rows = choose_bands(threshold, num_perm)
+    pairs = candidate_pairs(signatures, bands, rows)
+    similarity = estimated_similarity(signatures, pairs)
+    pairs, similarity = pairs[similarity >= threshold], similarity[similarity >= threshold]
+    labels = connected_components(len(ids), pairs)
+    timings["lsh"] = time.perf_counter() - started
+
+    weakest = {}
+    for (first, _), value in zip(pairs, similarity):
+        component = int(labels[first])
+        weakest[component] = min(weakest.get(component, 1.0), float(value))
+    members = {}
+    for row in np.flatnonzero(labels != np.arange(len(ids))):
+        members.setdefault(int(labels[row]), []).append(ids[row])
+    clusters = [{"representative": ids[component], "duplicates": duplicates,
+                 "min_similarity": round(weakest.get(component, 1.0), 3)}
+                for component, duplicates in sorted(members.items())]
+    print(f"{len(ids)} conversations, {len(hashes)} shingles, {bands} bands x {rows} rows, "
+          f"{len(pairs)} duplicate pairs in {len(clusters)} clusters")
+    print("Time: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return ids, labels, clusters
+
+
+def dedupe(input_file=INPUT_FILE, output_file=OUTPUT_FILE, clusters_file=CLUSTERS_FILE,
+           threshold=THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE) -> list:
+    """Writes the duplicate clusters and the dataset without duplicates, returns the clusters"""
+    ids, labels, clusters = find_duplicates(iter_conversations(input_file), threshold, num_perm, shingle_size)
+    with open(clusters_file, "w", encoding="utf-8") as f:
+        json.dump(clusters, f, indent=2, ensure_ascii=False)
+
+    # Second pass streams the kept conversations, in input order
+    keep = labels == np.arange(len(ids))
+    kept = (conversation for index, conversation in enumerate(iter_conversations(input_file)) if keep[index])
+    info = {
+        "total_conversations": int(keep.sum()),
+        "deduplicated_from": input_file,
+        "duplicates_removed": int(len(ids) - keep.sum()),
+        "threshold": threshold,
+    }
+    write_dataset_json(output_file, info, kept)
+    print(f"Removed {info['duplicates_removed']} near-duplicates, {info['total_conversations']} "
+          f"conversations written to {output_file}, clusters in {clusters_file}")
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate conversations with MinHash + LSH")
+    parser.add_argument("--input", default=INPUT_FILE, help="JSON / JSONL dataset or shard directory")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--clusters", default=CLUSTERS_FILE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE)
+    args = parser.parse_args()
+    dedupe(args.input, args.output, args.clusters, args.threshold, args.num_perm, args.shingle_size)
+
+
+if __name__ == "__main__":
+    main()
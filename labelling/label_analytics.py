@@ -0,0 +1,261 @@
+"""Analytics over rubric labels: group statistics, criterion correlations and
+agreement between labellers.
+
+    python label_analytics.py summary --labels interview_labels.json --dataset interview_dataset.json
+    python label_analytics.py summary --labels ../dataset/dsa_columnar --by difficulty --distributions
+    python label_analytics.py agreement interview_labels.json ../Week_3/labels.json
+
+Labels are loaded into a (conversations x criteria) float32 score matrix, NaN
+where a criterion is missing, and joined by id to the conversation fields
+(student_level, difficulty, topic, dominant reply type and reply shares).
+Inputs are labeller output files / datasets (JSON) or a columnar export
+directory from common/columnar.py, which is memory-mapped.
+
+Every statistic is computed in whole-array passes (bincount, matrix products),
+looping at most over criteria or groups, never over records, so millions of
+labels take well under a second once loaded:
+  - per-group count, mean and score distribution of every criterion,
+  - pairwise-complete Pearson correlations between criteria and with the
+    reply shares,
+  - labeller agreement on shared ids: exact / within-one agreement, mean
+    difference and linear / quadratic weighted Cohen's kappa per criterion.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.columnar import REPLY_TYPES, build_tables, labels_table, map_table
+
+GROUP_FIELDS = ("student_level", "difficulty", "topic", "reply")
+
+
+class ScoreMatrix:
+    """ids (n,), criteria (k names) and scores (n, k) float32 with NaN for missing"""
+
+    def __init__(self, ids, criteria, scores):
+        self.ids = np.asarray(ids)
+        self.criteria = list(criteria)
+        self.scores = np.asarray(scores, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, criteria) -> "ScoreMatrix":
+        columns = [self.criteria.index(criterion) for criterion in criteria]
+        return ScoreMatrix(self.ids, criteria, self.scores[:, columns])
+
+    def take(self, rows) -> "ScoreMatrix":
+        return ScoreMatrix(self.ids[rows], self.criteria, self.scores[rows])
+
+
+def _column(table, name, fill=-1) -> np.ndarray:
+    column = table[name].combine_chunks()
+    return column.fill_null(fill).to_numpy(zero_copy_only=False)
+
+
+def _codes(table, name) -> tuple:
+    """(int codes, -1 for null; names) of a dictionary encoded column"""
+    column = table[name].combine_chunks()
+    if not hasattr(column, "indices"):
+        column = column.dictionary_encode()
+    codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+    return codes, column.dictionary.to_pylist()
+
+
+def load_labels(path) -> ScoreMatrix:
+    """Labeller output file (JSON) or columnar export directory"""
+    table = map_table(path, "labels") if os.path.isdir(path) else labels_table(path)
+    criteria = [name for name in table.column_names if name != "id"]
+    scores = np.column_stack([_column(table, criterion) for criterion in criteria]).astype(np.float32)
+    scores[scores < 0] = np.nan
+    return ScoreMatrix(_column(table, "id"), criteria, scores)
+
+
+def load_conversations(path) -> dict:
+    """Conversation fields as arrays: id, <field>_codes / <field>_names for the group
+    fields and reply_shares (n, len(REPLY_TYPES))"""
+    table = map_table(path, "conversations") if os.path.isdir(path) else build_tables(path, with_turns=False)["conversations"]
+    fields = {"id": _column(table, "id")}
+    for name in ("student_level", "difficulty", "topic"):
+        fields[f"{name}_codes"], fields[f"{name}_names"] = _codes(table, name)
+    counts = np.column_stack([_column(table, f"reply_{reply}", 0) for reply in REPLY_TYPES]).astype(np.float32)
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fields["reply_shares"] = np.where(totals > 0, counts / totals, np.nan)
+    fields["reply_codes"] = np.where(totals[:, 0] > 0, counts.argmax(axis=1), -1)
+    fields["reply_names"] = list(REPLY_TYPES)
+    return fields
+
+
+def join(labels, conversations) -> tuple:
+    """(labels that have a conversation, conversation row of each) matched on id"""
+    order = np.argsort(conversations["id"], kind="stable")
+    sorted_ids = conversations["id"][order]
+    positions = np.clip(np.searchsorted(sorted_ids, labels.ids), 0, max(len(sorted_ids) - 1, 0))
+    found = sorted_ids[positions] == labels.ids if len(sorted_ids) else np.zeros(len(labels), dtype=bool)
+    return labels.take(found), order[positions[found]]
+
+
+def score_levels(*matrices) -> int:
+    """Number of score values (max score + 1) across the matrices"""
+    return int(max(np.nanmax(m.scores) if np.isfinite(m.scores).any() else 0 for m in matrices)) + 1
+
+
+def group_stats(labels, codes, names, levels=None) -> dict:
+    """Per group: count, mean (groups, k) and distribution (groups, k, levels) of every
+    criterion; rows with code -1 are left out"""
+    levels = levels or score_levels(labels)
+    groups, k = len(names), len(labels.criteria)
+    valid = ~np.isnan(labels.scores) & (codes >= 0)[:, None]
+    rows, columns = np.nonzero(valid)
+    values = labels.scores[rows, columns].astype(np.int64)
+    cell = codes[rows] * k + columns
+    counts = np.bincount(cell, minlength=groups * k).reshape(groups, k)
+    sums = np.bincount(cell, weights=values, minlength=groups * k).reshape(groups, k)
+    histogram = np.bincount(cell * levels + values, minlength=groups * k * levels).reshape(groups, k, levels)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "names": names,
+            "count": np.bincount(codes[codes >= 0], minlength=groups),
+            "mean": sums / counts,
+            "distribution": histogram / counts[:, :, None],
+        }
+
+
+def correlate(a, b) -> np.ndarray:
+    """Pearson correlation of every column of a with every column of b over the rows
+    where both are present (NaN = missing), as (a columns, b columns)"""
+    mask_a, mask_b = ~np.isnan(a), ~np.isnan(b)
+    x, y = np.where(mask_a, a, 0).astype(np.float64), np.where(mask_b, b, 0).astype(np.float64)
+    ma, mb = mask_a.astype(np.float64), mask_b.astype(np.float64)
+    n = ma.T @ mb
+    sum_x, sum_y = x.T @ mb, ma.T @ y
+    sum_xx, sum_yy = (x * x).T @ mb, ma.T @ (y * y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = x.T @ y - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        return cov / np.sqrt(var_x * var_y)
+
+
+def agreement(first, second, levels=None) -> dict:
+    """Agreement between two labellers on their shared ids and criteria"""
+    criteria = [criterion for criterion in first.criteria if criterion in second.criteria]
+    shared, first_rows, second_rows = np.intersect1d(first.ids, second.ids, return_indices=True)
+    a = first.select(criteria).scores[first_rows]
+    b = second.select(criteria).scores[second_rows]
+    levels = levels or score_levels(first, second)
+    k = len(criteria)
+
+    both = ~np.isnan(a) & ~np.isnan(b)
+    rows, columns = np.nonzero(both)
+    x, y = a[rows, columns].astype(np.int64), b[rows, columns].astype(np.int64)
+    observed = np.bincount((columns * levels + x) * levels + y, minlength=k * levels * levels)
+    observed = observed.reshape(k, levels, levels).astype(np.float64)
+    n = observed.sum(axis=(1, 2))
+    expected = observed.sum(axis=2)[:, :, None] * observed.sum(axis=1)[:, None, :] / np.maximum(n, 1)[:, None, None]
+    distance = np.abs(np.subtract.outer(np.arange(levels), np.arange(levels))) / max(levels - 1, 1)
+
+    def kappa(weights):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 1 - (observed * weights).sum(axis=(1, 2)) / (expected * weights).sum(axis=(1, 2))
+
+    difference = np.where(both, a - b, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "criteria": criteria,
+            "shared_ids": len(shared),
+            "n": n.astype(np.int64),
+            "exact": np.trace(observed, axis1=1, axis2=2) / n,
+            "within_one": (observed * (distance * max(levels - 1, 1) <= 1)).sum(axis=(1, 2)) / n,
+            "mean_difference": difference.sum(axis=0) / n,
+            "kappa_linear": kappa(distance),
+            "kappa_quadratic": kappa(distance ** 2),
+        }
+
+
+# --- reports ---
+
+def _fmt(value, digits=2) -> str:
+    return "  -  " if value is None or np.isnan(value) else f"{value:.{digits}f}"
+
+
+def print_group_stats(labels, stats, field, distributions=False):
+    print(f"\n=== Mean scores by {field} ===")
+    print(f"{field[:28]:28s}{'count':>7s}" + "".join(f"{criterion[:8]:>9s}" for criterion in labels.criteria))
+    for g, name in enumerate(stats["names"]):
+        print(f"{str(name)[:28]:28s}{stats['count'][g]:>7d}" + "".join(f"{_fmt(mean):>9s}" for mean in stats["mean"][g]))
+    if distributions:
+        print(f"\n=== Score distribution by {field} (share of 0 / 1 / 2 ...) ===")
+        for g, name in enumerate(stats["names"]):
+            print(f"{str(name)[:60]}:")
+            for j, criterion in enumerate(labels.criteria):
+                shares = " / ".join(f"{_fmt(share * 100, 0)}%" for share in stats["distribution"][g, j])
+                print(f"  {criterion[:28]:28s} {shares}")
+
+
+def print_correlations(names, rows, matrix, title):
+    print(f"\n=== {title} ===")
+    short = [name[:8] for name in names]
+    print(f"{'':28s}" + "".join(f"{name:>9s}" for name in short))
+    for i, row_name in enumerate(rows):
+        print(f"{row_name[:28]:28s}" + "".join(f"{_fmt(value):>9s}" for value in matrix[i]))
+
+
+def summary(labels_path, dataset_path=None, by=("student_level", "difficulty"), distributions=False):
+    labels = load_labels(labels_path)
+    print(f"{len(labels)} labels, {len(labels.criteria)} criteria from {labels_path}")
+    print_correlations(labels.criteria, labels.criteria, correlate(labels.scores, labels.scores),
+                       "Correlation between criteria")
+    # A columnar export directory holds the conversations as well
+    dataset_path = dataset_path or (labels_path if os.path.isdir(labels_path) else None)
+    if dataset_path is None:
+        return
+    conversations = load_conversations(dataset_path)
+    labels, rows = join(labels, conversations)
+    print(f"\n{len(labels)} labels joined to conversations in {dataset_path}")
+    levels = score_levels(labels)
+    for field in by:
+        stats = group_stats(labels, conversations[f"{field}_codes"][rows], conversations[f"{field}_names"], levels)
+        print_group_stats(labels, stats, field, distributions)
+    print_correlations(list(REPLY_TYPES), labels.criteria, correlate(labels.scores, conversations["reply_shares"][rows]),
+                       "Correlation of criteria with reply type shares")
+
+
+def print_agreement(first_path, second_path):
+    result = agreement(load_labels(first_path), load_labels(second_path))
+    print(f"{result['shared_ids']} ids labelled by both {first_path} and {second_path}")
+    if not result["shared_ids"]:
+        return
+    print(f"\n{'criterion':28s}{'n':>6s}{'exact':>8s}{'<=1':>8s}{'diff':>8s}{'kappa_lin':>11s}{'kappa_quad':>12s}")
+    for j, criterion in enumerate(result["criteria"]):
+        print(f"{criterion[:28]:28s}{result['n'][j]:>6d}{_fmt(result['exact'][j]):>8s}{_fmt(result['within_one'][j]):>8s}"
+              f"{_fmt(result['mean_difference'][j]):>8s}{_fmt(result['kappa_linear'][j]):>11s}"
+              f"{_fmt(result['kappa_quadratic'][j]):>12s}")
+    print("diff = first - second; kappa weighted by score distance (linear) or squared distance (quadratic)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rubric label analytics and labeller agreement")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("summary")
+    p.add_argument("--labels", required=True, help="labeller output JSON or columnar export directory")
+    p.add_argument("--dataset", help="dataset the labels belong to (JSON / JSONL / shards or columnar directory)")
+    p.add_argument("--by", nargs="+", choices=GROUP_FIELDS, default=["student_level", "difficulty"])
+    p.add_argument("--distributions", action="store_true", help="also print score distributions per group")
+    p = sub.add_parser("agreement")
+    p.add_argument("first", help="labels of one labeller, e.g. interview_labels.json (GPT)")
+    p.add_argument("second", help="labels of the other, e.g. ../Week_3/labels.json (Gemini)")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summary(args.labels, args.dataset, args.by, args.distributions)
+    else:
+        print_agreement(args.first, args.second)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,22 @@
-import json
 import os
-from openai import OpenAI
-from datasets import Dataset
-from dotenv import load_dotenv
-import random, time
+import sys
 
-# Configure OpenAI API
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.client import get_client
+from common.metrics import get_metrics
+from common.cache import get_cache
+from common.checkpoint import LabelCheckpoint
+from common.dataset_reader import iter_conversations
+from common.label_schema import SYSTEM_DESIGN, label_with_repair
+
+# OpenAI is configured by the shared client on first use (OPENAI_API_KEY, .env)
 
 # === CONFIG ===
 INPUT_FILE = "interview_dataset.json"
 OUTPUT_FILE = "interview_labels.json"
 MODEL_NAME = "gpt-5-nano" 
+RESPONSE_FORMAT = {"type": "json_object"}
+ID_RANGE = None  # e.g. (1, 100) to label only that id range
 
 # === PROMPT TEMPLATE ===
 def build_prompt(conversation):
@@ -107,61 +111,54 @@ def build_prompt(conversation):
     return prompt.strip()
 
 
-def label_dataset():
-    # Extract the "conversations" field first
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)["conversations"]
+def label_sample(sample):
+    """Labels one conversation, returns the rubric scores"""
+    prompt = build_prompt(sample)
+    messages = [
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    # Missing or invalid criteria are asked for again in a short follow-up
+    return label_with_repair(messages, SYSTEM_DESIGN, ask)
 
-    # Then load into a Dataset object
-    dataset = Dataset.from_list(data)
-    
-    results = []
+
+def ask(messages, stage):
+    return get_client().generate(messages, MODEL_NAME, {"response_format": RESPONSE_FORMAT}, stage=stage)
+
+
+def label_dataset():
+    checkpoint = LabelCheckpoint(OUTPUT_FILE)
     count = 0
-    samples = [sample for sample in dataset]
+    # Stream conversations one at a time, skipping the ones already labelled
+    samples = iter_conversations(INPUT_FILE, id_range=ID_RANGE,
+                                 where=lambda sample: not checkpoint.is_done(sample["id"]))
     
-    for sample in samples:
-        count += 1
-        prompt = build_prompt(sample)
-        print(f"Labelling entry no. : {count}, id no. : {sample['id']}")
-        
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
+    try:
+        for sample in samples:
+            count += 1
+            print(f"Labelling entry no. : {count}, id no. : {sample['id']}")
             
-            # parse JSON safely
-            text = response.choices[0].message.content.strip()
             try:
-                label = json.loads(text)
-            except json.JSONDecodeError:
-                # handle model returning extra text or invalid JSON
-                start = text.find("{")
-                end = text.rfind("}")
-                label = json.loads(text[start:end+1])
-
-            results.append({
-                "id": sample["id"],
-                "label": label
-            })
-
-            time.sleep(2)  # Reduced wait time for GPT API (adjust as needed for rate limits)
-
-        except Exception as e:
-            print(f"Error on sample: {e}")
-            continue
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+                with get_metrics().context(conversation_id=sample["id"]):
+                    label = label_sample(sample)
+                checkpoint.record({
+                    "id": sample["id"],
+                    "label": label
+                })
+
+            except Exception as e:
+                print(f"Error on sample: {e}")
+                checkpoint.record_failure(sample["id"], e)
+                continue
+    finally:
+        checkpoint.finalize()
 
     print(f"✅ Saved labeled dataset to {OUTPUT_FILE}")
     print(count)
+    print(f"Cache: {get_cache().stats()}")
+    get_metrics().print_summary()
 
 
 if __name__ == "__main__":
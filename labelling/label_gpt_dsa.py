@@ -1,35 +1,31 @@
-import json
 import os
-from openai import OpenAI
-from datasets import Dataset
-from dotenv import load_dotenv
-import random, time
+import sys
 
-# Configure OpenAI API
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.client import get_client
+from common.rate_limiter import estimate_tokens
+from common.metrics import get_metrics
+from common.cache import get_cache
+from common.checkpoint import LabelCheckpoint
+from common.dataset_reader import iter_conversations
+from common.label_schema import DSA, label_with_repair, parse_reply
+
+# OpenAI is configured by the shared client on first use (OPENAI_API_KEY, .env)
 
 # === CONFIG ===
 INPUT_FILE = "dsa_dataset.json"
 OUTPUT_FILE = "dsa_labels.json"
 MODEL_NAME = "gpt-5-nano"  # or gpt-3.5-turbo for faster/cheaper results
+RESPONSE_FORMAT = {"type": "json_object"}
+ID_RANGE = None  # e.g. (51, 75) to label only that id range
+
+# Packed mode: label several conversations per request so the rubric is sent once per pack
+PACKED_MODE = False
+PACK_SIZE = 8               # max conversations per packed request
+PACK_TOKEN_BUDGET = 12000   # max estimated input tokens per packed request
 
 # === PROMPT TEMPLATE ===
-def build_prompt(conversation):
-    """
-    Build a prompt for evaluating DSA interview performance.
-    """
-    convo = ""
-    for exchange in conversation:
-        speaker = exchange["speaker"]
-        speech = exchange["speech"]
-        
-        if speaker == "interviewer":
-            convo += f"Interviewer: {speech}\n\n"
-        else:
-            convo += f"Interviewee: {speech}\n\n"
-    
-    prompt = f"""
+DSA_RUBRIC = """
 You are an expert technical interviewer and evaluator specializing in Data Structures and Algorithms (DSA) problems.
 
 Your task is to **evaluate the interviewee's performance** in the following DSA problem-solving interview conversation.
@@ -72,19 +68,9 @@ For each criterion, give a score between **0 and 2** based on the evidence from
 1 → Basic or partial response with some correct elements  
 2 → Excellent, detailed, complete, and technically sound response  
 
----
-
-### Interview Conversation
-
-{convo}
-
----
-
-### Output Format (strictly JSON)
-
-Return **only** the following JSON, with integer scores from 0–2 for each rubric category:
+"""
 
-{{
+DSA_SCORE_FORMAT = """{
     "ask_clarifying_questions": int,
     "propose_brute_force": int,
     "space_time_complexity": int,
@@ -93,9 +79,9 @@ Return **only** the following JSON, with integer scores from 0–2 for each rubr
     "correct_explanation": int,
     "polite_respectful_tone": int,
     "logical_progression": int
-}}
+}"""
 
-Important: 
+DSA_GUIDELINES = """Important: 
 - Give scores realistically based on actual performance
 - Do not give all scores as 2 unless the interviewee demonstrated excellence in all areas
 - A score of 1 is appropriate when the interviewee showed basic understanding but lacked depth or completeness
@@ -104,63 +90,180 @@ Important:
 Do not include explanations, comments, or reasoning.  
 Return valid JSON **only**.
 """
-    return prompt.strip()
 
 
-def label_dataset():
-    # Load the cleaned DSA dataset
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    results = []
-    count = 0
+def format_conversation(conversation):
+    """Renders the conversation turns as Interviewer/Interviewee lines."""
+    convo = ""
+    for exchange in conversation:
+        speaker = exchange["speaker"]
+        speech = exchange["speech"]
+        
+        if speaker == "interviewer":
+            convo += f"Interviewer: {speech}\n\n"
+        else:
+            convo += f"Interviewee: {speech}\n\n"
+    return convo
+
+
+def build_prompt(conversation):
+    """
+    Build a prompt for evaluating DSA interview performance.
+    """
+    convo = format_conversation(conversation)
     
+    prompt = f"""{DSA_RUBRIC}---
+
+### Interview Conversation
+
+{convo}
+
+---
+
+### Output Format (strictly JSON)
+
+Return **only** the following JSON, with integer scores from 0–2 for each rubric category:
+
+{DSA_SCORE_FORMAT}
+
+{DSA_GUIDELINES}"""
+    return prompt.strip()
+
+
+def build_packed_prompt(interviews):
+    """
+    Build one prompt that evaluates several DSA interviews, keyed by their id.
+    The rubric is included only once for the whole pack.
+    """
+    convos = ""
+    for interview in interviews:
+        convos += f"#### Conversation id: {interview.get('id')}\n\n"
+        convos += format_conversation(interview.get("conversation", []))
+        convos += "---\n\n"
+    ids = ", ".join(str(interview.get("id")) for interview in interviews)
+
+    prompt = f"""{DSA_RUBRIC}---
+
+### Interview Conversations
+
+Evaluate each of the following {len(interviews)} conversations **independently**.
+
+{convos}### Output Format (strictly JSON)
+
+Return **only** a JSON object with a "labels" array holding one entry per conversation (ids: {ids}).
+Each "label" has integer scores from 0–2 for each rubric category:
+
+{{
+    "labels": [
+        {{"id": int, "label": {DSA_SCORE_FORMAT}}}
+    ]
+}}
+
+{DSA_GUIDELINES}"""
+    return prompt.strip()
+
+
+def pack_interviews(data, pack_size=PACK_SIZE, token_budget=PACK_TOKEN_BUDGET):
+    """Groups interviews into packs of at most pack_size that fit the token budget."""
+    rubric_tokens = estimate_tokens(DSA_RUBRIC + DSA_SCORE_FORMAT + DSA_GUIDELINES)
+    pack, pack_tokens = [], rubric_tokens
     for interview in data:
-        count += 1
-        conversation = interview.get("conversation", [])
-        interview_id = interview.get("id")
-        
-        prompt = build_prompt(conversation)
-        print(f"Labelling entry no. : {count}, id no. : {interview_id}")
-        
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
+        tokens = estimate_tokens(format_conversation(interview.get("conversation", [])))
+        if pack and (len(pack) >= pack_size or pack_tokens + tokens > token_budget):
+            yield pack
+            pack, pack_tokens = [], rubric_tokens
+        pack.append(interview)
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+
+def ask(messages, stage):
+    return get_client().generate(messages, MODEL_NAME, {"response_format": RESPONSE_FORMAT}, stage=stage)
+
+
+def request_label_json(prompt):
+    """Sends one labelling prompt and returns the parsed JSON reply."""
+    messages = [
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    reply = parse_reply(ask(messages, "label"))
+    if reply is None:
+        raise ValueError("reply is not JSON")
+    return reply
+
+
+def label_interview(interview):
+    """Labels a single interview, returns the rubric scores.
+    Missing or invalid criteria are asked for again in a short follow-up."""
+    messages = [{"role": "user", "content": build_prompt(interview.get("conversation", []))}]
+    return label_with_repair(messages, DSA, ask)
+
+
+def label_pack(pack):
+    """
+    Labels a pack of interviews in one request.
+    Returns {id: label} for every conversation with a complete, valid label in the reply;
+    the others are labelled on their own afterwards.
+    """
+    reply = request_label_json(build_packed_prompt(pack))
+    entries = reply.get("labels", []) if isinstance(reply, dict) else reply
+    expected = {str(interview.get("id")): interview.get("id") for interview in pack}
+    labels = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("label"), dict):
+            continue
+        key = str(entry.get("id"))
+        label, problems = DSA.validate(entry["label"])
+        if key in expected and not problems:
+            labels[expected[key]] = label
+    return labels
+
+def label_dataset(packed=PACKED_MODE):
+    checkpoint = LabelCheckpoint(OUTPUT_FILE)
+
+    def pending():
+        # Stream the cleaned DSA dataset, skipping interviews already labelled
+        return iter_conversations(INPUT_FILE, id_range=ID_RANGE,
+                                  where=lambda interview: not checkpoint.is_done(interview.get("id")))
+
+    try:
+        if packed:
+            for pack in pack_interviews(pending()):
+                print(f"Labelling pack of {len(pack)}, ids : {[interview.get('id') for interview in pack]}")
+                try:
+                    with get_metrics().context(conversation_ids=[interview.get("id") for interview in pack]):
+                        labels = label_pack(pack)
+                    for interview_id, label in labels.items():
+                        checkpoint.record({"id": interview_id, "label": label})
+                except Exception as e:
+                    print(f"Error on pack: {e}")
+
+        count = 0
+        for interview in pending():
+            count += 1
+            interview_id = interview.get("id")
+            
+            # In packed mode only conversations missing from the packed replies get here
+            print(f"Labelling entry no. : {count}, id no. : {interview_id}")
             
-            # Parse JSON safely
-            text = response.choices[0].message.content.strip()
             try:
-                label = json.loads(text)
-            except json.JSONDecodeError:
-                # Handle model returning extra text or invalid JSON
-                start = text.find("{")
-                end = text.rfind("}")
-                label = json.loads(text[start:end+1])
-
-            results.append({
-                "id": interview_id,
-                "label": label
-            })
-
-            # time.sleep(2)  # Rate limiting
-
-        except Exception as e:
-            print(f"Error on interview {interview_id}: {e}")
-            continue
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+                with get_metrics().context(conversation_id=interview_id):
+                    checkpoint.record({"id": interview_id, "label": label_interview(interview)})
+            except Exception as e:
+                print(f"Error on interview {interview_id}: {e}")
+                checkpoint.record_failure(interview_id, e)
+                continue
+    finally:
+        results = checkpoint.finalize()
 
     print(f"\n✅ Saved labeled DSA dataset to {OUTPUT_FILE}")
-    print(f"Total interviews labeled: {len(results)}/{len(data)}")
+    print(f"Total interviews labeled: {len(results)}")
+    print(f"Cache: {get_cache().stats()}")
+    get_metrics().print_summary()
 
 
 if __name__ == "__main__":
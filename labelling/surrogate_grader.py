@@ -0,0 +1,395 @@
+"""Local surrogate grader: predicts rubric scores without any API call.
+
+    python surrogate_grader.py evaluate --dataset ../dataset/dsa_dataset.json --labels ../dataset/dsa_labels.json
+    python surrogate_grader.py train --dataset ../dataset/dsa_dataset.json --labels ../dataset/dsa_labels.json --model dsa_grader.npz
+    python surrogate_grader.py predict --model dsa_grader.npz --input new_dsa_dataset.json --output dsa_scores.json
+
+Every conversation becomes one sparse feature vector: word unigrams and
+bigrams of the interviewer's and of the interviewee's turns, hashed (signed)
+into 2**HASH_BITS buckets per speaker with log-scaled, L2-normalised counts,
+followed by the generation metadata (student level, difficulty, exchanges and
+the difficulty / reply distributions). One ridge regression per rubric
+criterion is fitted on the labelled conversations; all criteria share the
+same kernel matrix, so training solves a single (conversations x
+conversations) system. The kernel is accumulated from FIT_BATCH densified
+rows at a time, so the dense (conversations x columns) matrix is never built. Predictions are the regression outputs rounded and
+clipped to 0-2; the raw values are kept for triage (values far from a whole
+score are the uncertain ones).
+
+`evaluate` runs k-fold cross-validation (or scores a trained --model) against
+the labels and reports MAE, exact / within-one agreement and quadratic kappa
+next to the always-predict-the-mean baseline. `predict` featurises and scores
+conversations in batches with array operations only and writes records in
+the label_gpt.py format plus the raw values.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.dataset_reader import iter_conversations
+from common.hashing import mix, word_arrays
+
+# === CONFIG ===
+DATASET_FILE = "../dataset/dsa_dataset.json"
+LABELS_FILE = "../dataset/dsa_labels.json"
+MODEL_FILE = "dsa_grader.npz"
+OUTPUT_FILE = "dsa_scores.json"
+HASH_BITS = 14  # hashed n-gram buckets per speaker: 2**14
+NGRAMS = 2  # unigrams and bigrams
+META_WEIGHT = 1.0  # scale of the metadata features next to the unit-norm text features
+ALPHA = 0.3  # ridge penalty
+FOLDS = 5
+BATCH_SIZE = 2048  # conversations featurised and scored at once by predict
+FIT_BATCH = 512  # rows densified at once while training, memory ~ 2 * FIT_BATCH * 2**HASH_BITS * 16 bytes
+SEED = 1
+
+SPEAKERS = ("interviewer", "interviewee")
+SCORES = (0, 2)  # lowest and highest score
+STUDENT_LEVELS = ("poor_student", "average_student", "good_student")
+DIFFICULTIES = ("EASY", "MEDIUM", "HARD")
+REPLY_TYPES = ("clear", "confused", "misunderstood", "wrong")
+META_FEATURES = ([f"student_level={s}" for s in STUDENT_LEVELS] + [f"difficulty={d}" for d in DIFFICULTIES]
+                 + ["exchanges"] + [f"difficulty_share={d}" for d in DIFFICULTIES]
+                 + [f"reply_share={r}" for r in REPLY_TYPES])
+
+
+class _WordHashes(dict):
+    """word -> crc32 of the word, stable across runs unlike hash()"""
+
+    def __missing__(self, word):
+        self[word] = zlib.crc32(word.encode("utf-8"))
+        return self[word]
+
+
+_word_hashes = _WordHashes()
+
+
+def _shares(distribution, keys) -> list:
+    distribution = {str(k).upper(): v or 0 for k, v in (distribution or {}).items()}
+    total = sum(distribution.get(k.upper(), 0) for k in keys)
+    return [distribution.get(k.upper(), 0) / total if total else 0.0 for k in keys]
+
+
+def metadata(conversation) -> list:
+    """Generation metadata of one conversation as META_FEATURES values"""
+    level = conversation.get("student_level") or conversation.get("student_type")
+    difficulty = str(conversation.get("difficulty") or "").upper()
+    return ([float(level == s) for s in STUDENT_LEVELS] + [float(difficulty == d) for d in DIFFICULTIES]
+            + [(conversation.get("exchanges") or 0) / 10]
+            + _shares(conversation.get("difficulty_distribution"), DIFFICULTIES)
+            + _shares(conversation.get("reply_distribution"), REPLY_TYPES))
+
+
+def tokenize(conversations) -> tuple:
+    """(ids, word hashes as one flat uint64 array, start offset of every (conversation, speaker)
+    segment, metadata (n, len(META_FEATURES)) float32)"""
+    ids, meta = [], []
+
+    def segments():
+        for conversation in conversations:
+            turns = conversation.get("conversation", [])
+            for speaker in SPEAKERS:
+                yield "\n".join(turn.get("speech", "") for turn in turns if turn.get("speaker") == speaker)
+            ids.append(conversation["id"])
+            meta.append(metadata(conversation))
+
+    words, offsets = word_arrays(segments(), _word_hashes)
+    return ids, words, offsets, np.array(meta, dtype=np.float32).reshape(len(ids), len(META_FEATURES))
+
+
+def hashed_features(words, offsets, bits=HASH_BITS, ngrams=NGRAMS) -> tuple:
+    """Sparse text features as (row, column, value) arrays sorted by row: n-grams never span
+    two segments, segment 2i + s is speaker s of conversation i and goes to columns
+    [s * 2**bits, (s + 1) * 2**bits)"""
+    segments = len(offsets) - 1
+    segment_of = np.repeat(np.arange(segments), np.diff(offsets))
+    found_segments, found_hashes = [], []
+    for size in range(1, ngrams + 1):
+        windows = len(words) - size + 1
+        if windows <= 0:
+            break
+        rolling = np.full(windows, size, dtype=np.uint64)  # the n-gram length keeps orders apart
+        for position in range(size):
+            rolling = mix(rolling + words[position:position + windows])
+        inside = segment_of[:windows] == segment_of[size - 1:]
+        found_segments.append(segment_of[:windows][inside])
+        found_hashes.append(rolling[inside])
+    if not found_segments:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    segment = np.concatenate(found_segments)
+    hashes = np.concatenate(found_hashes)
+
+    # signed hashing: the lowest bit picks the sign, the next `bits` the bucket. Sorting
+    # (segment, bucket, sign) keys groups every bucket, and a plain sort beats np.unique
+    signed = np.sort((segment << (bits + 1)) | (hashes & np.uint64((2 << bits) - 1)).astype(np.int64))
+    starts = np.flatnonzero(np.concatenate(([True], (signed[1:] >> 1) != (signed[:-1] >> 1))))
+    keys = signed[starts] >> 1
+    counts = np.add.reduceat(1 - 2 * (signed & 1), starts).astype(np.float64)
+    values = np.sign(counts) * np.log1p(np.abs(counts))
+    key_segment = keys >> bits
+    norms = np.sqrt(np.bincount(key_segment, weights=values ** 2, minlength=segments))
+    values = values / np.where(norms > 0, norms, 1)[key_segment]
+    keep = values != 0
+    rows = key_segment[keep] // 2
+    columns = (key_segment[keep] % 2) * (1 << bits) + (keys[keep] & ((1 << bits) - 1))
+    return rows, columns, values[keep].astype(np.float32)
+
+
+def featurize(conversations, bits=HASH_BITS, ngrams=NGRAMS, meta_weight=META_WEIGHT) -> tuple:
+    """(ids, sparse text features (rows, columns, values), metadata features)"""
+    ids, words, offsets, meta = tokenize(conversations)
+    return ids, hashed_features(words, offsets, bits, ngrams), meta * meta_weight
+
+
+def dense_rows(features, start, stop, bits=HASH_BITS) -> np.ndarray:
+    """Rows [start, stop) of the features as a (rows, text columns + metadata columns) float64 matrix"""
+    (rows, columns, values), meta = features
+    stop = min(stop, len(meta))
+    first, last = np.searchsorted(rows, [start, stop])
+    text_columns = len(SPEAKERS) << bits
+    matrix = np.zeros((stop - start, text_columns + meta.shape[1]))
+    matrix[rows[first:last] - start, columns[first:last]] = values[first:last]
+    matrix[:, text_columns:] = meta[start:stop]
+    return matrix
+
+
+def select(features, indices) -> tuple:
+    """The features of the rows at the (sorted) indices"""
+    (rows, columns, values), meta = features
+    new_row = np.full(len(meta), -1)
+    new_row[indices] = np.arange(len(indices))
+    keep = new_row[rows] >= 0
+    return (new_row[rows[keep]], columns[keep], values[keep]), meta[indices]
+
+
+def linear(features, weights, intercept, bits=HASH_BITS) -> np.ndarray:
+    """(n, k) outputs of a linear model on the features, straight from the sparse values"""
+    (rows, columns, values), meta = features
+    text_columns = len(SPEAKERS) << bits
+    raw = meta @ weights[text_columns:] + intercept
+    for j in range(weights.shape[1]):
+        raw[:, j] += np.bincount(rows, weights=values * weights[columns, j], minlength=len(meta))
+    return raw
+
+
+def load_labels(labels_file) -> tuple:
+    """(ids, criteria, (n, k) float32 scores with NaN for missing) of a labeller's output file"""
+    with open(labels_file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    labels = [entry["label"] for entry in entries]
+    criteria = list(dict.fromkeys(key for label in labels for key in label))
+    scores = np.array([[np.nan if label.get(c) is None else label[c] for c in criteria] for label in labels],
+                      dtype=np.float32).reshape(len(labels), len(criteria))
+    ids = [entry["id"] if "id" in entry else entry["conversation"]["id"] for entry in entries]
+    return ids, criteria, scores
+
+
+def labelled_features(dataset_file, labels_file, bits=HASH_BITS, ngrams=NGRAMS, meta_weight=META_WEIGHT) -> tuple:
+    """(features (sparse text features, metadata), scores, criteria, ids) of the labelled
+    conversations of a dataset"""
+    label_ids, criteria, scores = load_labels(labels_file)
+    row_of = {conversation_id: i for i, conversation_id in enumerate(label_ids)}
+    ids, sparse, meta = featurize(iter_conversations(dataset_file, where=lambda c: c["id"] in row_of),
+                                  bits, ngrams, meta_weight)
+    return (sparse, meta), scores[[row_of[i] for i in ids]], criteria, ids
+
+
+def fit(features, scores, alpha=ALPHA, bits=HASH_BITS, batch_size=FIT_BATCH) -> tuple:
+    """(weights (columns, k), intercept (k,)) of a ridge regression per criterion, solved in
+    its dual form since there are far fewer conversations than columns. Missing scores are
+    filled with the criterion's mean."""
+    (rows, columns, values), meta = features
+    n = len(meta)
+    means = np.nanmean(scores, axis=0)
+    targets = np.where(np.isnan(scores), means, scores).astype(np.float64) - means
+    text_columns = len(SPEAKERS) << bits
+    centres = np.concatenate((np.bincount(columns, weights=values, minlength=text_columns),
+                              meta.sum(axis=0, dtype=np.float64))) / n
+
+    # kernel = centred features @ centred features.T, one pair of row blocks at a time
+    kernel = np.empty((n, n))
+    starts = range(0, n, batch_size)
+    for i in starts:
+        block = dense_rows(features, i, i + batch_size, bits) - centres
+        for j in starts[:i // batch_size + 1]:
+            other = block if j == i else dense_rows(features, j, j + batch_size, bits) - centres
+            kernel[i:i + batch_size, j:j + batch_size] = block @ other.T
+            kernel[j:j + batch_size, i:i + batch_size] = kernel[i:i + batch_size, j:j + batch_size].T
+    kernel[np.diag_indices_from(kernel)] += alpha
+    dual = np.linalg.solve(kernel, targets)
+
+    # weights = centred features.T @ dual, from the sparse values
+    weights = np.empty((len(centres), dual.shape[1]))
+    for j in range(dual.shape[1]):
+        weights[:text_columns, j] = np.bincount(columns, weights=values * dual[rows, j], minlength=text_columns)
+    weights[text_columns:] = meta.T @ dual
+    weights -= np.outer(centres, dual.sum(axis=0))
+    return weights.astype(np.float32), (means - centres @ weights).astype(np.float32)
+
+
+def to_scores(raw) -> np.ndarray:
+    return np.clip(np.rint(raw), *SCORES)
+
+
+class SurrogateGrader:
+    """A trained grader: weights of every criterion plus the featurisation settings"""
+
+    def __init__(self, criteria, weights, intercept, means, bits=HASH_BITS, ngrams=NGRAMS, meta_weight=META_WEIGHT):
+        self.criteria = list(criteria)
+        self.weights = weights
+        self.intercept = intercept
+        self.means = means  # mean training score of every criterion
+        self.bits, self.ngrams, self.meta_weight = bits, ngrams, meta_weight
+
+    @classmethod
+    def train(cls, dataset_file, labels_file, alpha=ALPHA, **settings) -> "SurrogateGrader":
+        settings = {"bits": HASH_BITS, "ngrams": NGRAMS, "meta_weight": META_WEIGHT, **settings}
+        features, scores, criteria, _ = labelled_features(dataset_file, labels_file, **settings)
+        weights, intercept = fit(features, scores, alpha, settings["bits"])
+        return cls(criteria, weights, intercept, np.nanmean(scores, axis=0), **settings)
+
+    def save(self, path):
+        settings = {"bits": self.bits, "ngrams": self.ngrams, "meta_weight": self.meta_weight,
+                    "criteria": self.criteria, "meta_features": META_FEATURES}
+        np.savez_compressed(path, weights=self.weights, intercept=self.intercept, means=self.means,
+                            settings=json.dumps(settings))
+
+    @classmethod
+    def load(cls, path) -> "SurrogateGrader":
+        with np.load(path) as saved:
+            settings = json.loads(str(saved["settings"]))
+            if settings["meta_features"] != META_FEATURES:
+                raise ValueError(f"{path} was trained with other metadata features, train it again")
+            return cls(settings["criteria"], saved["weights"], saved["intercept"], saved["means"],
+                       settings["bits"], settings["ngrams"], settings["meta_weight"])
+
+    def raw_scores(self, conversations) -> tuple:
+        """(ids, (n, k) regression outputs) for a batch of conversations"""
+        ids, sparse, meta = featurize(conversations, self.bits, self.ngrams, self.meta_weight)
+        return ids, linear((sparse, meta), self.weights, self.intercept, self.bits)
+
+    def predict(self, conversations, batch_size=BATCH_SIZE):
+        """Yields a {"id", "label", "raw"} record per conversation, scoring batch_size at a time"""
+        batch = []
+        for conversation in conversations:
+            batch.append(conversation)
+            if len(batch) == batch_size:
+                yield from self._records(batch)
+                batch = []
+        if batch:
+            yield from self._records(batch)
+
+    def _records(self, batch):
+        ids, raw = self.raw_scores(batch)
+        scores = to_scores(raw).astype(int).tolist()
+        raw = np.round(raw.astype(np.float64), 3).tolist()
+        for conversation_id, label, values in zip(ids, scores, raw):
+            yield {"id": conversation_id, "label": dict(zip(self.criteria, label)),
+                   "raw": dict(zip(self.criteria, values))}
+
+
+# --- evaluation ---
+
+def report(criteria, predicted, truth, baseline):
+    """Per-criterion MAE, agreement and kappa of predicted (n, k) scores against the labels"""
+    from label_analytics import ScoreMatrix, agreement
+    ids = np.arange(len(truth))
+    result = agreement(ScoreMatrix(ids, criteria, predicted), ScoreMatrix(ids, criteria, truth),
+                       levels=SCORES[1] + 1)
+    mae = np.nanmean(np.abs(predicted - truth), axis=0)
+    baseline_mae = np.nanmean(np.abs(baseline - truth), axis=0)
+    print(f"\n{'criterion':28s}{'MAE':>7s}{'(mean)':>8s}{'exact':>8s}{'<=1':>7s}{'kappa_quad':>12s}")
+    for j, criterion in enumerate(criteria):
+        print(f"{criterion[:28]:28s}{mae[j]:>7.3f}{baseline_mae[j]:>8.3f}{result['exact'][j]:>8.2f}"
+              f"{result['within_one'][j]:>7.2f}{result['kappa_quadratic'][j]:>12.2f}")
+    print(f"{'all':28s}{np.nanmean(mae):>7.3f}{np.nanmean(baseline_mae):>8.3f}{np.nanmean(result['exact']):>8.2f}"
+          f"{np.nanmean(result['within_one']):>7.2f}{np.nanmean(result['kappa_quadratic']):>12.2f}")
+    print("(mean) = MAE of always predicting the mean training score")
+
+
+def cross_validate(dataset_file, labels_file, folds=FOLDS, alpha=ALPHA, seed=SEED):
+    features, scores, criteria, ids = labelled_features(dataset_file, labels_file)
+    columns = (len(SPEAKERS) << HASH_BITS) + len(META_FEATURES)
+    print(f"{len(ids)} labelled conversations, {len(criteria)} criteria, {columns} features")
+    order = np.random.default_rng(seed).permutation(len(ids))
+    predicted = np.zeros_like(scores)
+    baseline = np.zeros_like(scores)
+    for fold in np.array_split(order, folds):
+        fold = np.sort(fold)
+        train = np.setdiff1d(order, fold)
+        weights, intercept = fit(select(features, train), scores[train], alpha)
+        predicted[fold] = to_scores(linear(select(features, fold), weights, intercept))
+        baseline[fold] = to_scores(np.nanmean(scores[train], axis=0))
+    print(f"{folds}-fold cross-validation, alpha {alpha}:")
+    report(criteria, predicted, scores, baseline)
+
+
+def evaluate_model(model_file, dataset_file, labels_file):
+    grader = SurrogateGrader.load(model_file)
+    label_ids, criteria, scores = load_labels(labels_file)
+    row_of = {conversation_id: i for i, conversation_id in enumerate(label_ids)}
+    columns = [criteria.index(c) for c in grader.criteria]
+    ids, raw = grader.raw_scores(list(iter_conversations(dataset_file, where=lambda c: c["id"] in row_of)))
+    truth = scores[[row_of[i] for i in ids]][:, columns]
+    print(f"{model_file} on {len(ids)} labelled conversations of {dataset_file}:")
+    report(grader.criteria, to_scores(raw), truth, np.broadcast_to(to_scores(grader.means), truth.shape))
+
+
+def predict_file(model_file, input_file, output_file, batch_size=BATCH_SIZE):
+    grader = SurrogateGrader.load(model_file)
+    started = time.perf_counter()
+    count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("[")
+        for record in grader.predict(iter_conversations(input_file), batch_size):
+            f.write((",\n" if count else "\n") + json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    elapsed = time.perf_counter() - started
+    print(f"Scored {count} conversations in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f}/s), saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local surrogate grader for rubric labels")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("train")
+    p.add_argument("--dataset", default=DATASET_FILE)
+    p.add_argument("--labels", default=LABELS_FILE)
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--alpha", type=float, default=ALPHA)
+    p = sub.add_parser("evaluate")
+    p.add_argument("--dataset", default=DATASET_FILE)
+    p.add_argument("--labels", default=LABELS_FILE)
+    p.add_argument("--model", help="score a trained model instead of cross-validating")
+    p.add_argument("--folds", type=int, default=FOLDS)
+    p.add_argument("--alpha", type=float, default=ALPHA)
+    p = sub.add_parser("predict")
+    p.add_argument("--model", default=MODEL_FILE)
+    p.add_argument("--input", required=True)
+    p.add_argument("--output", default=OUTPUT_FILE)
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        started = time.perf_counter()
+        grader = SurrogateGrader.train(args.dataset, args.labels, args.alpha)
+        grader.save(args.model)
+        print(f"Trained {len(grader.criteria)} criteria in {time.perf_counter() - started:.2f}s, saved to {args.model}")
+    elif args.command == "evaluate":
+        if args.model:
+            evaluate_model(args.model, args.dataset, args.labels)
+        else:
+            cross_validate(args.dataset, args.labels, args.folds, args.alpha)
+    else:
+        predict_file(args.model, args.input, args.output, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
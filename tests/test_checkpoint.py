@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.checkpoint import LabelCheckpoint
+
+
+def test_resume_skips_labelled_ids_and_retries_failed(tmp_path):
+    output = str(tmp_path / "labels.json")
+    checkpoint = LabelCheckpoint(output)
+    checkpoint.record({"id": 1, "label": {"clarity": 2}})
+    checkpoint.record({"conversation": {"id": 2}, "label": {"clarity": 1}})
+    checkpoint.record_failure(3, "rate limited")
+    # Crash mid-write of the next label
+    with open(checkpoint.partial_file, "a", encoding="utf-8") as f:
+        f.write('{"id": 4, "lab')
+
+    resumed = LabelCheckpoint(output)
+    assert resumed.done_ids == {1, 2}
+    assert resumed.is_done(2) and not resumed.is_done(4)
+    assert resumed.failed_ids == [3]
+
+
+def test_recording_a_failed_id_clears_it(tmp_path):
+    output = str(tmp_path / "labels.json")
+    checkpoint = LabelCheckpoint(output)
+    checkpoint.record_failure(3, "invalid JSON")
+    checkpoint.record({"id": 3, "label": {"clarity": 0}})
+    assert LabelCheckpoint(output).failed_ids == []
+
+
+def test_finalize_merges_output_and_partial_labels(tmp_path):
+    output = tmp_path / "labels.json"
+    output.write_text(json.dumps([{"id": 1, "label": {"clarity": 0}}, {"id": 2, "label": {"clarity": 1}}]))
+    checkpoint = LabelCheckpoint(str(output))
+    checkpoint.record({"id": 2, "label": {"clarity": 2}})  # relabelled, replaces the old one
+    checkpoint.record({"id": 3, "label": {"clarity": 1}})
+    results = checkpoint.finalize()
+    assert results == json.loads(output.read_text())
+    assert {r["id"]: r["label"]["clarity"] for r in results} == {1: 0, 2: 2, 3: 1}
+    # Finalizing again after a restart gives the same file
+    assert LabelCheckpoint(str(output)).finalize() == results
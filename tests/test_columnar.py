@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pyarrow")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.columnar import ColumnarDataset, export
+
+
+@pytest.fixture
+def exported(tmp_path):
+    conversations = [
+        {"id": i, "student_level": level, "difficulty": "Medium", "exchanges": 2, "topic": topic,
+         "conversation": [{"speaker": "interviewer", "speech": f"question {i}"}]}
+        for i, (level, topic) in enumerate([("good_student", "caching"), ("poor_student", "queues"),
+                                            ("good_student", "queues")], start=1)
+    ]
+    labels = [{"id": 1, "label": {"clarity": 2}}, {"id": 3, "label": {"clarity": 0}}]
+    (tmp_path / "dataset.json").write_text(json.dumps({"conversations": conversations}))
+    (tmp_path / "labels.json").write_text(json.dumps(labels))
+    out = str(tmp_path / "columnar")
+    export(str(tmp_path / "dataset.json"), str(tmp_path / "labels.json"), out)
+    return ColumnarDataset(out)
+
+
+def test_query_joins_labels(exported):
+    table = exported.query(student_level="good_student")
+    assert sorted(zip(table["id"].to_pylist(), table["clarity"].to_pylist())) == [(1, 2), (3, 0)]
+
+
+def test_query_without_id_column_still_joins_labels(exported):
+    table = exported.query(topic="queues", columns=["topic"])
+    assert table.column_names == ["topic", "clarity"]
+    assert table.to_pylist() == [{"topic": "queues", "clarity": 0}]
+
+
+def test_query_keeps_id_when_asked_for(exported):
+    table = exported.query(topic="queues", columns=["id"], with_labels=False)
+    assert sorted(table["id"].to_pylist()) == [2, 3]
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Week_3"))
+from control_tags import ControlTagParser, parse_reply
+
+
+def test_end_tag_after_difficulty_tag_and_closing_remark():
+    text = "Interviewer: What is X? <MEDIUM> Thanks for your time <END_OF_INTERVIEW>"
+    assert parse_reply(text) == ("What is X? Thanks for your time", ["MEDIUM", "END_OF_INTERVIEW"])
+
+
+def test_end_tag_split_across_streamed_chunks():
+    parser = ControlTagParser()
+    for piece in ["Interviewer: What is X? <MED", "IUM> Thanks for ", "your time <END_OF_", "INTERVIEW> ignored"]:
+        parser.feed(piece)
+    assert parser.complete
+    assert parser.finish() == ("What is X? Thanks for your time", ["MEDIUM", "END_OF_INTERVIEW"])
+
+
+def test_streamed_text_after_difficulty_tag_is_kept():
+    parser = ControlTagParser()
+    for piece in ["Interviewer: How would you shard this? <HA", "RD>\n\n(Take your", " time.)"]:
+        parser.feed(piece)
+    assert not parser.complete
+    assert parser.finish() == ("How would you shard this?\n\n(Take your time.)", ["HARD"])
+
+
+def test_parse_reply_keeps_text_after_difficulty_tag():
+    text = "Interviewer: What is X? <EASY> Think out loud if that helps."
+    assert parse_reply(text) == ("What is X? Think out loud if that helps.", ["EASY"])
+
+
+def test_reading_stops_at_end_tag():
+    parser = ControlTagParser()
+    parser.feed("Interviewer: Thanks, that's all. <END_OF_INTERVIEW>")
+    assert parser.complete
+    parser.feed(" Interviewer: another question? <HARD>")
+    assert parser.finish() == ("Thanks, that's all.", ["END_OF_INTERVIEW"])
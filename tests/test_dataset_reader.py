@@ -0,0 +1,41 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.dataset_reader import _JsonStream, iter_conversations
+
+CONVERSATIONS = [
+    {"id": 1, "conversation": [{"speaker": "interviewer", "speech": "Design a URL shortener, {please}."}]},
+    {"id": 2, "score": 12345, "conversation": []},
+    {"id": 3, "note": "unicode é and \"quotes\" ]", "conversation": []},
+]
+
+
+def test_objects_split_across_every_chunk_boundary():
+    text = json.dumps(CONVERSATIONS, indent=2)
+    for chunk_size in (1, 2, 3, 7):
+        stream = _JsonStream(io.StringIO(text), chunk_size=chunk_size)
+        assert list(stream.array()) == CONVERSATIONS
+
+
+def test_number_at_chunk_end_is_not_cut_short():
+    stream = _JsonStream(io.StringIO("[12345, 678]"), chunk_size=3)
+    assert list(stream.array()) == [12345, 678]
+
+
+def test_truncated_document_raises():
+    stream = _JsonStream(io.StringIO(json.dumps(CONVERSATIONS)[:-20]), chunk_size=4)
+    with pytest.raises(ValueError):
+        list(stream.array())
+
+
+def test_iter_conversations_skips_dataset_info_and_filters(tmp_path):
+    path = tmp_path / "dataset.json"
+    path.write_text(json.dumps({"dataset_info": {"total_conversations": 3}, "conversations": CONVERSATIONS}))
+    assert [c["id"] for c in iter_conversations(str(path))] == [1, 2, 3]
+    assert [c["id"] for c in iter_conversations(str(path), id_range=(2, 3))] == [2, 3]
+    assert [c["id"] for c in iter_conversations(str(path), where=lambda c: "score" in c)] == [2]
@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.dataset_store import DatasetStore
+
+
+def conversation(conversation_id, topic="caching"):
+    return {"id": conversation_id, "topic": topic, "student_level": "good_student", "conversation": []}
+
+
+def write_lines(path, records, tail=""):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.write(tail)
+
+
+def test_reopening_keeps_counters(tmp_path):
+    store = DatasetStore(str(tmp_path), shard_size=2)
+    for i in range(1, 4):
+        store.append(conversation(i))
+    reopened = DatasetStore(str(tmp_path), shard_size=2)
+    assert len(reopened) == 3 and reopened.next_id() == 4
+    assert sorted(reopened.meta["shards"]) == ["part-00000.jsonl", "part-00001.jsonl"]
+
+
+def test_recovers_records_written_after_the_last_meta_save(tmp_path):
+    store = DatasetStore(str(tmp_path), shard_size=10)
+    store.append(conversation(1))
+    # Crash after the line was fsync'd but before meta.json was rewritten, mid-way through another line
+    write_lines(tmp_path / "part-00000.jsonl", [conversation(2)], tail='{"id": 3, "top')
+    reopened = DatasetStore(str(tmp_path), shard_size=10)
+    assert len(reopened) == 2 and reopened.next_id() == 3
+    reopened.append(conversation(3))
+    assert [c["id"] for c in reopened.iter_conversations()] == [1, 2, 3]
+
+
+def test_recovers_unlisted_shards_on_disk(tmp_path):
+    store = DatasetStore(str(tmp_path), shard_size=1)
+    store.append(conversation(1))
+    # A new shard was opened and written, then the process died before meta.json listed it
+    write_lines(tmp_path / "part-00001.jsonl", [conversation(2, topic="queues")])
+    reopened = DatasetStore(str(tmp_path), shard_size=1)
+    assert len(reopened) == 2 and reopened.next_id() == 3
+    assert "queues" in reopened.meta["topics_covered"]
+    reopened.append(conversation(3))
+    assert sorted(reopened.meta["shards"]) == ["part-00000.jsonl", "part-00001.jsonl", "part-00002.jsonl"]
+    assert [c["id"] for c in reopened.iter_conversations()] == [1, 2, 3]
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.label_schema import DSA, InvalidLabelError, Rubric, repair
+
+RUBRIC = Rubric("test", ["clarity", "depth", "tone"])
+
+
+class Model:
+    """ask(messages, stage) that replies from a script and keeps every request"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def __call__(self, messages, stage):
+        self.requests.append((messages, stage))
+        return self.replies.pop(0)
+
+
+def test_valid_reply_needs_no_followup():
+    model = Model()
+    assert repair("prompt", '{"Clarity": 2, "depth": "1", "TONE": 0.0}', RUBRIC, model) == \
+        {"clarity": 2, "depth": 1, "tone": 0}
+    assert model.requests == []
+
+
+def test_prose_wrapped_reply_is_parsed():
+    text = 'Here is my assessment:\n```json\n{"clarity": 1, "depth": 2, "tone": 2}\n```\nHope that helps.'
+    assert repair("prompt", text, RUBRIC, Model()) == {"clarity": 1, "depth": 2, "tone": 2}
+
+
+def test_missing_and_out_of_range_scores_are_asked_for_alone():
+    model = Model('{"depth": 1, "tone": 2}')
+    label = repair("prompt", '{"clarity": 2, "depth": 5, "extra": 1}', RUBRIC, model)
+    assert label == {"clarity": 2, "depth": 1, "tone": 2}
+    (messages, stage), = model.requests
+    assert stage == "label_repair"
+    # The original prompt and reply stay an unchanged prefix of the follow-up
+    assert messages[:2] == [{"role": "user", "content": "prompt"},
+                            {"role": "assistant", "content": '{"clarity": 2, "depth": 5, "extra": 1}'}]
+    assert '"depth": got 5' in messages[2]["content"] and '"tone": missing' in messages[2]["content"]
+    assert '"clarity"' not in messages[2]["content"]
+
+
+def test_followup_cannot_change_valid_scores():
+    model = Model('{"tone": 1, "clarity": 0}')
+    assert repair("prompt", '{"clarity": 2, "depth": 1}', RUBRIC, model) == {"clarity": 2, "depth": 1, "tone": 1}
+
+
+def test_reply_without_json_is_asked_for_every_criterion():
+    model = Model(json.dumps({c: 1 for c in DSA.criteria}))
+    assert repair("prompt", "I cannot score this.", DSA, model) == {c: 1 for c in DSA.criteria}
+    assert all(f'"{c}"' in model.requests[0][0][-1]["content"] for c in DSA.criteria)
+
+
+def test_gives_up_after_max_reasks():
+    model = Model('{"tone": 3}', '{"tone": "high"}')
+    with pytest.raises(InvalidLabelError) as error:
+        repair("prompt", '{"clarity": 2, "depth": 1, "tone": -1}', RUBRIC, model, max_reasks=2)
+    assert error.value.problems == {"tone": "got 'high'"}
+    assert len(model.requests) == 2
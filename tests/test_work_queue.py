@@ -0,0 +1,95 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import common.work_queue
+from common.work_queue import WorkQueue
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(common.work_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_skips_duplicate_keys(queue):
+    assert queue.enqueue("label", "label:gpt:1", {"id": 1})
+    assert not queue.enqueue("label", "label:gpt:1", {"id": 1})
+    assert queue.pending("label") == 1
+
+
+def test_expired_lease_is_claimed_again_and_old_holder_cannot_complete(queue, clock):
+    queue.enqueue("generate", "generate:1", {})
+    first = queue.claim("generate", "worker-a")
+    assert queue.claim("generate", "worker-b") is None
+
+    clock.now += 61
+    second = queue.claim("generate", "worker-b")
+    assert second["key"] == "generate:1" and second["attempts"] == 2
+    assert not queue.heartbeat(first)
+    assert not queue.complete(first, {"from": "a"})
+    assert queue.complete(second, {"from": "b"})
+    assert queue.unexported("generate") == [(second["id"], {"from": "b"})]
+
+
+def test_lease_expiry_after_max_attempts_fails_the_task(queue, clock):
+    queue.enqueue("generate", "generate:1", {})
+    queue.claim("generate", "worker-a")
+    clock.now += 61
+    queue.claim("generate", "worker-b")
+    clock.now += 61
+    assert queue.claim("generate", "worker-c") is None
+    assert queue.stats() == {"generate": {"failed": 1}}
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    queue.enqueue("generate", "generate:1", {})
+    task = queue.claim("generate", "worker-a")
+    clock.now += 50
+    assert queue.heartbeat(task)
+    clock.now += 50
+    assert queue.claim("generate", "worker-b") is None
+    assert queue.complete(task, {"ok": True})
+
+
+def test_fail_retries_until_max_attempts(queue):
+    queue.enqueue("label", "label:gpt:1", {"id": 1})
+    assert queue.fail(queue.claim("label", "worker-a"), "timeout")
+    assert queue.stats() == {"label": {"pending": 1}}
+    assert queue.fail(queue.claim("label", "worker-a"), "timeout")
+    assert queue.stats() == {"label": {"failed": 1}}
+    assert queue.claim("label", "worker-a") is None
+
+    assert queue.requeue_failed("label") == 1
+    task = queue.claim("label", "worker-a")
+    assert task["attempts"] == 1
+    assert queue.complete(task, {"id": 1, "label": {}})
+    assert queue.pending("label") == 0
+
+
+def test_exported_results_are_not_returned_again(queue):
+    for i in (1, 2):
+        queue.enqueue("label", f"label:gpt:{i}", {"id": i})
+        queue.complete(queue.claim("label", "worker-a"), {"id": i})
+    finished = queue.unexported("label", "label:gpt:")
+    queue.mark_exported([finished[0][0]])
+    assert queue.unexported("label") == [finished[1]]